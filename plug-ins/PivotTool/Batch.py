@@ -0,0 +1,166 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+import time
+import traceback
+
+# NOTE: Nothing in here should import Maya at module level. The batch controller process
+#       only hands out scenes, each worker process boots its own standalone Maya session.
+
+# The plugin entry point, loaded into each worker so the pivot node types exist
+PluginPath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'PivotToolPlugin.py')
+
+
+# Give a pool worker a temp directory of its own, removed when the worker exits
+#   Outputs are written to the temp directory under names built from the pivot node, so workers
+#   building scenes with sets of the same name would otherwise overwrite each other's textures.
+#   Workers leave through os._exit, which skips atexit, so it's removed by a multiprocessing finalizer.
+def createWorkerTempDir():
+    tempfile.tempdir = tempfile.mkdtemp(prefix='PivotToolBatch')
+    multiprocessing.util.Finalize(None, shutil.rmtree, (tempfile.tempdir, True), exitpriority=0)
+    return tempfile.tempdir
+
+
+# Boot a standalone Maya session inside a pool worker
+def initializeWorker(inPluginPath):
+    createWorkerTempDir()
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+
+    import maya.cmds as cmds
+    if not cmds.pluginInfo(inPluginPath, q=True, loaded=True):
+        cmds.loadPlugin(inPluginPath, quiet=True)
+
+
+# Build a report dictionary for a single pivot set from its build state
+def _setReport(inState, inExport):
+
+    report = { 'node': inState.getView().getRootNode(), 'success': not inState.hasFailed(), 'error': inState.mError, 'time': inState.mTime, 'render': inState.mRenderReport, 'textureSize': None, 'textureMemory': 0, 'merged': [ ], 'lod': None, 'animation': None, 'exported': [ ], 'exportErrors': [ ] }
+    builder = inState.getBuilder()
+    if builder is not None:
+        report['merged'] = [list(pair) for pair in builder.getMergedElements()]
+        report['lod'] = builder.getLODReport()
+        report['animation'] = builder.getAnimationReport()
+        if len(builder.mTextures) > 0:
+            report['textureSize'] = [builder.mTextureWidth, builder.mTextureHeight]
+            report['textureMemory'] = builder.getTextureMemory()
+    if report['success'] and inExport:
+        try:
+            report['exported'], report['exportErrors'] = inState.getView().copyTextures()
+        except:
+            report['exportErrors'] = [traceback.format_exc()]
+
+    return report
+
+
+# Open a scene and regenerate all of its pivot sets, returns a report dictionary
+#   With inSnapshotDir a snapshot of the sets (see Gen.SnapshotFile) named after the scene is saved there
+def regenerateScene(inScenePath, inSave=True, inExport=True, inSnapshotDir=None):
+    import maya.cmds as cmds
+    import Gen.SnapshotFile as SnapshotFile
+    import UI.PivotNodeView as PivotNodeView
+
+    report = { 'scene': inScenePath, 'worker': os.getpid(), 'success': False, 'error': None, 'sets': [ ], 'snapshot': None, 'openTime': 0.0, 'buildTime': 0.0, 'saveTime': 0.0, 'time': 0.0 }
+    if inSnapshotDir is not None:
+        report['snapshot'] = os.path.join(inSnapshotDir, os.path.splitext(os.path.basename(inScenePath))[0] + SnapshotFile.Extension)
+
+    start = time.time()
+    try:
+        cmds.file(inScenePath, o=True, f=True, prompt=False)
+        report['openTime'] = time.time() - start
+
+        # All sets in the scene are built together so they share a single scene extraction
+        buildStart = time.time()
+        states = PivotNodeView.regenerateAll(False, None, None, report['snapshot'])
+        report['buildTime'] = time.time() - buildStart
+
+        report['sets'] = [_setReport(state, inExport) for state in states]
+        report['success'] = len([True for item in report['sets'] if not item['success'] or len(item['exportErrors']) > 0]) == 0
+
+        if inSave:
+            saveStart = time.time()
+            cmds.file(save=True, f=True)
+            report['saveTime'] = time.time() - saveStart
+    except:
+        report['success'] = False
+        report['error'] = traceback.format_exc()
+
+    # Make sure the next scene on this worker starts from a clean slate
+    try:
+        cmds.file(new=True, f=True)
+    except:
+        pass
+
+    report['time'] = time.time() - start
+    return report
+
+
+# Pool entry point, imap only passes a single argument
+def _regenerateSceneArgs(inArgs):
+    return regenerateScene(*inArgs)
+
+
+# Regenerate a list of scenes across a pool of mayapy worker processes
+#   inScenesPerWorker recycles workers after N scenes to keep Maya's memory use in check (0 = never)
+def runBatch(inScenes, inJobs=None, inSave=True, inExport=True, inScenesPerWorker=0, inSnapshotDir=None):
+
+    jobs = inJobs if inJobs is not None and inJobs > 0 else multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(inScenes)))
+
+    summary = { 'jobs': jobs, 'scenes': [ ], 'failed': 0, 'time': 0.0 }
+    if len(inScenes) == 0:
+        return summary
+
+    start = time.time()
+    pool = multiprocessing.Pool(jobs, initializeWorker, (PluginPath,), inScenesPerWorker if inScenesPerWorker > 0 else None)
+    try:
+        snapshotDir = os.path.abspath(inSnapshotDir) if inSnapshotDir is not None else None
+        args = [(os.path.abspath(scene), inSave, inExport, snapshotDir) for scene in inScenes]
+        for report in pool.imap_unordered(_regenerateSceneArgs, args):
+            summary['scenes'].append(report)
+
+            print '[%i/%i] %s %s (%.2fs, %i sets)' % (len(summary['scenes']), len(inScenes), 'OK  ' if report['success'] else 'FAIL', report['scene'], report['time'], len(report['sets']))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    summary['failed'] = len([True for report in summary['scenes'] if not report['success']])
+    summary['time'] = time.time() - start
+
+    return summary
+
+
+# Dump a batch summary as JSON
+def writeReport(inPath, inSummary):
+    with open(inPath, 'w') as fp:
+        json.dump(inSummary, fp, indent=4)
+
+
+# Print a readable breakdown of failures in a batch summary
+def printSummary(inSummary):
+    print '------------------------'
+    print 'Scenes: %i, Failed: %i, Workers: %i, Time: %.2fs' % (len(inSummary['scenes']), inSummary['failed'], inSummary['jobs'], inSummary['time'])
+
+    for report in inSummary['scenes']:
+        if report['error'] is not None:
+            print '%s\n%s' % (report['scene'], report['error'])
+
+        for item in report['sets']:
+            if item['error'] is not None:
+                print '%s [%s]\n%s' % (report['scene'], item['node'], item['error'])
+            for error in item['exportErrors']:
+                print '%s [%s] %s' % (report['scene'], item['node'], error)
+    print '------------------------'
@@ -0,0 +1,315 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import traceback
+
+import Scenes
+from ..Gen.RenderType import RenderType
+
+# NOTE: Like Batch, nothing in here should import Maya at module level. Cases can run against the
+#       in-memory scene backend on any machine, or against a real scene inside mayapy.
+
+# Scene backends a benchmark can be run against
+Backends = ['memory', 'maya']
+
+# Texture output configurations, lists of [RGB, Alpha] render types
+TextureConfigs = {
+    'single': [
+        [RenderType.PivotPosition, RenderType.NoRender]
+    ],
+    'pivotPainter': [
+        [RenderType.PivotPosition, RenderType.ParentIndexFloat],
+        [RenderType.XVector, RenderType.XExtent]
+    ],
+    'pivotPainterWide': [
+        [RenderType.PivotPosition, RenderType.NoRender],
+        [RenderType.ParentIndexWide, RenderType.NoRender],
+        [RenderType.XVector, RenderType.XExtent]
+    ],
+    'all': [
+        [RenderType.PivotPosition, RenderType.BoundingBoxDiameter],
+        [RenderType.OriginPosition, RenderType.HierarchyPositionHDR],
+        [RenderType.OriginExtents, RenderType.NumStepsToRoot],
+        [RenderType.XVector, RenderType.XExtent],
+        [RenderType.YVector, RenderType.YExtent],
+        [RenderType.ZVector, RenderType.ZExtent]
+    ]
+}
+
+
+# Build a named case, the texture configuration is given by name
+#   Cases too large for float parent indices (leaving room for the joints of skinned elements) default
+#   to split ones
+def _case(inName, inTextures=None, **inParams):
+    case = dict(inParams)
+    case['name'] = inName
+    if inTextures is None:
+        inTextures = 'pivotPainter' if case.get('elements', 0) <= 1024 else 'pivotPainterWide'
+    case['textures'] = TextureConfigs[inTextures]
+    return case
+
+
+# Benchmark suites, 'full' is the union of every other suite
+Suites = {
+    'quick': [
+        _case('quick_10', elements=10),
+        _case('quick_100', elements=100, skinned=0.1),
+        _case('quick_1k', elements=1000, skinned=0.1)
+    ],
+    'scaling': [
+        _case('scale_%s' % label, elements=count) for label, count in [('10', 10), ('100', 100), ('1k', 1000), ('10k', 10000), ('50k', 50000), ('200k', 200000)]
+    ],
+    'shape': [
+        _case('shape_flat', elements=10000, depth=2, branching=10000),
+        _case('shape_deep', elements=10000, depth=64, branching=1),
+        _case('shape_binary', elements=10000, depth=0, branching=2),
+        _case('shape_sets', elements=10000, sets=8)
+    ],
+    'skinned': [
+        _case('skinned_0', elements=1000, skinned=0.0),
+        _case('skinned_25', elements=1000, skinned=0.25),
+        _case('skinned_100', elements=1000, skinned=1.0, joints=8)
+    ],
+    'uvs': [
+        _case('uvs_4', elements=1000, uvs=4),
+        _case('uvs_64', elements=1000, uvs=64),
+        _case('uvs_512', elements=1000, uvs=512)
+    ],
+    'textures': [
+        _case('textures_single', 'single', elements=1000),
+        _case('textures_pivotPainter', 'pivotPainter', elements=1000),
+        _case('textures_all', 'all', elements=1000)
+    ],
+    'groups': [
+        _case('groups_40', elements=10000, groups=0.4),
+        _case('groups_40_collapsed', elements=10000, groups=0.4, collapseGroups=True)
+    ]
+}
+Suites['full'] = [case for name in ['scaling', 'shape', 'skinned', 'uvs', 'textures', 'groups'] for case in Suites[name]]
+
+
+# Get the peak resident memory of this process in MB (None where it can't be measured)
+def getPeakMemory():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, OSX reports bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+# Get the result dictionary of a case which hasn't run (yet)
+def _emptyResult(inCase, inBackend):
+    return { 'name': inCase['name'], 'params': Scenes.getCaseParams(inCase), 'backend': inBackend, 'success': False, 'error': None, 'setup': 0.0, 'total': 0.0, 'stages': { }, 'peakMemory': None, 'textureMemory': 0 }
+
+
+# Generate and regenerate a single case, returns a result dictionary
+#   inWorkers is passed on to regenerateAll (None for the default worker count), inRenderProcess
+#   picks whether textures are rendered by the render process or in this process
+def runCase(inCase, inBackend, inWorkers=None, inRenderProcess=True):
+    from ..Gen import RenderProcess
+    from ..Scene import Backend
+    from ..UI import PivotNodeView
+
+    result = _emptyResult(inCase, inBackend)
+
+    try:
+        start = time.time()
+        description = Scenes.generateScene(inCase)
+
+        if inBackend == 'memory':
+            from ..Scene.MemoryBackend import MemoryBackend
+            scene = MemoryBackend()
+            scene.loadScene(description)
+            Backend.setBackend(scene)
+        else:
+            import maya.cmds as cmds
+            cmds.file(new=True, f=True)
+            Scenes.buildMayaScene(description)
+            Backend.setBackend(None)
+        result['setup'] = time.time() - start
+
+        RenderProcess.Enabled = inRenderProcess
+
+        timings = [ ]
+        start = time.time()
+        states = PivotNodeView.regenerateAll(False, timings, inWorkers)
+        result['total'] = time.time() - start
+
+        for stage, seconds in timings:
+            result['stages'][stage] = result['stages'].get(stage, 0.0) + seconds
+
+        result['textureMemory'] = sum([state.getBuilder().getTextureMemory() for state in states if state.getBuilder() is not None])
+
+        errors = [state.mError for state in states if state.hasFailed()]
+        result['error'] = errors[0] if len(errors) > 0 else None
+        result['success'] = len(errors) == 0 and len(states) > 0
+    except:
+        result['error'] = traceback.format_exc()
+
+    result['peakMemory'] = getPeakMemory()
+    return result
+
+
+# Process entry point for an isolated run, mayapy runs boot Maya first
+def _runCaseProcess(inConnection, inArgs):
+    if inArgs[1] == 'maya':
+        from .. import Batch
+        Batch.initializeWorker(Batch.PluginPath)
+
+    inConnection.send(runCase(*inArgs))
+    inConnection.close()
+
+
+# Run a case in a fresh process, returns its result dictionary
+#   A pool would wait forever on a worker killed mid case (eg. by the OOM killer), so the process is
+#   watched instead and a run that dies without a result is reported as a failure. The render process
+#   inherits the pipe, so the result is polled for rather than waiting for the pipe to close.
+def _runIsolated(inCase, inBackend, inWorkers, inRenderProcess):
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_runCaseProcess, args=(sender, (inCase, inBackend, inWorkers, inRenderProcess)))
+    process.start()
+    sender.close()
+
+    try:
+        while not receiver.poll(1.0):
+            if not process.is_alive():
+                break
+
+        # Polling also succeeds once the pipe is closed, which leaves nothing to receive
+        if receiver.poll():
+            return receiver.recv()
+    except EOFError:
+        pass
+    finally:
+        process.join()
+        receiver.close()
+
+    result = _emptyResult(inCase, inBackend)
+    result['error'] = 'The case process exited with code %s before finishing (killed for running out of memory?)' % process.exitcode
+    return result
+
+
+# Keep the fastest of several runs of the same case, stage by stage
+def _bestOf(inResults):
+    best = dict(inResults[0])
+    best['runs'] = len(inResults)
+
+    for result in inResults[1:]:
+        if not result['success']:
+            return result
+        best['total'] = min(best['total'], result['total'])
+        best['setup'] = min(best['setup'], result['setup'])
+        best['stages'] = dict([(stage, min(seconds, result['stages'].get(stage, seconds))) for stage, seconds in best['stages'].iteritems()])
+        best['peakMemory'] = max(best['peakMemory'], result['peakMemory']) if best['peakMemory'] is not None else None
+
+    return best
+
+
+# Run a list of cases, returns a results dictionary
+#   With inIsolate each run gets a fresh process, so peak memory is per case rather than a high
+#   water mark over the whole suite (and mayapy workers start from an empty scene)
+def runSuite(inCases, inBackend='memory', inRepeat=1, inIsolate=True, inWorkers=None, inRenderProcess=True):
+
+    if inBackend not in Backends:
+        raise Exception("Unknown backend '%s', expected one of: %s" % (inBackend, ', '.join(Backends)))
+
+    results = { 'backend': inBackend, 'platform': platform.platform(), 'python': sys.version.split()[0], 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'workers': inWorkers, 'renderProcess': inRenderProcess, 'cases': [ ] }
+
+    for case in inCases:
+        runs = [ ]
+        for i in range(max(1, inRepeat)):
+            if inIsolate:
+                runs.append(_runIsolated(case, inBackend, inWorkers, inRenderProcess))
+            else:
+                runs.append(runCase(case, inBackend, inWorkers, inRenderProcess))
+
+        result = _bestOf(runs)
+        results['cases'].append(result)
+
+        print '%-24s %s %9.3fs %8s' % (result['name'], 'OK  ' if result['success'] else 'FAIL', result['total'], '%.1fMB' % result['peakMemory'] if result['peakMemory'] is not None else '-')
+
+    return results
+
+
+# Compare results against a baseline, returns a list of regressions
+#   Timings regress when they're more than inThreshold slower (and at least inMinSeconds slower, to
+#   ignore noise in tiny stages), peak memory when it's more than inThreshold larger
+def compareResults(inResults, inBaseline, inThreshold=0.1, inMinSeconds=0.01):
+
+    baseline = dict([(case['name'], case) for case in inBaseline['cases']])
+
+    regressions = [ ]
+    for case in inResults['cases']:
+        if case['name'] not in baseline:
+            continue
+        base = baseline[case['name']]
+
+        if base['success'] and not case['success']:
+            regressions.append({ 'case': case['name'], 'metric': 'success', 'baseline': True, 'current': False, 'change': None })
+            continue
+
+        metrics = [('total', base['total'], case['total'])]
+        metrics = metrics + [('stage:%s' % stage, seconds, case['stages'][stage]) for stage, seconds in base['stages'].iteritems() if stage in case['stages']]
+        for metric, old, new in metrics:
+            if new > old * (1.0 + inThreshold) and new - old > inMinSeconds:
+                regressions.append({ 'case': case['name'], 'metric': metric, 'baseline': old, 'current': new, 'change': (new - old) / max(old, 1e-9) })
+
+        if base['peakMemory'] is not None and case['peakMemory'] is not None and case['peakMemory'] > base['peakMemory'] * (1.0 + inThreshold):
+            regressions.append({ 'case': case['name'], 'metric': 'peakMemory', 'baseline': base['peakMemory'], 'current': case['peakMemory'], 'change': (case['peakMemory'] - base['peakMemory']) / base['peakMemory'] })
+
+    return regressions
+
+
+# Dump results as JSON
+def writeResults(inPath, inResults):
+    with open(inPath, 'w') as fp:
+        json.dump(inResults, fp, indent=4, sort_keys=True)
+
+
+# Load results written by writeResults
+def loadResults(inPath):
+    if not os.path.exists(inPath):
+        raise Exception("Baseline '%s' doesn't exist!" % inPath)
+
+    with open(inPath, 'r') as fp:
+        return json.load(fp)
+
+
+# Print a per stage breakdown of results, along with any regressions against a baseline
+def printResults(inResults, inRegressions=None):
+    stages = [ ]
+    for case in inResults['cases']:
+        stages = stages + [stage for stage in sorted(case['stages'].keys()) if stage not in stages]
+
+    print '------------------------'
+    print 'Backend: %s, Platform: %s, Python: %s' % (inResults['backend'], inResults['platform'], inResults['python'])
+    for case in inResults['cases']:
+        print '%s (%i elements, %s)' % (case['name'], case['params']['elements'], 'total %.3fs' % case['total'] if case['success'] else 'FAILED')
+        for stage in stages:
+            if stage in case['stages']:
+                print '    %-24s %9.3fs' % (stage, case['stages'][stage])
+        if case['error'] is not None:
+            print case['error']
+
+    if inRegressions is not None:
+        print '------------------------'
+        print 'Regressions: %i' % len(inRegressions)
+        for regression in inRegressions:
+            if regression['change'] is None:
+                print '    %-24s %s' % (regression['case'], regression['metric'])
+            else:
+                print '    %-24s %-32s %10.3f -> %10.3f (%+.1f%%)' % (regression['case'], regression['metric'], regression['baseline'], regression['current'], regression['change'] * 100.0)
+    print '------------------------'
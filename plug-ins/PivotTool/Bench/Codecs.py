@@ -0,0 +1,477 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import glob
+import math
+import os
+import platform
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from ..Util import Half
+from ..Util import LwDDS
+
+# Texture sizes covered by the throughput benchmark (square, RGBA)
+Sizes = [4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+
+# Field names of a legacy DDS file header (magic, DDS_HEADER and DDS_PIXELFORMAT)
+HeaderFields = ['magic', 'size', 'flags', 'height', 'width', 'pitchOrLinearSize', 'depth', 'mipMapCount'] + \
+    ['reserved1[%i]' % i for i in range(11)] + \
+    ['pf.size', 'pf.flags', 'pf.fourCC', 'pf.rgbBitCount', 'pf.rBitMask', 'pf.gBitMask', 'pf.bBitMask', 'pf.aBitMask'] + \
+    ['caps', 'caps2', 'caps3', 'caps4', 'reserved2']
+HeaderStruct = struct.Struct('<4s31I')
+
+# Field names of the DX10 header extension
+HeaderDX10Fields = ['dxgiFormat', 'resourceDimension', 'miscFlag', 'arraySize', 'miscFlags2']
+HeaderDX10Struct = struct.Struct('<5I')
+
+
+#
+# Throughput
+#
+
+# Get a data set for a converter, inCount components in the converter's source range
+def _getSourceData(inSourceFormat, inCount, inRandom):
+    if inSourceFormat == LwDDS.DataFormat.Float32:
+        return [inRandom.random() for i in range(inCount)]
+    return [inRandom.randint(0, 255) for i in range(inCount)]
+
+
+# Time a function, repeating it until inMinTime has passed and keeping the fastest run
+def _time(inFn, inMinTime):
+    best = None
+    total = 0.0
+    while best is None or total < inMinTime:
+        start = time.time()
+        inFn()
+        elapsed = time.time() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+        total = total + elapsed
+    return best
+
+
+# Get the (name, function, source format, bytes per pixel) of everything the throughput benchmark covers
+def getThroughputTargets():
+    targets = [ ]
+
+    converters = LwDDS.SequenceConverter.GetConverters()
+    for source in sorted(converters.keys()):
+        for target in sorted(converters[source].keys()):
+            fn = converters[source][target]
+            size = len(fn(_getSourceData(source, 4, random.Random(0))))
+            targets.append(('%s (%i -> %i)' % (fn.__name__, source, target), fn, source, size))
+
+    # Whole file writes, including the header and file IO (and block compression)
+    for format in [LwDDS.DXGIFormat.B8G8R8A8_UNorm, LwDDS.DXGIFormat.R16G16B16A16_Float, LwDDS.DXGIFormat.BC4_UNorm, LwDDS.DXGIFormat.BC5_UNorm]:
+        targets.append(('WriteTexture2D (%i)' % format, format, LwDDS.DataFormat.Float32, LwDDS.DXGIFormat.GetSurfaceSize(format, 4, 4) / 16.0))
+
+    return targets
+
+
+# Measure the throughput of each converter and the texture writer, in MB/s of output
+#   Sizes above inMaxSize are skipped, a full 8192x8192 run needs several GB of memory
+def benchmarkThroughput(inMaxSize=1024, inMinTime=0.25):
+    rand = random.Random(1)
+    path = os.path.join(tempfile.gettempdir(), 'PivotToolCodecBench.dds')
+
+    results = [ ]
+    for size in [size for size in Sizes if size <= inMaxSize]:
+        for name, fn, source, bytesPerPixel in getThroughputTargets():
+            channels = LwDDS.BlockEncoder.GetChannelCount(fn) if isinstance(fn, int) and LwDDS.DXGIFormat.IsBlockCompressed(fn) else 4
+            data = _getSourceData(source, size * size * channels, rand)
+
+            if isinstance(fn, int):
+                seconds = _time(lambda: LwDDS.WriteTexture2D(path, size, size, fn, 1, data, source), inMinTime)
+            else:
+                seconds = _time(lambda: fn(data), inMinTime)
+
+            bytes = size * size * bytesPerPixel
+            results.append({ 'name': name, 'size': size, 'bytes': bytes, 'seconds': seconds, 'mbps': bytes / (1024.0 * 1024.0) / max(seconds, 1e-9) })
+            print '%-40s %5ix%-5i %10.3f MB/s' % (name, size, size, results[-1]['mbps'])
+
+    if os.path.exists(path):
+        os.remove(path)
+    return results
+
+
+#
+# Half floats
+#
+
+# Get the class of a half value
+def classifyHalf(inHalf):
+    exponent = (inHalf >> 10) & 0x1f
+    mantissa = inHalf & 0x3ff
+
+    if exponent == 0:
+        return 'zero' if mantissa == 0 else 'denormal'
+    if exponent == 31:
+        return 'inf' if mantissa == 0 else 'nan'
+    return 'normal'
+
+
+# Reference half decode, straight from the IEEE 754 definition
+#   The codec has no inf/nan, those decode to the largest finite value
+def referenceToSingle(inHalf):
+    sign = -1.0 if inHalf & 0x8000 else 1.0
+    exponent = (inHalf >> 10) & 0x1f
+    mantissa = inHalf & 0x3ff
+
+    if exponent == 0:
+        return sign * math.ldexp(mantissa, -24)
+    if exponent == 31:
+        return sign * 65504.0
+    return sign * math.ldexp(1024 + mantissa, exponent - 25)
+
+
+# Reference half encode, matching the codec's contract
+#   Values are rounded to single precision first, then truncated to half precision. Anything
+#   below the smallest normal half flushes to zero, anything too large (including inf and nan)
+#   clamps to the largest finite value. The sign is always kept.
+def referenceGetHalf(inValue):
+    single = struct.unpack('<f', struct.pack('<f', inValue))[0]
+    sign = 0x8000 if math.copysign(1.0, single) < 0.0 else 0
+
+    if math.isnan(single) or math.isinf(single):
+        return sign | 0x7bff
+
+    mantissa, exponent = math.frexp(abs(single))
+    exponent = exponent - 1
+    if single == 0.0 or exponent < -14:
+        return sign
+    if exponent > 15:
+        return sign | 0x7bff
+
+    return sign | ((exponent + 15) << 10) | int(math.floor((abs(single) / math.ldexp(1.0, exponent) - 1.0) * 1024.0))
+
+
+# Decode every half value and encode it again
+#   Zeros and normals must survive the round trip bit for bit. The other classes are lossy by
+#   design, they're reported along with whether they match the reference contract.
+def checkHalfRoundTrip():
+    classes = dict([(name, { 'count': 0, 'exact': 0, 'decodeErrors': 0, 'contractErrors': 0, 'examples': [ ] }) for name in ['zero', 'denormal', 'normal', 'inf', 'nan']])
+
+    for half in range(65536):
+        stats = classes[classifyHalf(half)]
+        stats['count'] = stats['count'] + 1
+
+        single = Half.ToSingle(half)
+        roundTrip = Half.GetHalf(single)
+        expected = referenceGetHalf(referenceToSingle(half))
+
+        if roundTrip == half:
+            stats['exact'] = stats['exact'] + 1
+        if single != referenceToSingle(half):
+            stats['decodeErrors'] = stats['decodeErrors'] + 1
+        if roundTrip != expected:
+            stats['contractErrors'] = stats['contractErrors'] + 1
+
+        if (single != referenceToSingle(half) or roundTrip != expected) and len(stats['examples']) < 8:
+            stats['examples'].append('0x%04x -> %r -> 0x%04x (expected %r -> 0x%04x)' % (half, single, roundTrip, referenceToSingle(half), expected))
+
+    passed = classes['zero']['exact'] == classes['zero']['count'] and classes['normal']['exact'] == classes['normal']['count']
+    passed = passed and len([True for stats in classes.values() if stats['decodeErrors'] > 0 or stats['contractErrors'] > 0]) == 0
+
+    return { 'passed': passed, 'classes': classes }
+
+
+# Encode values around every half (exact values, midpoints and near neighbours) plus the edge
+# cases, and compare against the reference encoder
+def checkHalfEncode():
+    values = [0.0, -0.0, 1e-30, -1e-30, math.ldexp(1.0, -14), math.ldexp(1.0, -15), 65504.0, 65519.0, 65520.0, 65535.9, 65536.0, 1e30, -1e30, float('inf'), float('-inf'), float('nan')]
+    for half in range(0x7c00):
+        low = referenceToSingle(half)
+        high = referenceToSingle(half + 1)
+        values.extend([low, (low + high) * 0.5, low * (1.0 - 2.0 ** -20), -low, -(low + high) * 0.5])
+
+    errors = [ ]
+    for value in values:
+        encoded = Half.GetHalf(value)
+        expected = referenceGetHalf(value)
+        if encoded != expected:
+            errors.append('%r -> 0x%04x (expected 0x%04x)' % (value, encoded, expected))
+
+    return { 'passed': len(errors) == 0, 'count': len(values), 'errors': len(errors), 'examples': errors[0:16] }
+
+
+#
+# UNorm8
+#
+
+# Check float and int to UNorm8 conversion
+#   Every k/255 must come back as k, a fine sweep must match exact integer floor(v * 255), and
+#   out of range values must clamp
+def checkUNorm8():
+    errors = [ ]
+
+    def check(inName, inFn, inValues, inExpected):
+        result = list(struct.unpack('%iB' % len(inValues), inFn(inValues)))
+        for value, got, expected in zip(inValues, result, inExpected):
+            if got != expected:
+                errors.append('%s(%r) = %i (expected %i)' % (inName, value, got, expected))
+
+    convert = LwDDS.SequenceConverter.F32ToI8_UNorm
+    check('F32ToI8_UNorm', convert, [k / 255.0 for k in range(256)], range(256))
+    check('F32ToI8_UNorm', convert, [i / 65535.0 for i in range(65536)], [(i * 255) // 65535 for i in range(65536)])
+    check('F32ToI8_UNorm', convert, [-1e9, -1.0, -0.0, 1e-9, 1.0, 1.0 + 1e-9, 2.0, 1e9], [0, 0, 0, 0, 255, 255, 255, 255])
+
+    convert = LwDDS.SequenceConverter.I32ToI8_UNorm
+    check('I32ToI8_UNorm', convert, range(-300, 600), [min(255, max(0, i)) for i in range(-300, 600)])
+
+    return { 'passed': len(errors) == 0, 'errors': len(errors), 'examples': errors[0:16] }
+
+
+#
+# Block compression
+#
+
+# Reference BC4 block decode, straight from the D3D10 functional spec
+def referenceDecodeBC4(inBlock):
+    red0, red1 = struct.unpack('<BB', inBlock[0:2])
+    bits = struct.unpack('<Q', inBlock[2:8] + '\0\0')[0]
+
+    if red0 > red1:
+        palette = [red0, red1] + [((7 - i) * red0 + i * red1) / 7.0 for i in range(1, 7)]
+    else:
+        palette = [red0, red1] + [((5 - i) * red0 + i * red1) / 5.0 for i in range(1, 5)] + [0.0, 255.0]
+
+    return [float(palette[(bits >> (i * 3)) & 7]) for i in range(16)]
+
+
+# Encode blocks of gradients, noise, constants and extremes, then check them against the reference decoder
+#   The values the encoder says each texel decodes to must match the reference, and no texel may be
+#   further from its 8-bit value than half a palette step
+def checkBlockCompression():
+    rand = random.Random(2)
+    width, height = 16, 8
+
+    channels = [
+        [(x + y * width) / float(width * height) for y in range(height) for x in range(width)],
+        [rand.random() for i in range(width * height)],
+        [0.5] * (width * height),
+        [float(rand.randint(0, 1)) for i in range(width * height)],
+        [rand.randint(120, 124) / 255.0 for i in range(width * height)]
+    ]
+
+    errors = [ ]
+    for format in [LwDDS.DXGIFormat.BC4_UNorm, LwDDS.DXGIFormat.BC5_UNorm]:
+        count = LwDDS.BlockEncoder.GetChannelCount(format)
+        for first in range(len(channels)):
+            picked = [channels[(first + channel) % len(channels)] for channel in range(count)]
+            source = [value for texel in zip(*picked) for value in texel]
+            data, decoded = LwDDS.BlockEncoder.Encode(format, source, width, height)
+
+            if len(data) != LwDDS.DXGIFormat.GetSurfaceSize(format, width, height):
+                errors.append('%i/%i: %i bytes (expected %i)' % (format, first, len(data), LwDDS.DXGIFormat.GetSurfaceSize(format, width, height)))
+                continue
+
+            blockSize = LwDDS.DXGIFormat.BlockSizes[format] / count
+            for block in range(len(data) / (blockSize * count)):
+                bx = (block % (width / 4)) * 4
+                by = (block / (width / 4)) * 4
+                for channel in range(count):
+                    offset = (block * count + channel) * blockSize
+                    reference = referenceDecodeBC4(data[offset:offset + 8])
+                    texels = [(by + y) * width + bx + x for y in range(4) for x in range(4)]
+
+                    values = [min(255, max(0, int(math.floor(source[texel * count + channel] * 255)))) for texel in texels]
+                    step = (max(values) - min(values)) / 7.0
+                    for texel, value, expected in zip(texels, values, reference):
+                        got = decoded[texel * count + channel] * 255.0
+                        if abs(got - expected) > 1e-6 or abs(expected - value) > step * 0.5 + 1e-6:
+                            errors.append('%i/%i texel %i channel %i: %r decodes to %r (reported %r)' % (format, first, texel, channel, value, expected, got))
+
+    return { 'passed': len(errors) == 0, 'errors': len(errors), 'examples': errors[0:16] }
+
+
+#
+# DDS headers
+#
+
+# Pack the header texconv (DirectXTex) writes for a legacy single layer 2D texture
+#   This is built by hand from the DDS documentation so it doesn't share any code with LwDDS
+def referenceHeader(inWidth, inHeight, inFormat, inMipCount):
+
+    # CAPS | HEIGHT | WIDTH | PIXELFORMAT | MIPMAPCOUNT | PITCH (LINEARSIZE for block compressed formats)
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x8
+
+    # TEXTURE (| COMPLEX | MIPMAP)
+    caps = 0x1000 | (0x400008 if inMipCount > 1 else 0)
+
+    if inFormat == LwDDS.DXGIFormat.B8G8R8A8_UNorm:
+        # RGB | ALPHAPIXELS, A8R8G8B8 masks
+        pixelFormat = [32, 0x41, 0, 32, 0x00ff0000, 0x0000ff00, 0x000000ff, 0xff000000]
+        pitch = inWidth * 4
+    elif inFormat == LwDDS.DXGIFormat.R16G16B16A16_Float:
+        # FOURCC, D3DFMT_A16B16G16R16F
+        pixelFormat = [32, 0x4, 113, 0, 0, 0, 0, 0]
+        pitch = inWidth * 8
+    elif inFormat in [LwDDS.DXGIFormat.BC4_UNorm, LwDDS.DXGIFormat.BC5_UNorm]:
+        # FOURCC, 'ATI1' or 'ATI2', linear size of the 4x4 blocks
+        pixelFormat = [32, 0x4, 0x31495441 if inFormat == LwDDS.DXGIFormat.BC4_UNorm else 0x32495441, 0, 0, 0, 0, 0]
+        flags = flags & ~0x8 | 0x80000
+        pitch = ((inWidth + 3) / 4) * ((inHeight + 3) / 4) * (8 if inFormat == LwDDS.DXGIFormat.BC4_UNorm else 16)
+    else:
+        return None
+
+    return HeaderStruct.pack(*(['DDS ', 124, flags, inHeight, inWidth, pitch, 1, inMipCount] + [0] * 11 + pixelFormat + [caps, 0, 0, 0, 0]))
+
+
+# Get the names of the header fields which differ between two headers
+def _diffHeaders(inHeader, inReference):
+    fields = HeaderFields
+    values = list(HeaderStruct.unpack(inHeader[0:HeaderStruct.size])) if len(inHeader) >= HeaderStruct.size else [ ]
+    reference = list(HeaderStruct.unpack(inReference[0:HeaderStruct.size]))
+
+    if len(inReference) > HeaderStruct.size:
+        fields = fields + HeaderDX10Fields
+        values = values + (list(HeaderDX10Struct.unpack(inHeader[HeaderStruct.size:])) if len(inHeader) == len(inReference) else [ ])
+        reference = reference + list(HeaderDX10Struct.unpack(inReference[HeaderStruct.size:]))
+
+    if len(values) != len(reference):
+        return ['length (%i, expected %i)' % (len(inHeader), len(inReference))]
+
+    return ['%s (0x%x, expected 0x%x)' % (field, value, expected) if not isinstance(value, str) else field for field, value, expected in zip(fields, values, reference) if value != expected]
+
+
+# Write a texture with LwDDS and get its header bytes
+def _writeHeader(inWidth, inHeight, inFormat, inMipCount, inSize):
+    path = os.path.join(tempfile.gettempdir(), 'PivotToolHeaderCheck.dds')
+    try:
+        channels = LwDDS.BlockEncoder.GetChannelCount(inFormat) if LwDDS.DXGIFormat.IsBlockCompressed(inFormat) else 4
+        LwDDS.WriteTexture2D(path, inWidth, inHeight, inFormat, inMipCount, [0.0] * (inWidth * inHeight * channels), LwDDS.DataFormat.Float32)
+        with open(path, 'rb') as fp:
+            return fp.read(inSize)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Get the (width, height, format, mip count) of a known good DDS file, None if LwDDS can't write it
+def _readReference(inPath):
+    with open(inPath, 'rb') as fp:
+        data = fp.read(HeaderStruct.size + HeaderDX10Struct.size)
+    if len(data) < HeaderStruct.size:
+        return None
+
+    values = dict(zip(HeaderFields, HeaderStruct.unpack(data[0:HeaderStruct.size])))
+    if values['magic'] != 'DDS ':
+        return None
+
+    format = None
+    if values['pf.flags'] & 0x4 and values['pf.fourCC'] == 113:
+        format = LwDDS.DXGIFormat.R16G16B16A16_Float
+    elif values['pf.flags'] & 0x40 and values['pf.rgbBitCount'] == 32 and values['pf.rBitMask'] == 0x00ff0000 and values['pf.aBitMask'] == 0xff000000:
+        format = LwDDS.DXGIFormat.B8G8R8A8_UNorm
+    elif values['pf.flags'] & 0x4 and values['pf.fourCC'] in [0x31495441, 0x32495441]:
+        format = LwDDS.DXGIFormat.BC4_UNorm if values['pf.fourCC'] == 0x31495441 else LwDDS.DXGIFormat.BC5_UNorm
+    elif values['pf.flags'] & 0x4 and values['pf.fourCC'] == 0x30315844 and len(data) == HeaderStruct.size + HeaderDX10Struct.size:
+        format = HeaderDX10Struct.unpack(data[HeaderStruct.size:])[0]
+
+    if format is None:
+        return None
+    return (values['width'], values['height'], format, max(1, values['mipMapCount']), data if values['pf.fourCC'] == 0x30315844 else data[0:HeaderStruct.size])
+
+
+# Compare the headers LwDDS writes against reference headers
+#   The built in references cover each format at a few sizes, inReferenceDir can point at a folder
+#   of known good files (e.g. written by texconv) which are checked field by field as well
+def checkHeaders(inReferenceDir=None):
+    cases = [ ]
+    for format in [LwDDS.DXGIFormat.B8G8R8A8_UNorm, LwDDS.DXGIFormat.R16G16B16A16_Float, LwDDS.DXGIFormat.BC4_UNorm, LwDDS.DXGIFormat.BC5_UNorm]:
+        for width, height in [(4, 4), (16, 8), (64, 32), (128, 128)]:
+            cases.append(('%ix%i (%i)' % (width, height, format), width, height, format, 1, referenceHeader(width, height, format, 1)))
+
+    skipped = [ ]
+    if inReferenceDir is not None:
+        for path in sorted(glob.glob(os.path.join(inReferenceDir, '*.dds'))):
+            reference = _readReference(path)
+            if reference is None:
+                skipped.append(os.path.basename(path))
+                continue
+            cases.append((os.path.basename(path), ) + reference)
+
+    failures = [ ]
+    for name, width, height, format, mipCount, reference in cases:
+        try:
+            differences = _diffHeaders(_writeHeader(width, height, format, mipCount, len(reference)), reference)
+        except Exception as ex:
+            differences = [str(ex)]
+
+        if len(differences) > 0:
+            failures.append('%s: %s' % (name, ', '.join(differences)))
+
+    return { 'passed': len(failures) == 0, 'count': len(cases), 'failures': failures, 'skipped': skipped }
+
+
+#
+# Suite
+#
+
+# Run every correctness check, returns a dictionary of check results
+def runChecks(inReferenceDir=None):
+    checks = { }
+    for name, fn in [('halfRoundTrip', checkHalfRoundTrip), ('halfEncode', checkHalfEncode), ('unorm8', checkUNorm8), ('blockCompression', checkBlockCompression), ('headers', lambda: checkHeaders(inReferenceDir))]:
+        start = time.time()
+        checks[name] = fn()
+        checks[name]['time'] = time.time() - start
+        print '%-16s %s (%.2fs)' % (name, 'PASS' if checks[name]['passed'] else 'FAIL', checks[name]['time'])
+    return checks
+
+
+# Run the codec benchmarks and checks, returns a results dictionary
+def runSuite(inMaxSize=1024, inMinTime=0.25, inThroughput=True, inChecks=True, inReferenceDir=None):
+    results = { 'platform': platform.platform(), 'python': sys.version.split()[0], 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'throughput': [ ], 'checks': { } }
+
+    if inChecks:
+        results['checks'] = runChecks(inReferenceDir)
+    if inThroughput:
+        results['throughput'] = benchmarkThroughput(inMaxSize, inMinTime)
+
+    return results
+
+
+# Compare throughput against a baseline, returns a list of regressions
+def compareResults(inResults, inBaseline, inThreshold=0.1):
+    baseline = dict([((item['name'], item['size']), item) for item in inBaseline['throughput']])
+
+    regressions = [ ]
+    for item in inResults['throughput']:
+        base = baseline.get((item['name'], item['size']), None)
+        if base is not None and item['mbps'] < base['mbps'] * (1.0 - inThreshold):
+            regressions.append({ 'name': item['name'], 'size': item['size'], 'baseline': base['mbps'], 'current': item['mbps'], 'change': (item['mbps'] - base['mbps']) / base['mbps'] })
+
+    return regressions
+
+
+# Print check failures and throughput regressions
+def printResults(inResults, inRegressions=None):
+    print '------------------------'
+    print 'Platform: %s, Python: %s' % (inResults['platform'], inResults['python'])
+
+    for name, check in sorted(inResults['checks'].iteritems()):
+        print '%s: %s' % (name, 'PASS' if check['passed'] else 'FAIL')
+
+        if name == 'halfRoundTrip':
+            for className, stats in sorted(check['classes'].iteritems()):
+                print '    %-10s %6i values, %6i exact, %i decode errors, %i contract errors' % (className, stats['count'], stats['exact'], stats['decodeErrors'], stats['contractErrors'])
+                for example in stats['examples']:
+                    print '        %s' % example
+        for example in check.get('examples', [ ]) + check.get('failures', [ ]):
+            print '    %s' % example
+        for skipped in check.get('skipped', [ ]):
+            print '    Skipped %s (format not supported by LwDDS)' % skipped
+
+    if inRegressions is not None:
+        print '------------------------'
+        print 'Regressions: %i' % len(inRegressions)
+        for regression in inRegressions:
+            print '    %-40s %5i %10.3f -> %10.3f MB/s (%+.1f%%)' % (regression['name'], regression['size'], regression['baseline'], regression['current'], regression['change'] * 100.0)
+    print '------------------------'
@@ -0,0 +1,157 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import random
+
+from ..Nodes import NodeTypes
+
+# Defaults for any case parameter which isn't given
+CaseDefaults = {
+    'elements': 100,
+    'sets': 1,
+    'depth': 6,
+    'branching': 4,
+    'skinned': 0.0,
+    'joints': 3,
+    'uvs': 24,
+    'textures': [ ],
+    'groups': 0.0,
+    'collapseGroups': False,
+    'seed': 1
+}
+
+
+# Get a case with every parameter filled in
+def getCaseParams(inCase):
+    params = dict(CaseDefaults)
+    params.update(inCase)
+    return params
+
+
+# Get the parent of each element in a tree of inCount elements
+#   Parents are filled breadth first with inBranching children each until inDepth levels exist,
+#   after that the deepest parents take the remaining elements in turn (inDepth 0 = no limit)
+def _getParents(inCount, inDepth, inBranching):
+
+    parents = [None]
+    levels = [1]
+    children = [0]
+
+    cursor = 0
+    overflow = [ ]
+    for i in range(1, inCount):
+        while cursor < i and ((inDepth > 0 and levels[cursor] >= inDepth) or children[cursor] >= inBranching):
+            cursor = cursor + 1
+
+        if cursor < i:
+            parent = cursor
+        else:
+            if len(overflow) == 0:
+                overflow = [node for node in range(i) if levels[node] == max(1, inDepth - 1)]
+            parent = overflow[i % len(overflow)]
+
+        parents.append(parent)
+        levels.append(levels[parent] + 1)
+        children.append(0)
+        children[parent] = children[parent] + 1
+
+    return parents
+
+
+# Generate a synthetic scene description (see MemoryBackend.loadScene) for a benchmark case
+#   Each pivot set holds a tree of mesh elements, a fraction of which are skinned to a short chain
+#   of joints parented beneath them. Another fraction (groups) are transforms without a mesh, which
+#   are never skinned.
+def generateScene(inCase):
+    params = getCaseParams(inCase)
+    rand = random.Random(params['seed'])
+
+    description = { 'nodes': [ ], 'skinClusters': [ ], 'connections': [ ] }
+    nodeData = { 'Textures': [{ 'RGB': rgb, 'A': a, 'OutputPath': None } for rgb, a in params['textures']] }
+    if params['collapseGroups']:
+        nodeData['Advanced'] = { 'CollapseGroups': True }
+    nodeData = json.dumps(nodeData)
+
+    for setIndex in range(params['sets']):
+        inputNode = 'pivotSet%i' % setIndex
+        outputNode = 'pivotSetOutput%i' % setIndex
+
+        description['nodes'].append({ 'name': inputNode, 'type': NodeTypes.PivotNode, 'attributes': { 'nodeData': nodeData } })
+        description['nodes'].append({ 'name': outputNode, 'type': NodeTypes.PivotOutputNode, 'attributes': { 'visibility': False } })
+        description['connections'].append(['%s.outputPivotNode' % inputNode, '%s.inputPivotNode' % outputNode])
+
+        # Spread the elements over the sets, the first sets take any remainder
+        count = params['elements'] / params['sets'] + (1 if setIndex < params['elements'] % params['sets'] else 0)
+        parents = _getParents(count, params['depth'], params['branching'])
+
+        for i in range(count):
+            name = 's%ie%i' % (setIndex, i)
+            size = rand.uniform(0.1, 2.0)
+
+            description['nodes'].append({
+                'name': name,
+                'parent': inputNode if parents[i] is None else 's%ie%i' % (setIndex, parents[i]),
+                'translate': [rand.uniform(-10.0, 10.0) for axis in range(3)],
+                'rotate': [rand.uniform(-180.0, 180.0) for axis in range(3)],
+                'scale': [rand.uniform(0.5, 2.0)] * 3,
+                'mesh': { 'bounds': [-size, -size, -size, size, size, size], 'uvs': params['uvs'] }
+            })
+
+            # Roots are always meshes, the output is combined from the meshes directly beneath it
+            if params['groups'] > 0.0 and parents[i] is not None and rand.random() < params['groups']:
+                del description['nodes'][-1]['mesh']
+                continue
+
+            if rand.random() >= params['skinned']:
+                continue
+
+            joints = [ ]
+            for joint in range(params['joints']):
+                joints.append('%sj%i' % (name, joint))
+                description['nodes'].append({ 'name': joints[-1], 'type': 'joint', 'parent': name if joint == 0 else joints[-2], 'translate': [0.0, size, 0.0] })
+
+            description['skinClusters'].append({
+                'name': '%sSkin' % name,
+                'mesh': name,
+                'influences': joints,
+                'primaryInfluences': [uv * params['joints'] / params['uvs'] for uv in range(params['uvs'])]
+            })
+
+    return description
+
+
+# Build a scene description in the open Maya scene (the plugin must be loaded)
+#   Meshes are planes with roughly the requested number of UVs, skinned meshes are bound with a
+#   single influence per vertex.
+def buildMayaScene(inDescription):
+    import maya.cmds as cmds
+
+    for desc in inDescription['nodes']:
+        if 'mesh' in desc:
+            bounds = desc['mesh']['bounds']
+            name = cmds.polyPlane(n=desc['name'], sx=max(1, desc['mesh']['uvs'] / 2 - 1), sy=1, w=bounds[3] - bounds[0], h=bounds[5] - bounds[2], ch=False)[0]
+        else:
+            name = cmds.createNode(desc.get('type', 'transform'), n=desc['name'])
+
+        if desc.get('parent', None) is not None:
+            cmds.parent(name, desc['parent'], r=True)
+
+        for attr, flag in [('translate', 't'), ('rotate', 'ro'), ('scale', 's')]:
+            if attr in desc:
+                cmds.xform(desc['name'], **{ flag: desc[attr], 'os': True })
+
+        for attr, value in desc.get('attributes', { }).iteritems():
+            if isinstance(value, basestring):
+                cmds.setAttr('%s.%s' % (desc['name'], attr), value, type='string')
+            else:
+                cmds.setAttr('%s.%s' % (desc['name'], attr), value)
+
+    for desc in inDescription['skinClusters']:
+        cmds.skinCluster(desc['influences'], desc['mesh'], n=desc['name'], tsb=True, mi=1)
+
+    for source, destination in inDescription['connections']:
+        cmds.connectAttr(source, destination)
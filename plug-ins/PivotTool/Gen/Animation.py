@@ -0,0 +1,188 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import array
+import math
+import os
+import tempfile
+
+from ..Util import LwDDS
+from ..Util import Matrix
+
+# NOTE: Frames are sampled from the live scene (see SceneBackend.getWorldMatricesAt), so bakes have to
+#       run on the main thread.
+
+# Baked textures are written as FP16, like the float pivot outputs
+Format = LwDDS.DXGIFormat.R16G16B16A16_Float
+
+# Largest number of elements (or frames) a baked texture can hold, the widest texture D3D11 allows
+MaxSize = 16384
+
+# Number of frames sampled between progress updates
+ChunkSize = 8
+
+# Textures written by a bake, one texel per element per frame
+#   Position holds the world pivot in RGB and the uniform scale relative to the bind pose in alpha,
+#   Rotation holds the rotation from the bind pose as a quaternion (x, y, z, w)
+Channels = ['Position', 'Rotation']
+
+
+# Get the filename of a set's baked texture, inChannel is one of Channels
+def getFilename(inRootNode, inChannel):
+    return '%s_anim_%s.dds' % (inRootNode, inChannel)
+
+
+# Get the frames sampled from inStart to inEnd (inclusive) every inStep frames
+def getFrames(inStart, inEnd, inStep):
+    if inStep <= 0.0:
+        raise Exception("Animation bakes need a frame step above 0, not %g!" % inStep)
+    if inEnd < inStart:
+        raise Exception("Animation bakes can't end (%g) before they start (%g)!" % (inEnd, inStart))
+
+    count = int(math.floor((inEnd - inStart) / inStep + 1e-6)) + 1
+    return [inStart + i * inStep for i in range(count)]
+
+
+# Get the rows of the 3x3 rotation in a matrix with its scale removed, and the scale of each axis
+def _getRotation(inM):
+    rows = [ ]
+    scales = [ ]
+    for axis in range(3):
+        row = inM[axis * 4:axis * 4 + 3]
+        length = math.sqrt(row[0] * row[0] + row[1] * row[1] + row[2] * row[2])
+        rows.append([c / length for c in row] if length > 0.0 else [1.0 if i == axis else 0.0 for i in range(3)])
+        scales.append(length)
+    return (rows, scales)
+
+
+# Get a quaternion (x, y, z, w) from the rows of a 3x3 rotation, rows are axes as in Maya matrices
+def _getQuaternion(inRows):
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = inRows
+
+    trace = m00 + m11 + m22
+    if trace > 0.0:
+        s = 0.5 / math.sqrt(trace + 1.0)
+        return [(m12 - m21) * s, (m20 - m02) * s, (m01 - m10) * s, 0.25 / s]
+    if m00 > m11 and m00 > m22:
+        s = 2.0 * math.sqrt(max(0.0, 1.0 + m00 - m11 - m22))
+        return [0.25 * s, (m10 + m01) / s, (m20 + m02) / s, (m12 - m21) / s]
+    if m11 > m22:
+        s = 2.0 * math.sqrt(max(0.0, 1.0 + m11 - m00 - m22))
+        return [(m10 + m01) / s, 0.25 * s, (m21 + m12) / s, (m20 - m02) / s]
+    s = 2.0 * math.sqrt(max(0.0, 1.0 + m22 - m00 - m11))
+    return [(m20 + m02) / s, (m21 + m12) / s, 0.25 * s, (m01 - m10) / s]
+
+
+#
+# Bakes the transforms of a pivot set's elements over a frame range into textures
+#   Each frame is a row and each element a column (its index), so a shader plays a clip back by
+#   sampling a row per frame. Rotations and scales are relative to the pose the set was built in, the
+#   one its pivot textures hold, so a vertex moves by rotating it about its bind pivot and moving that
+#   to the baked pivot. All element matrices of a frame are read in one go into a single array, and
+#   rows are streamed to disk as they're baked, so memory doesn't grow with the clip length.
+#
+class AnimationBake:
+
+    # inElements lists the (index, node) of every element, inIndexCount is the width of the textures.
+    # inScene is the scene holding the pose the set was built in.
+    def __init__(self, inRootNode, inElements, inIndexCount, inFrames, inScene):
+        if inIndexCount > MaxSize:
+            raise Exception("Animation bakes hold up to %i elements, '%s' has %i!" % (MaxSize, inRootNode, inIndexCount))
+        if len(inFrames) > MaxSize:
+            raise Exception("Animation bakes hold up to %i frames, not %i!" % (MaxSize, len(inFrames)))
+
+        self.mRootNode = inRootNode
+        self.mIndices = [index for index, node in inElements]
+        self.mNodes = [node for index, node in inElements]
+        self.mWidth = inIndexCount
+        self.mFrames = inFrames
+
+        # Pivots are carried into object space, rotations are inverted (transposed) and scales averaged
+        self.mPivots = [ ]
+        self.mInverseRotations = [ ]
+        self.mScales = [ ]
+        for node in self.mNodes:
+            world = inScene.getWorldMatrix(node)
+            self.mPivots.append(Matrix.transformPoint(inScene.getWorldPivot(node), Matrix.inverse(world)))
+
+            rows, scales = _getRotation(world)
+            self.mInverseRotations.append([[rows[j][i] for j in range(3)] for i in range(3)])
+            self.mScales.append(sum(scales) / 3.0 if sum(scales) > 0.0 else 1.0)
+
+    # Get the number of frames baked
+    def getFrameCount(self):
+        return len(self.mFrames)
+
+    # Get the paths the textures are written to, in the order of Channels
+    def getOutputPaths(self):
+        return [os.path.join(tempfile.gettempdir(), getFilename(self.mRootNode, channel)) for channel in Channels]
+
+    # Get the path a texture is written to before it's committed
+    def getPendingPath(self, inPath):
+        return inPath + '.pending'
+
+    # Sample every frame and write the textures to their pending paths, a chunk of frames at a time
+    #   Yields the fraction of frames baked after each chunk. inScene has to be the live scene.
+    def bake(self, inScene):
+
+        count = len(self.mNodes)
+        matrices = array.array('d', [0.0]) * (count * 16)
+
+        # Rows are overwritten in place every frame, texels without an element keep the bind pose
+        positions = array.array('f', [0.0, 0.0, 0.0, 1.0]) * self.mWidth
+        rotations = array.array('f', [0.0, 0.0, 0.0, 1.0]) * self.mWidth
+
+        writers = [ ]
+        try:
+            for path in self.getOutputPaths():
+                writers.append(LwDDS.TextureRowWriter(self.getPendingPath(path), self.mWidth, len(self.mFrames), Format))
+
+            for frame, time in enumerate(self.mFrames):
+                inScene.getWorldMatricesAt(self.mNodes, time, matrices)
+
+                for element in range(count):
+                    m = matrices[element * 16:element * 16 + 16]
+                    texel = self.mIndices[element] * 4
+
+                    pivot = Matrix.transformPoint(self.mPivots[element], m)
+                    rows, scales = _getRotation(m)
+                    positions[texel:texel + 4] = array.array('f', [pivot[0], pivot[1], pivot[2], (sum(scales) / 3.0) / self.mScales[element]])
+
+                    # Rotation from the bind pose, inverse(bind) * frame
+                    inverse = self.mInverseRotations[element]
+                    delta = [[inverse[i][0] * rows[0][j] + inverse[i][1] * rows[1][j] + inverse[i][2] * rows[2][j] for j in range(3)] for i in range(3)]
+                    quaternion = _getQuaternion(delta)
+
+                    # Keep to the previous frame's hemisphere, so interpolating between frames takes the short way round
+                    if sum([quaternion[i] * rotations[texel + i] for i in range(4)]) < 0.0:
+                        quaternion = [-c for c in quaternion]
+                    rotations[texel:texel + 4] = array.array('f', quaternion)
+
+                writers[0].WriteRow(positions, LwDDS.DataFormat.Float32)
+                writers[1].WriteRow(rotations, LwDDS.DataFormat.Float32)
+
+                if (frame + 1) % ChunkSize == 0 or frame + 1 == len(self.mFrames):
+                    yield float(frame + 1) / len(self.mFrames)
+
+            for writer in writers:
+                writer.Close()
+        except:
+            for writer in writers:
+                writer.Abort()
+            raise
+
+    # Move the written textures into place
+    def commit(self):
+        for path in self.getOutputPaths():
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(self.getPendingPath(path), path)
+
+    # Remove any textures which were written but not committed
+    def discard(self):
+        for path in self.getOutputPaths():
+            if os.path.exists(self.getPendingPath(path)):
+                os.remove(self.getPendingPath(path))
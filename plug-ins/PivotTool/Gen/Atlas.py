@@ -0,0 +1,151 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import os
+
+from ..Util import LwDDS
+
+# NOTE: Nothing in here may import Maya, the render process writes atlas regions for its jobs.
+
+
+# Get the path a pivot set writes its region of an atlas texture to before it's committed
+#   Every set in an atlas writes the same textures, so pending regions are named after the set as well
+def getPendingPath(inPath, inSetName):
+    return '%s.%s.pending' % (inPath, inSetName)
+
+
+# Find room for inCount elements in an atlas with inCapacity texels
+#   inRegions lists the (offset, count) of the other sets in the atlas and inPrevious the set's region
+#   from its last build (or None). The set keeps its offset while it fits there, which also keeps the
+#   rest of its old region reserved when it shrinks, otherwise it takes the first gap it fits in.
+#   Returns the (offset, count) of the region, or None when the atlas is full.
+def allocateRegion(inRegions, inCapacity, inCount, inPrevious=None):
+    regions = sorted([tuple(region) for region in inRegions])
+
+    if inPrevious is not None:
+        offset, count = inPrevious
+        overlapped = [True for start, size in regions if start < offset + max(count, inCount) and offset < start + size]
+        if len(overlapped) == 0 and offset + max(count, inCount) <= inCapacity:
+            return (offset, max(count, inCount))
+
+    cursor = 0
+    for start, size in regions:
+        if start - cursor >= inCount:
+            return (cursor, inCount)
+        cursor = max(cursor, start + size)
+
+    if inCapacity - cursor >= inCount:
+        return (cursor, inCount)
+    return None
+
+
+#
+# Region of an atlas one pivot set writes its elements into
+#   Atlases are a fixed size and hold the elements of several sets in one index space, each set
+#   taking a contiguous run of indices. Texels are laid out in rows as usual, so a set's textures only
+#   need to cover the rows its run touches.
+#
+class AtlasRegion:
+
+    def __init__(self, inName, inSetName, inWidth, inHeight, inOffset, inCount):
+        self.mName = inName
+        self.mSetName = inSetName
+        self.mWidth = inWidth
+        self.mHeight = inHeight
+        self.mOffset = inOffset
+        self.mCount = inCount
+
+    # Get the name of the atlas, its textures are named after it rather than the set
+    def getName(self):
+        return self.mName
+
+    # Get the name of the pivot set writing this region
+    def getSetName(self):
+        return self.mSetName
+
+    def getWidth(self):
+        return self.mWidth
+
+    def getHeight(self):
+        return self.mHeight
+
+    # Get the number of elements the atlas holds
+    def getCapacity(self):
+        return self.mWidth * self.mHeight
+
+    # Get the index of the set's first element within the atlas
+    def getOffset(self):
+        return self.mOffset
+
+    # Get the number of elements the set writes
+    def getCount(self):
+        return self.mCount
+
+    # Get the index of the first texel of the first row the region touches
+    def getFirstTexel(self):
+        return (self.mOffset / self.mWidth) * self.mWidth
+
+    # Get the number of rows the region touches
+    def getRowCount(self):
+        return max(1, (self.mOffset + self.mCount + self.mWidth - 1) / self.mWidth - self.mOffset / self.mWidth)
+
+    # Get the region as a plain dictionary, as render jobs carry it
+    def toDict(self):
+        return { 'name': self.mName, 'width': self.mWidth, 'height': self.mHeight, 'offset': self.mOffset, 'count': self.mCount }
+
+
+# Get the region of a pivot set from a dictionary written by AtlasRegion.toDict, None stays None
+def fromDict(inSetName, inData):
+    if inData is None:
+        return None
+    return AtlasRegion(inData['name'], inSetName, inData['width'], inData['height'], inData['offset'], inData['count'])
+
+
+# Write an atlas texture with every texel cleared, for the first set committed to it
+def createTexture(inPath, inWidth, inHeight, inFormat):
+    remaining = LwDDS.DXGIFormat.GetSurfaceSize(inFormat, inWidth, inHeight)
+    with open(inPath, 'wb') as fp:
+        fp.write(LwDDS.CreateHeader(inWidth, inHeight, inFormat, 1).Serialize())
+        while remaining > 0:
+            size = min(remaining, 1 << 20)
+            fp.write('\0' * size)
+            remaining = remaining - size
+
+
+# Copy a set's elements from the texture written to inPendingPath into the atlas texture at inPath
+#   The pending texture covers the rows of inRegion (see Texture.write), only the set's own texels are
+#   copied so sets sharing a row leave each other alone. The atlas texture is created if it doesn't
+#   exist, or was written at a different size. Sets sharing an atlas have to write the same formats.
+def commitRegion(inPendingPath, inPath, inRegion):
+    pending = LwDDS.ReadHeader(inPendingPath)
+    format = pending['format']
+    if LwDDS.DXGIFormat.IsBlockCompressed(format):
+        raise Exception("Atlas textures can't be block compressed!")
+
+    if os.path.exists(inPath):
+        header = LwDDS.ReadHeader(inPath)
+        if (header['width'], header['height']) != (inRegion.getWidth(), inRegion.getHeight()):
+            print "WARNING: '%s' is %ix%i, it's cleared for a %ix%i atlas. Rebuild the other sets in atlas '%s'." % (os.path.basename(inPath), header['width'], header['height'], inRegion.getWidth(), inRegion.getHeight(), inRegion.getName())
+            os.remove(inPath)
+        elif header['format'] != format:
+            raise Exception("'%s' is written as format %i, but %s writes format %i! Sets sharing atlas '%s' need the same outputs and formats." % (os.path.basename(inPath), header['format'], inRegion.getSetName(), format, inRegion.getName()))
+
+    if not os.path.exists(inPath):
+        createTexture(inPath, inRegion.getWidth(), inRegion.getHeight(), format)
+    header = LwDDS.ReadHeader(inPath)
+
+    size = LwDDS.DXGIFormat.GetBytesPerPixel(format)
+    with open(inPendingPath, 'rb') as fp:
+        fp.seek(pending['dataOffset'] + (inRegion.getOffset() - inRegion.getFirstTexel()) * size)
+        data = fp.read(inRegion.getCount() * size)
+    if len(data) != inRegion.getCount() * size:
+        raise Exception("'%s' is truncated!" % inPendingPath)
+
+    with open(inPath, 'r+b') as fp:
+        fp.seek(header['dataOffset'] + inRegion.getOffset() * size)
+        fp.write(data)
+
+    os.remove(inPendingPath)
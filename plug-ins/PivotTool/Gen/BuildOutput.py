@@ -4,12 +4,25 @@
     For license details please check: PivotTool-License.txt
 """
 
-import maya.cmds as cmds
+import threading
+import time
+import traceback
 
 import Builder
+import LOD
+import RenderJob
+import RenderProcess
+import SnapshotFile
 import Tasks
 import Trees
 from RenderType import *
+from ..Scene import Backend
+
+# Guards the per set timers, tasks for the same set can finish on different threads
+TimeLock = threading.Lock()
+
+# Number of hierarchy nodes the per element stages process between progress updates
+ChunkSize = 64
 
 
 # Container for builder context actions
@@ -18,33 +31,188 @@ class BuildOutputState():
         self.mView = inView
         self.mBuilder = None
         self.mCachedHierarchy = None
+        self.mScene = None
+        self.mError = None
+        self.mTime = 0.0
+        self.mStash = None
+        self.mCommitted = False
+        self.mRenderJob = None
+        self.mRenderReport = None
 
     def getView(self):
         return self.mView
 
+    def getScene(self):
+        return self.mScene
+
+    def hasFailed(self):
+        return self.mError is not None
+
+    def wasCancelled(self):
+        return self.mError == Tasks.CancelledError
+
     def getBuilder(self):
         return self.mBuilder
 
     def getHierarchy(self):
         return self.mCachedHierarchy
 
+    # Put back the output from before the build, if the build hasn't been committed
+    def rollback(self):
+        if self.mCommitted:
+            return
+
+        if self.mBuilder is not None:
+            self.mBuilder.discardTextures()
+
+        if self.mStash is not None:
+            Backend.getBackend().restoreChildren(self.getView().getOutputNode(), self.mStash)
+            self.mStash = None
+
+
+# Wrapper which runs a task against a single pivot set
+#   Failures are recorded on the set's state rather than stopping the other sets in a batch
+class SetTask(Tasks.Task):
+    def __init__(self, inTask, inState):
+        self.mTask = inTask
+        self.mState = inState
+
+    def run(self, inState):
+        for fraction in self.runChunks(inState):
+            pass
+
+    def runChunks(self, inState):
+        if self.mState.hasFailed():
+            return
+
+        chunks = self.mTask.runChunks(self.mState)
+        while True:
+            start = time.time()
+            fraction = None
+            try:
+                fraction = next(chunks)
+            except StopIteration:
+                pass
+            except:
+                self.mState.mError = traceback.format_exc()
+                print self.mState.mError
+
+            with TimeLock:
+                self.mState.mTime = self.mState.mTime + (time.time() - start)
+
+            if fraction is None:
+                return
+            yield fraction
+
+    def getDisplayString(self):
+        return '%s [%s]' % (self.mTask.getDisplayString(), self.mState.getView().getRootNode())
+
+    def getTimeImpact(self):
+        return self.mTask.getTimeImpact()
+
+    def getStageName(self):
+        return self.mTask.getStageName()
+
+    # Data names are scoped to the set, so tasks for different sets never wait on each other (unless the
+    # task reads another set's data, see BuildTask.getSharedInputs)
+    def getInputs(self):
+        return [(self.mState, name) for name in self.mTask.getInputs()] + self.mTask.getSharedInputs()
+
+    def getOutputs(self):
+        return [(self.mState, name) for name in self.mTask.getOutputs()]
+
+    def isMayaBound(self):
+        return self.mTask.isMayaBoundFor(self.mState)
+
+
+# Task to capture the scene state for every set in one pass, the remaining build stages read from this
+class ExtractSceneTask(Tasks.Task):
+    def __init__(self, inStates):
+        self.mStates = inStates
+
+    def run(self, inState):
+        states = [state for state in self.mStates if not state.hasFailed()]
+
+        scene = Backend.getBackend().extract([state.getView().getOutputNode() for state in states])
+
+        for state in states:
+            state.mScene = scene
+
+    def getDisplayString(self):
+        return 'Extract Scene...'
+
+    def getTimeImpact(self):
+        return 10.0
+
+    def getInputs(self):
+        return [(state, 'output') for state in self.mStates]
+
+    def getOutputs(self):
+        return [(state, 'scene') for state in self.mStates]
+
+
+#
+# Task which runs against a single pivot set
+#   Inputs and outputs name the parts of the set's state (and scene) the task reads and writes:
+#     output    - the output node hierarchy in the scene
+#     scene     - the extracted scene
+#     builder   - the builder and the cached hierarchy
+#     textures  - the rendered texture data
+#     files     - the textures written to disk
+#     job       - the render job
+#     animation - the baked animation textures
+#     nodeData  - the settings saved on the pivot node
+#
+class BuildTask(Tasks.Task):
+
+    # Get whether the task has to run on the main thread for one set, as Task.isMayaBound (which SetTask
+    #   answers with this). Tasks default to the main thread, inState is the set's BuildOutputState.
+    def isMayaBoundFor(self, inState):
+        return True
+
+    # Get the (state, name) pairs of the data the task reads from other sets
+    def getSharedInputs(self):
+        return [ ]
+
+
+#
+# Task which calls a builder function for every node in the set's hierarchy, a chunk at a time
+#
+class HierarchyTask(BuildTask):
+
+    # Get the function to call with each (node, parent)
+    def getFunction(self, inState):
+        return None
+
+    def run(self, inState):
+        for fraction in self.runChunks(inState):
+            pass
+
+    def runChunks(self, inState):
+        function = self.getFunction(inState)
+        nodes = inState.getHierarchy().flatten()
+
+        for start in range(0, len(nodes), ChunkSize):
+            for node, parent in nodes[start:start + ChunkSize]:
+                function(node, parent)
+            yield float(min(start + ChunkSize, len(nodes))) / len(nodes)
+
 
 # Task to clean the pivot output node
-class CleanOutputTask(Tasks.Task):
+class CleanOutputTask(BuildTask):
     def __init__(self):
         pass
 
     def run(self, inState):
 
+        scene = Backend.getBackend()
+
         # If we've previously generated an output then cache it's name since we can preserve it
-        outputs = cmds.listConnections('%s.outputMesh' % inState.getView().getOutputNode())
-        output = outputs[0] if outputs is not None and len(outputs) > 0 else None
-        inState.mOutputName = output
+        outputs = scene.getConnections(inState.getView().getOutputNode(), 'outputMesh')
+        inState.mOutputName = outputs[0] if len(outputs) > 0 else None
 
-        children = cmds.listRelatives(inState.getView().getOutputNode(), f=True)
-        if children is not None:
-            for child in children:
-                cmds.delete(child)
+        # Keep the old output to one side until the build is committed, so it can be put back
+        inState.mStash = scene.stashChildren(inState.getView().getOutputNode())
 
     def getDisplayString(self):
         return 'Cleaning Output...'
@@ -52,25 +220,20 @@ class CleanOutputTask(Tasks.Task):
     def getTimeImpact(self):
         return 5.0
 
+    def getInputs(self):
+        return [ ]
+
+    def getOutputs(self):
+        return ['output']
+
 
 # Task to copy the mesh hierarchy from the input to the output
-class CopyHierarchyTask(Tasks.Task):
+class CopyHierarchyTask(BuildTask):
     def __init__(self):
         pass
 
     def run(self, inState):
-
-        # JB: duplicate -un copies the root nodes, which is annoying
-        existingNodes = cmds.ls(type='PivotNode')
-
-        children = cmds.listRelatives(inState.getView().getRootNode(), f=True)
-        children = cmds.duplicate(children, un=True, rr=True, rc=True)
-        children = cmds.parent(children, inState.getView().getOutputNode())
-
-        # Clean up the extra nodes
-        newNodes = list(set(cmds.ls(type='PivotNode')) - set(existingNodes))
-        if newNodes is not None and len(newNodes) > 0:
-            cmds.delete(newNodes)
+        Backend.getBackend().duplicateChildren(inState.getView().getRootNode(), inState.getView().getOutputNode())
 
     def getDisplayString(self):
         return 'Copy Inputs...'
@@ -78,9 +241,15 @@ class CopyHierarchyTask(Tasks.Task):
     def getTimeImpact(self):
         return 10.0
 
+    def getInputs(self):
+        return ['output']
+
+    def getOutputs(self):
+        return ['output']
+
 
 # Task to build the cached hierarchy and fill relevant information
-class BuildHierarchyTask(Tasks.Task):
+class BuildHierarchyTask(BuildTask):
     def __init__(self):
         pass
 
@@ -95,9 +264,9 @@ class BuildHierarchyTask(Tasks.Task):
         print '%s%s' % (pad, inNode.mNode)
 
     def run(self, inState):
-        inState.mBuilder = Builder.Builder(inState.getView())
+        inState.mBuilder = Builder.Builder(inState.getView(), inState.getScene())
 
-        hierarchy = Trees.getMeshHierarchy(inState.getView().getOutputNode())
+        hierarchy = Trees.getMeshHierarchy(inState.getScene().getFullPath(inState.getView().getOutputNode()), inState.getScene())
         hierarchy = hierarchy.filterByShape(['mesh'])
         if hierarchy is None:
             raise Exception('Filtered hierarchy contains no valid mesh elements!')
@@ -105,10 +274,19 @@ class BuildHierarchyTask(Tasks.Task):
         hierarchy.mDataBuilder = None
 
         # The pivot root isn't always going to be the primary root of the object, so ensure it's invalidated
-        if len(hierarchy.mChildren) <= 1:
-            hierarchy.mChildren[0].iterate(inState.getBuilder().fillHierarchyInfo)
-        else:
-            hierarchy.iterate(inState.getBuilder().fillHierarchyInfo)
+        root = hierarchy.mChildren[0] if len(hierarchy.mChildren) <= 1 else hierarchy
+        nodes = root.flatten()
+        inState.getBuilder().groupSkeletons(nodes)
+        for node, parent in nodes:
+            inState.getBuilder().fillHierarchyInfo(node, parent)
+
+        # Sets over their element budget are filled again once leaves have been merged
+        if inState.getBuilder().reduceHierarchy(nodes):
+            for node, parent in nodes:
+                inState.getBuilder().fillHierarchyInfo(node, parent)
+
+        inState.getBuilder().orderElements(nodes)
+        inState.getBuilder().placeInAtlas(nodes)
 
         inState.mCachedHierarchy = hierarchy
 
@@ -121,9 +299,15 @@ class BuildHierarchyTask(Tasks.Task):
     def getTimeImpact(self):
         return 5.0
 
+    def getInputs(self):
+        return ['scene']
+
+    def getOutputs(self):
+        return ['builder']
+
 
 # Task to setup builder textures
-class GenerateTextureInfoTask(Tasks.Task):
+class GenerateTextureInfoTask(BuildTask):
     def __init__(self):
         pass
 
@@ -136,14 +320,96 @@ class GenerateTextureInfoTask(Tasks.Task):
     def getTimeImpact(self):
         return 5.0
 
+    def getInputs(self):
+        return ['builder']
 
-# Task to perform UV positioning
-class LayoutUVsTask(Tasks.Task):
+    def getOutputs(self):
+        return ['builder', 'textures']
+
+
+# Get the name each element of a set is matched across LODs by (see LOD.getMatchName)
+#   Names come from the input nodes the elements were copied from, which builds don't rename
+def _getMatchNames(inState, inPattern):
+    scene = Backend.getBackend()
+    inputs = Trees.getMeshHierarchy(scene.getFullPath(inState.getView().getRootNode()), scene).filterByShape(['mesh'])
+    sources = LOD.getSourceNodes(inState.getHierarchy(), inputs)
+
+    return dict([(data.getNode(), LOD.getMatchName(sources.get(data.getNode(), data.getNode()), inPattern)) for data in inState.getBuilder().mElements])
+
+
+# Task to lay a LOD set out against its primary set's elements, in place of GenerateTextureInfoTask
+#   inPrimary is the primary set's BuildOutputState, see Builder.mapToPrimary
+class MapLODTask(BuildTask):
+    def __init__(self, inPrimary):
+        self.mPrimary = inPrimary
+
+    def run(self, inState):
+        if self.mPrimary.hasFailed():
+            raise Exception("Can't lay out LOD '%s', its primary set '%s' failed to build!" % (inState.getView().getRootNode(), self.mPrimary.getView().getRootNode()))
+
+        pattern = inState.getView().getAdvancedView().getLODSuffix()
+        names = _getMatchNames(inState, pattern)
+        primaryNames = _getMatchNames(self.mPrimary, pattern)
+
+        nodes = [(node, parent) for node, parent in inState.getHierarchy().flatten()]
+        inState.getBuilder().mapToPrimary(self.mPrimary.getBuilder(), nodes, names, primaryNames)
+
+    def getDisplayString(self):
+        return 'Map LOD Elements...'
+
+    def getTimeImpact(self):
+        return 5.0
+
+    def getInputs(self):
+        return ['builder']
+
+    def getOutputs(self):
+        return ['builder']
+
+    def getSharedInputs(self):
+        return [(self.mPrimary, 'builder')]
+
+
+# Task to bake the animation of the set's elements into textures (see Animation.AnimationBake)
+#   Frames are sampled from the live scene, before the output is combined, so this stays on the main
+#   thread. Sets which don't bake animation skip straight through.
+class BakeAnimationTask(BuildTask):
     def __init__(self):
         pass
 
     def run(self, inState):
-        inState.getHierarchy().iterate(inState.getBuilder().layoutUVs)
+        for fraction in self.runChunks(inState):
+            pass
+
+    def runChunks(self, inState):
+        scene = Backend.getBackend()
+        bake = inState.getBuilder().createAnimationBake(scene)
+        if bake is None:
+            return
+
+        for fraction in bake.bake(scene):
+            yield fraction
+
+    def getDisplayString(self):
+        return 'Bake Animation...'
+
+    def getTimeImpact(self):
+        return 20.0
+
+    def getInputs(self):
+        return ['builder', 'output']
+
+    def getOutputs(self):
+        return ['animation']
+
+
+# Task to perform UV positioning
+class LayoutUVsTask(HierarchyTask):
+    def __init__(self):
+        pass
+
+    def getFunction(self, inState):
+        return inState.getBuilder().layoutUVs
 
     def getDisplayString(self):
         return 'Layout UVs...'
@@ -151,14 +417,20 @@ class LayoutUVsTask(Tasks.Task):
     def getTimeImpact(self):
         return 30.0
 
+    def getInputs(self):
+        return ['builder']
+
+    def getOutputs(self):
+        return ['output']
+
 
 # Task to fill texture data
-class RenderTexturesTask(Tasks.Task):
+class RenderTexturesTask(HierarchyTask):
     def __init__(self):
         pass
 
-    def run(self, inState):
-        inState.getHierarchy().iterate(inState.getBuilder().renderTextures)
+    def getFunction(self, inState):
+        return inState.getBuilder().renderTextures
 
     def getDisplayString(self):
         return 'Render Textures...'
@@ -166,9 +438,19 @@ class RenderTexturesTask(Tasks.Task):
     def getTimeImpact(self):
         return 30.0
 
+    def getInputs(self):
+        return ['scene', 'builder']
+
+    def getOutputs(self):
+        return ['textures']
+
+    # Rendering only reads the extracted scene, which is safe off the main thread once it's detached
+    def isMayaBoundFor(self, inState):
+        return inState.getScene() is None or not inState.getScene().isDetached()
+
 
 # Task to write textures to disk
-class WriteTexturesTask(Tasks.Task):
+class WriteTexturesTask(BuildTask):
     def __init__(self):
         pass
 
@@ -181,61 +463,100 @@ class WriteTexturesTask(Tasks.Task):
     def getTimeImpact(self):
         return 20.0
 
+    def getInputs(self):
+        return ['textures']
 
-# Task to merge output geometry and clean up the results
-class CombineOutputsTask(Tasks.Task):
+    def getOutputs(self):
+        return ['files']
+
+    def isMayaBoundFor(self, inState):
+        return False
+
+
+# Task to gather everything needed to render the set's textures into a render job (see RenderJob)
+class CreateRenderJobTask(BuildTask):
+    def __init__(self):
+        pass
+
+    def run(self, inState):
+        inState.mRenderJob = RenderJob.createJob(inState.getBuilder(), inState.getHierarchy())
+
+    def getDisplayString(self):
+        return 'Create Render Job...'
+
+    def getTimeImpact(self):
+        return 5.0
+
+    def getInputs(self):
+        return ['scene', 'builder']
+
+    def getOutputs(self):
+        return ['job']
+
+    # This reads the extracted scene, as RenderTexturesTask
+    def isMayaBoundFor(self, inState):
+        return inState.getScene() is None or not inState.getScene().isDetached()
+
+
+# Task to render and write the textures in the render process (see RenderProcess)
+#   This runs on a worker thread which waits on the render process while the main thread gets on
+#   with the UVs and combining
+class RenderJobTask(BuildTask):
     def __init__(self):
         pass
 
-    def _canMerge(self, inNodeName):
-        if cmds.objectType(inNodeName) == 'mesh':
-            return True
+    def run(self, inState):
+        inState.mRenderReport = RenderProcess.renderJob(inState.mRenderJob)
 
-        shapes = cmds.listRelatives(inNodeName, s=True, typ='mesh')
-        if shapes is not None and len(shapes) > 0:
-            return True
+    def getDisplayString(self):
+        return 'Render Textures (Render Process)...'
 
+    def getTimeImpact(self):
+        return 50.0
+
+    def getInputs(self):
+        return ['job']
+
+    def getOutputs(self):
+        return ['textures', 'files']
+
+    def isMayaBoundFor(self, inState):
         return False
 
+
+# Task to move the written textures into place, record their paths on the pivot node and drop the old output
+#   Up until this point a failed or cancelled build can be rolled back
+class CommitOutputTask(BuildTask):
+    def __init__(self):
+        pass
+
     def run(self, inState):
-        # Merge all child meshes under the output mode
-        children = cmds.listRelatives(inState.getView().getOutputNode(), f=True)
-        children = [child for child in children if self._canMerge(child)]
-        united = children
-        
-        if len(children) > 0:
-            try:
-                # You could have a single object which is a root of many child objects
-                # I could check for that...
-                united = cmds.polyUnite(children, ch=True, mergeUVSets=True, centerPivot=True)
-            except:
-                pass
+        inState.getBuilder().commitTextures()
 
-        # Clean the construction history
-        cmds.select(united[0], r=True)
-        cmds.delete(ch=True)
+        Backend.getBackend().discardStash(inState.mStash)
+        inState.mStash = None
+        inState.mCommitted = True
 
-        # Ensure the output is correctly parented
-        finalName = united[0]
-        try:
-            finalName = cmds.parent(united[0], inState.getView().getOutputNode())[0]
-        except:
-            pass
+    def getDisplayString(self):
+        return 'Commit Output...'
+
+    def getTimeImpact(self):
+        return 1.0
+
+    def getInputs(self):
+        return ['files', 'animation', 'output']
 
-        # Add a link from the output node so we can track it in the future
-        cmds.addAttr(ln='pivotParent', at='message')
-        cmds.connectAttr('%s.outputMesh' % inState.getView().getOutputNode(), '%s.pivotParent' % finalName)
+    def getOutputs(self):
+        return ['nodeData']
 
-        # If there is an output name then use it since polySurfaceN is boring!
-        if inState.mOutputName is not None:
-            finalName = cmds.rename(finalName, inState.mOutputName.split('|')[-1])
 
-        # Filter out any non-merged nodes
-        # These could be joints, lights or anything else attached to the objects
-        children = cmds.listRelatives(inState.getView().getOutputNode(), f=True)
-        children = [child for child in children if child.split('|')[-1] != finalName.split('|')[-1]]
-        for child in children:
-            cmds.delete(child)
+# Task to merge output geometry and clean up the results
+class CombineOutputsTask(BuildTask):
+    def __init__(self):
+        pass
+
+    def run(self, inState):
+        Backend.getBackend().combineChildren(inState.getView().getOutputNode(), inState.mOutputName)
 
     def getDisplayString(self):
         return 'Combine Outputs...'
@@ -243,29 +564,244 @@ class CombineOutputsTask(Tasks.Task):
     def getTimeImpact(self):
         return 10.0
 
+    def getInputs(self):
+        return [ ]
+
+    def getOutputs(self):
+        return ['output']
+
+
+# Create the build states and task list for several views
+#   Returns (states, tasks, onFail), shared task failures (and cancelling) take down every set which
+#   hasn't already failed or been committed. With inCreateJobs each state is left with its render job,
+#   with inJobsOnly that's all the build does (and nothing is committed).
+def _createBuild(inViews, inCreateJobs = False, inJobsOnly = False):
+
+    states = [BuildOutputState(view) for view in _addLODGroups(inViews)]
+    for state in states:
+        if not state.getView().isValidForBuild():
+            state.mError = "Can't build object because it's missing an input ('%s') or output ('%s')!" % (state.getView().getRootNode(), state.getView().getOutputNode())
+
+    # LOD sets are laid out against their primary set, which has to come first in the task list
+    primaries = { }
+    for state in states:
+        if state.getView().getLODPrimary() is None:
+            continue
+        matches = [primary for primary in states if primary.getView().getRootNode() == state.getView().getLODPrimary()]
+        if len(matches) > 0:
+            primaries[state] = matches[0]
+        elif not state.hasFailed():
+            state.mError = "Can't build LOD '%s', its primary set '%s' doesn't exist!" % (state.getView().getRootNode(), state.getView().getLODPrimary())
+
+    def onFail(inStates, inError):
+        for state in inStates:
+            if not state.hasFailed() and not state.mCommitted:
+                state.mError = inError
+
+    stages = [
+        BuildHierarchyTask,
+        GenerateTextureInfoTask,
+        BakeAnimationTask,
+        LayoutUVsTask,
+        RenderTexturesTask,
+        CombineOutputsTask,
+        WriteTexturesTask
+    ]
+    if inCreateJobs:
+        stages.append(CreateRenderJobTask)
+
+    # Textures can be handed off to the render process, which renders and writes them in one go
+    if RenderProcess.Enabled:
+        stages = [
+            BuildHierarchyTask,
+            GenerateTextureInfoTask,
+            CreateRenderJobTask,
+            RenderJobTask,
+            BakeAnimationTask,
+            LayoutUVsTask,
+            CombineOutputsTask
+        ]
+
+    if inJobsOnly:
+        stages = [
+            BuildHierarchyTask,
+            GenerateTextureInfoTask,
+            CreateRenderJobTask
+        ]
+
+    # LOD sets render nothing, they only need their UVs laid out (and no render job)
+    lodStages = [BuildHierarchyTask, MapLODTask, LayoutUVsTask, CombineOutputsTask] if not inJobsOnly else [ ]
+
+    tasks = [SetTask(CleanOutputTask(), state) for state in states]
+    tasks = tasks + [SetTask(CopyHierarchyTask(), state) for state in states]
+    tasks = tasks + [ExtractSceneTask(states)]
+    for state in [state for state in states if state not in primaries] + [state for state in states if state in primaries]:
+        if state not in primaries:
+            tasks = tasks + [SetTask(stage(), state) for stage in stages]
+        else:
+            tasks = tasks + [SetTask(stage(primaries[state]) if stage == MapLODTask else stage(), state) for stage in lodStages]
+
+    # Committing waits on the texture writes, so leave it until every set is underway
+    if not inJobsOnly:
+        tasks = tasks + [SetTask(CommitOutputTask(), state) for state in states]
 
-# Construct pivot geometry and textures based upon an input view
-def runTasks(inView):
+    return (states, tasks, onFail)
+
+
+# Add the rest of the LOD group (see PivotNodeView.addLOD) of every set in inViews
+#   A LOD set's UVs are only valid for the textures its primary set was built with, so a set and its
+#   LODs are always built together. Returns the views with the added ones at the end.
+def _addLODGroups(inViews):
+
+    views = list(inViews)
+    names = set([view.getRootNode() for view in views])
+    for view in inViews:
+        primary = view.getLODPrimaryView() if view.getLODPrimary() is not None else view
+        if primary is None:
+            continue
+
+        for member in [primary] + primary.getLODViews():
+            if member.getRootNode() not in names:
+                names.add(member.getRootNode())
+                views.append(member)
+
+    return views
+
+
+# Roll back every set which didn't make it to the end of the build
+def _rollbackBuild(inStates):
+
+    for state in inStates:
+        try:
+            state.rollback()
+        except:
+            print "Couldn't roll back %s:" % state.getView().getRootNode()
+            print traceback.format_exc()
 
-    state = BuildOutputState(inView)
-    if not state.getView().isValidForBuild():
-        raise Exception("Can't build object because it's missing an input ('%s') or output ('%s')!" % (state.getView().getRootNode(), state.getView().getOutputNode()))
+
+# Construct pivot geometry and textures for several views at once
+#   The scene is only extracted once for all of the sets and undo/viewport suspension (if requested)
+#   wraps the whole batch. Returns the BuildOutputState of each view, failed sets have an mError
+#   and are left with the output they had before the build (as are all sets if it's cancelled).
+#   Pass a list as inTimings to collect (stage name, seconds) for every task run. Rendering and
+#   texture writes run on inWorkers threads (see TaskManager.runTaskGraph) alongside the Maya work.
+#   With inSnapshotPath the render jobs of the sets which built are saved there (see SnapshotFile).
+def runTasksForViews(inViews, inShowProgress = True, inSuspendUndo = False, inTimings = None, inWorkers = None, inSnapshotPath = None):
+
+    states, tasks, onFail = _createBuild(inViews, inSnapshotPath is not None)
+
+    scene = Backend.getBackend()
 
     # Cache selection
-    selection = cmds.ls(sl=True)
-
-    tasks = [
-        CleanOutputTask(),
-        CopyHierarchyTask(),
-        BuildHierarchyTask(),
-        GenerateTextureInfoTask(),
-        LayoutUVsTask(),
-        RenderTexturesTask(),
-        CombineOutputsTask(),
-        WriteTexturesTask()
-    ]
+    selection = scene.getSelection()
 
-    Tasks.TaskManager.runTasks(tasks, 'Generating Output...', state)
+    token = scene.suspend(inSuspendUndo)
+    try:
+        Tasks.TaskManager.runTaskGraph(tasks, 'Generating Output...', states, None, onFail, inShowProgress, inTimings, inWorkers)
+    finally:
+        _rollbackBuild(states)
+        scene.resume(token)
 
     # Restore selection
-    cmds.select(selection, r=True)
+    scene.setSelection(selection)
+
+    if inSnapshotPath is not None:
+        SnapshotFile.write(inSnapshotPath, [state.mRenderJob for state in states if not state.hasFailed() and state.mRenderJob is not None])
+
+    return states
+
+
+# Create the render jobs (see RenderJob) of several views without changing their outputs
+#   The build runs as far as the render jobs and is then rolled back. Returns the BuildOutputState of
+#   each view, the job is in mRenderJob for sets which didn't fail (LOD sets have none).
+def createRenderJobs(inViews, inShowProgress = True):
+
+    states, tasks, onFail = _createBuild(inViews, True, True)
+
+    scene = Backend.getBackend()
+    selection = scene.getSelection()
+
+    token = scene.suspend(True)
+    try:
+        Tasks.TaskManager.runTaskGraph(tasks, 'Creating Render Jobs...', states, None, onFail, inShowProgress, None, 0)
+    finally:
+        _rollbackBuild(states)
+        scene.resume(token)
+
+    scene.setSelection(selection)
+
+    return states
+
+
+# As runTasksForViews, but the build is spread over Maya's idle queue so the UI stays responsive
+#   Returns straight away, onComplete(states) is called once the build has finished. Without a UI
+#   this just runs the build.
+def runTasksForViewsDeferred(inViews, onComplete = None, inShowProgress = True, inSuspendUndo = False, inWorkers = None):
+
+    scene = Backend.getBackend()
+    if not scene.isInteractive():
+        states = runTasksForViews(inViews, inShowProgress, inSuspendUndo, None, inWorkers)
+        if onComplete is not None:
+            onComplete(states)
+        return
+
+    states, tasks, onFail = _createBuild(inViews)
+
+    # Cache selection
+    selection = scene.getSelection()
+
+    token = scene.suspend(inSuspendUndo)
+
+    def onFinished(inSuccess):
+        try:
+            _rollbackBuild(states)
+        finally:
+            scene.resume(token)
+
+        # Restore selection
+        scene.setSelection(selection)
+
+        if onComplete is not None:
+            onComplete(states)
+
+    try:
+        Tasks.TaskManager.runTaskGraphDeferred(tasks, 'Generating Output...', states, None, onFail, inShowProgress, None, inWorkers, onFinished)
+    except:
+        scene.resume(token)
+        raise
+
+
+# Construct pivot geometry and textures based upon an input view
+#   Returns True on success, failures are reported through onFail(state, error)
+def runTasks(inView, inShowProgress = True, onSuccess = None, onFail = None):
+
+    if not inView.isValidForBuild():
+        raise Exception("Can't build object because it's missing an input ('%s') or output ('%s')!" % (inView.getRootNode(), inView.getOutputNode()))
+
+    state = runTasksForViews([inView], inShowProgress)[0]
+
+    if state.hasFailed():
+        if onFail is not None:
+            onFail(state, state.mError)
+        return False
+
+    if onSuccess is not None:
+        onSuccess(state)
+    return True
+
+
+# As runTasks, but the build is spread over Maya's idle queue (see runTasksForViewsDeferred)
+def runTasksDeferred(inView, inShowProgress = True, onSuccess = None, onFail = None):
+
+    if not inView.isValidForBuild():
+        raise Exception("Can't build object because it's missing an input ('%s') or output ('%s')!" % (inView.getRootNode(), inView.getOutputNode()))
+
+    def onComplete(inStates):
+        state = inStates[0]
+        if state.hasFailed():
+            if onFail is not None:
+                onFail(state, state.mError)
+        elif onSuccess is not None:
+            onSuccess(state)
+
+    runTasksForViewsDeferred([inView], onComplete, inShowProgress)
@@ -4,22 +4,122 @@
     For license details please check: PivotTool-License.txt
 """
 
+import heapq
 import math
-import maya.cmds as cmds
-
+import os
+import tempfile
+
+import Animation
+import Atlas
+import LOD
+import Skeleton
+import RenderFunctions
 from RenderType import *
-from Texture import Texture
-from StaticMeshBuilder import StaticMeshDataBuilder
+import Packing
+import TextureArray
+from Texture import Texture, PackedTexture, Compression
+from StaticMeshBuilder import StaticMeshDataBuilder, GroupDataBuilder, MergedDataBuilder
 from SkinnedMeshBuilder import SkinnedMeshDataBuilder
 
 
+# Element orders, see Builder.orderElements
+class ElementOrder:
+    DepthFirst = 'DepthFirst'
+    BreadthFirst = 'BreadthFirst'
+    Morton = 'Morton'
+
+    Items = [DepthFirst, BreadthFirst, Morton]
+
+
+# Get the Morton (Z-order) code of a point quantized to 10 bits per axis within inBounds
+def getMortonCode(inPoint, inBounds):
+
+    code = 0
+    for axis in range(3):
+        extent = inBounds[axis + 3] - inBounds[axis]
+        value = int((inPoint[axis] - inBounds[axis]) / extent * 1023.0) if extent > 0.0 else 0
+        value = min(max(value, 0), 1023)
+
+        for bit in range(10):
+            code = code | (((value >> bit) & 1) << (bit * 3 + axis))
+
+    return code
+
+
+# Smallest and largest texture sides
+MinTextureSize = 4
+MaxTextureSize = 8192
+
+
+# Get a texture width/height to fit inObjectCount, see Builder.getTextureDimension
+def getTextureDimension(inObjectCount, inAllowNonPowerOfTwo=False, inMaxSize=MaxTextureSize):
+
+    maxSize = min(int(inMaxSize), MaxTextureSize)
+
+    if inAllowNonPowerOfTwo:
+        widths = range(MinTextureSize, maxSize + 1, 4)
+    else:
+        widths = [1 << bit for bit in range(2, 14) if (1 << bit) <= maxSize]
+
+    best = None
+    for width in widths:
+        rows = max(1, (inObjectCount + width - 1) / width)
+        height = MinTextureSize
+        if inAllowNonPowerOfTwo:
+            height = max(height, (rows + 3) / 4 * 4)
+        else:
+            while height < rows:
+                height = height * 2
+
+        # Power of two layouts are never more than 2:1, keep others to the same so they don't degenerate
+        #   into strips
+        if height > maxSize or max(width, height) > 2 * min(width, height):
+            continue
+
+        key = (width * height, abs(width - height), -width)
+        if best is None or key < best[0]:
+            best = (key, width, height)
+
+    if best is None:
+        raise Exception("%i elements don't fit in a %ix%i texture!" % (inObjectCount, maxSize, maxSize))
+    return (best[1], best[2])
+
+
 # Context for building and rendering pivot information
 class Builder:
 
-    def __init__(self, inView):
+    def __init__(self, inView, inScene):
         self.mView = inView
+        self.mScene = inScene
         self.mTotalIndices = 0
         self.mMaxDepth = 0
+        self.mTextures = [ ]
+        self.mManifest = None
+        self.mArrays = [ ]
+        self.mAtlas = None
+        self.mLODReport = None
+        self.mAnimation = None
+        self.mMerged = [ ]
+        self.mElements = [ ]
+        self.mRigs = { }
+        self.mSkeletons = { }
+        self.mAncestors = None
+        self.mSubtreeEnds = None
+
+    # Group the skinned meshes of inNodes (the (node, parent) pairs given to fillHierarchyInfo) by the
+    # rig they're bound to, call this before fillHierarchyInfo
+    #   Meshes whose influences are the same as, or a subset of, another mesh's then share a single
+    #   compacted skeleton and its elements, rather than each getting a copy of every joint.
+    def groupSkeletons(self, inNodes):
+
+        clusters = [SkinnedMeshDataBuilder.getSkinCluster(node, self.mScene) for node, parent in inNodes]
+        self.mRigs = Skeleton.groupInfluences([Skeleton.getInfluenceNodes(cluster, self.mScene) for cluster in clusters if cluster is not None])
+        self.mSkeletons = { }
+
+    # Get the influences the skeleton of a skinned mesh is built from, see groupSkeletons
+    def _getRig(self, inNode):
+        influences = frozenset(Skeleton.getInfluenceNodes(SkinnedMeshDataBuilder.getSkinCluster(inNode, self.mScene), self.mScene))
+        return self.mRigs.get(influences, influences)
 
     # Prepare the hierarchy by determining pivot indices
     def fillHierarchyInfo(self, inNode, inParent):
@@ -32,23 +132,251 @@ class Builder:
             parentIndex = parentBuilder.getRootIndex()
             depth = parentBuilder.getMaxDepth()
 
-        if SkinnedMeshDataBuilder.getSkinCluster(inNode) is not None:
-            inNode.mDataBuilder = SkinnedMeshDataBuilder(inNode, parentIndex, self.mTotalIndices, depth)
+        # Collapsed groups and merged meshes don't get an index, they use the nearest element above
+        if inNode.mMerged:
+            inNode.mDataBuilder = MergedDataBuilder(inNode, parentIndex, depth)
+        elif self.mView.getAdvancedView().getCollapseGroups() and not self.hasGeometry(inNode):
+            inNode.mDataBuilder = GroupDataBuilder(inNode, parentIndex, depth)
+        elif SkinnedMeshDataBuilder.getSkinCluster(inNode, self.mScene) is not None:
+            rig = self._getRig(inNode)
+            inNode.mDataBuilder = SkinnedMeshDataBuilder(inNode, parentIndex, self.mTotalIndices, depth, self.mScene, list(rig), self.mSkeletons.get(rig, None))
+            self.mSkeletons.setdefault(rig, inNode.mDataBuilder)
         else:
             inNode.mDataBuilder = StaticMeshDataBuilder(inNode, parentIndex, self.mTotalIndices, depth)
         self.mTotalIndices = self.mTotalIndices + inNode.mDataBuilder.getIndexCount()
+        self.mElements.extend([data for data in inNode.mDataBuilder.getRenderData() if data.getIndex() >= 0])
 
         if inParent is not None:
             self.mMaxDepth = max(self.mMaxDepth, inNode.mDataBuilder.getMaxDepth())
 
+    # Merge the smallest static leaf elements into their parents until the set fits its element budget
+    #   Call this once fillHierarchyInfo has been run over inNodes (the (node, parent) pairs it was
+    #   called with). Leaves are merged smallest world bounding box diameter first, a parent whose
+    #   children have all been merged becomes a leaf itself. Returns True if anything was merged, the
+    #   builder is then reset and fillHierarchyInfo has to be run again.
+    def reduceHierarchy(self, inNodes):
+
+        budget = self.mView.getAdvancedView().getElementBudget()
+        if budget <= 0 or self.mTotalIndices <= budget:
+            return False
+
+        # Find the element each element is parented to (skipping collapsed groups) and count children
+        elementParents = { }
+        childCounts = { }
+        for node, parent in inNodes:
+            if parent is None:
+                elementParents[node] = None
+            elif parent.mDataBuilder.getIndexCount() == 0 and not isinstance(parent.mDataBuilder, SkinnedMeshDataBuilder):
+                elementParents[node] = elementParents[parent]
+            else:
+                elementParents[node] = parent
+
+            if node.mDataBuilder.getIndexCount() > 0:
+                childCounts.setdefault(node, 0)
+                if elementParents[node] is not None:
+                    childCounts[elementParents[node]] = childCounts.get(elementParents[node], 0) + 1
+
+        # Only static meshes can be merged, and only into static meshes
+        def isStatic(inNode):
+            return inNode is not None and isinstance(inNode.mDataBuilder, StaticMeshDataBuilder)
+
+        def getDiameter(inNode):
+            bounds = self.mScene.getWorldBounds(inNode.mNode)
+            return math.sqrt(sum([(bounds[i + 3] - bounds[i]) ** 2 for i in range(3)]))
+
+        heap = [(getDiameter(node), i, node) for i, (node, parent) in enumerate(inNodes) if isStatic(node) and childCounts[node] == 0 and isStatic(elementParents[node])]
+        heapq.heapify(heap)
+
+        order = dict([(node, i) for i, (node, parent) in enumerate(inNodes)])
+        total = self.mTotalIndices
+        while total > budget and len(heap) > 0:
+            diameter, i, node = heapq.heappop(heap)
+
+            target = elementParents[node]
+            node.mMerged = True
+            self.mMerged.append((node.mNode, target.mNode))
+            total = total - 1
+
+            childCounts[target] = childCounts[target] - 1
+            if childCounts[target] == 0 and isStatic(elementParents[target]):
+                heapq.heappush(heap, (getDiameter(target), order[target], target))
+
+        if total > budget:
+            print "WARNING: '%s' has %i elements after merging, its budget is %i" % (self.mView.getRootNode(), total, budget)
+
+        self.mTotalIndices = 0
+        self.mMaxDepth = 0
+        self.mElements = [ ]
+        self.mSkeletons = { }
+        return len(self.mMerged) > 0
+
+    # Renumber the elements of inNodes (the (node, parent) pairs given to fillHierarchyInfo) in the
+    # order chosen by the view, after which parents still come before their children
+    #   DepthFirst keeps the order fillHierarchyInfo assigned. BreadthFirst numbers every element at
+    #   one depth before any deeper element, so parent chains read from a few runs of texels.
+    #   Morton does the same, ordering each depth by the Z-order of the world pivots so elements which
+    #   are close together land on nearby texels. Texels are always laid out in rows, as shaders expect.
+    def orderElements(self, inNodes):
+
+        order = self.mView.getAdvancedView().getElementOrder()
+        if order not in ElementOrder.Items:
+            raise Exception("Unknown element order '%s'!" % order)
+        if order == ElementOrder.DepthFirst:
+            return
+
+        elements = [data for node, parent in inNodes for data in node.mDataBuilder.getRenderData() if data.getIndex() >= 0]
+        if order == ElementOrder.Morton and len(elements) > 0:
+            pivots = dict([(data.getIndex(), self.mScene.getWorldPivot(data.getNode())) for data in elements])
+            bounds = [min([pivot[axis] for pivot in pivots.values()]) for axis in range(3)] + [max([pivot[axis] for pivot in pivots.values()]) for axis in range(3)]
+            keys = dict([(index, getMortonCode(pivot, bounds)) for index, pivot in pivots.iteritems()])
+        else:
+            keys = dict([(data.getIndex(), 0) for data in elements])
+
+        # A parent is always shallower than its children, so sorting by depth first keeps it in front
+        elements.sort(key=lambda data: (data.getDepth(), keys[data.getIndex()], data.getIndex()))
+
+        indexMap = [0] * self.mTotalIndices
+        for index, data in enumerate(elements):
+            indexMap[data.getIndex()] = index
+
+        for node, parent in inNodes:
+            node.mDataBuilder.remapIndices(indexMap)
+
+    # Place the set in its atlas (see Atlas.AtlasRegion), if it has one, and move its elements into the
+    # atlas's index space
+    #   Call this once the elements of inNodes (as orderElements) have been ordered. Each set's region is
+    #   saved on its pivot node, so adding a set never moves the others. A set only moves when it
+    #   outgrows its region and the texels after it are taken. Index formats have to hold every index in
+    #   the atlas, so all of its sets write the same formats.
+    def placeInAtlas(self, inNodes):
+
+        self.mAtlas = None
+        advanced = self.mView.getAdvancedView()
+        name = advanced.getAtlas()
+        if name is None or self.mView.getLODPrimary() is not None:
+            return
+
+        if advanced.getPackChannels() or advanced.getTextureArrays():
+            raise Exception("'%s' is in atlas '%s', atlas sets can't pack channels or write texture arrays!" % (self.mView.getRootNode(), name))
+        if len([view for view in self.mView.getTextureViews() if view.getCompression() != Compression.Uncompressed]) > 0:
+            raise Exception("'%s' is in atlas '%s', atlas textures can't be block compressed!" % (self.mView.getRootNode(), name))
+
+        size = advanced.getAtlasSize()
+        regions = [ ]
+        for view in self.mView.getAtlasViews():
+            if view.getAdvancedView().getAtlasSize() != size:
+                raise Exception("'%s' and '%s' share atlas '%s', but their atlas sizes (%i and %i) differ!" % (self.mView.getRootNode(), view.getRootNode(), name, size, view.getAdvancedView().getAtlasSize()))
+            if view.getAtlasRegion() is not None:
+                regions.append(view.getAtlasRegion())
+
+        region = Atlas.allocateRegion(regions, size * size, self.mTotalIndices, self.mView.getAtlasRegion())
+        if region is None:
+            raise Exception("Atlas '%s' (%ix%i) has no room left for the %i elements of '%s'!" % (name, size, size, self.mTotalIndices, self.mView.getRootNode()))
+        self.mView.setAtlasRegion(*region)
+
+        self.mAtlas = Atlas.AtlasRegion(name, self.mView.getRootNode(), size, size, region[0], self.mTotalIndices)
+
+        indexMap = [region[0] + index for index in range(self.mTotalIndices)]
+        for node, parent in inNodes:
+            node.mDataBuilder.remapIndices(indexMap)
+
+    # Lay a LOD set (see PivotNodeView.addLOD) out against the elements of its primary set, in place of
+    # generateTextureInfo
+    #   inNames and inPrimaryNames give the name each element of this set and the primary is matched by
+    #   (see LOD.mapElements). Elements take the texel of the primary element with the same name and
+    #   nothing is rendered, the primary's textures are used as they are. Elements without a match take
+    #   their nearest matched ancestor's texel, these and the primary's elements missing from the LOD are
+    #   listed by getLODReport(). Call this once the primary's texture info is ready.
+    def mapToPrimary(self, inPrimary, inNodes, inNames, inPrimaryNames):
+
+        primary = [(data.getIndex(), data.getParentIndex(), inPrimaryNames[data.getNode()]) for data in inPrimary.mElements]
+        elements = [(data.getIndex(), data.getParentIndex(), inNames[data.getNode()]) for data in self.mElements]
+        indexMap, unmatched, missing, ambiguous = LOD.mapElements(primary, elements)
+
+        for node, parent in inNodes:
+            if node.mDataBuilder is not None:
+                node.mDataBuilder.remapIndices(indexMap)
+
+        self.mAncestors = None
+        self.mSubtreeEnds = None
+        self.mTextureWidth, self.mTextureHeight = inPrimary.mTextureWidth, inPrimary.mTextureHeight
+        self.mTextures = [ ]
+        self.mManifest = None
+        self.mArrays = [ ]
+
+        self.mLODReport = { 'primary': inPrimary.mView.getRootNode(), 'elements': len(elements), 'unmatched': unmatched, 'missing': missing, 'ambiguous': ambiguous }
+        if len(unmatched) > 0:
+            print "WARNING: %i elements of LOD '%s' aren't in '%s' and use their parent's texel: %s" % (len(unmatched), self.mView.getRootNode(), inPrimary.mView.getRootNode(), ', '.join(unmatched))
+        if len(ambiguous) > 0:
+            print "WARNING: Several elements of '%s' are named %s, LOD '%s' uses the first of each" % (inPrimary.mView.getRootNode(), ', '.join(ambiguous), self.mView.getRootNode())
+
+    # Get what mapToPrimary matched, None unless the set is a LOD
+    #   'unmatched' lists the LOD's elements without a match, 'missing' the primary's elements the LOD doesn't have
+    def getLODReport(self):
+        return self.mLODReport
+
+    # Get the (node, target) pairs of the elements merged by reduceHierarchy
+    def getMergedElements(self):
+        return self.mMerged
+
+    # Get whether a node has a mesh of its own, rather than only being a parent of meshes
+    def hasGeometry(self, inNode):
+        return len([shape for shape in inNode.mShapes if self.mScene.getNodeType(shape) == 'mesh']) > 0
+
+    # Get the scene snapshot the build is working from
+    def getScene(self):
+        return self.mScene
+
     # Setup texture destinations for rendering
     def generateTextureInfo(self):
 
-        # Figure out texture size
-        self.mTextureWidth, self.mTextureHeight = self.getTextureDimension(self.mTotalIndices)
+        # Subtree ranges only hold when elements are numbered depth first, so fail before anything is rendered
+        advanced = self.mView.getAdvancedView()
+        subtreeTypes = [RenderType.SubtreeEndInt, RenderType.SubtreeEndFloat]
+        if advanced.getElementOrder() != ElementOrder.DepthFirst and len([True for view in self.mView.getTextureViews() if view.getRGB() in subtreeTypes or view.getA() in subtreeTypes]) > 0:
+            raise Exception("'%s' writes Subtree End outputs, which need the ElementOrder option to be '%s' (not '%s')!" % (self.mView.getRootNode(), ElementOrder.DepthFirst, advanced.getElementOrder()))
+
+        # The hierarchy is final by now, so ancestors and subtrees are found again when first needed
+        self.mAncestors = None
+        self.mSubtreeEnds = None
 
-        # Initialize an array of target textures based upon the chosen settings
-        self.mTextures = [Texture(self.mTextureWidth, self.mTextureHeight, self.mView, view) for view in self.mView.getTextureViews()]
+        # Figure out texture size, atlas sets are laid out across the whole atlas
+        if self.mAtlas is not None:
+            self.mTextureWidth, self.mTextureHeight = self.mAtlas.getWidth(), self.mAtlas.getHeight()
+        else:
+            self.mTextureWidth, self.mTextureHeight = self.getTextureDimension(self.mTotalIndices)
+
+        # Initialize an array of target textures based upon the chosen settings, when packing channels the
+        # outputs of every view are packed into as few textures as possible and a manifest records where
+        # each of them went
+        if advanced.getPackChannels():
+            layouts = Packing.packChannels([(view.getRGB(), view.getA()) for view in self.mView.getTextureViews()], self.mTotalIndices)
+            self.mTextures = [PackedTexture(self.mTextureWidth, self.mTextureHeight, self.mView, index, layout) for index, layout in enumerate(layouts)]
+
+            path = os.path.join(tempfile.gettempdir(), Packing.getManifestFilename(self.mView.getRootNode(), advanced.getUVSetName()))
+            self.mManifest = Packing.Manifest(path, self.mView.getRootNode(), advanced.getUVSetName(), self.mTextureWidth, self.mTextureHeight)
+        elif self.mAtlas is not None:
+            self.mTextures = [Texture(self.mTextureWidth, self.mAtlas.getRowCount(), self.mView, view) for view in self.mView.getTextureViews()]
+            for texture in self.mTextures:
+                texture.setAtlas(self.mAtlas)
+            self.mManifest = None
+        else:
+            self.mTextures = [Texture(self.mTextureWidth, self.mTextureHeight, self.mView, view) for view in self.mView.getTextureViews()]
+            self.mManifest = None
+
+        # Formats depend on the element count and advanced options, index types which can't hold every index would be written corrupted
+        for texture in self.mTextures:
+            texture.setIndexCount(self.getIndexCount())
+            texture.setCompactFormats(advanced.getCompactFormats())
+            texture.checkIndexLimits()
+            texture.checkCompression()
+
+        # With texture arrays, textures sharing a format are written as the slices of one array
+        self.mArrays = [ ]
+        if advanced.getTextureArrays():
+            for format, paths in TextureArray.groupByFormat([(texture.getOutputPath(), texture.getFormat()) for texture in self.mTextures]):
+                path = os.path.join(tempfile.gettempdir(), TextureArray.getArrayFilename(self.mView.getRootNode(), format, advanced.getUVSetName()))
+                self.mArrays.append(TextureArray.TextureArray(path, paths))
 
     # Layout UVs based upon pivot indices
     def layoutUVs(self, inNode, inParent):
@@ -72,39 +400,129 @@ class Builder:
 
         for texture in self.mTextures:
             texture.write()
+        for array in self.mArrays:
+            array.write()
+
+        if self.mManifest is not None:
+            textures = [ ]
+            for texture in self.mTextures:
+                path, slice = TextureArray.getLocation(self.mArrays, texture.getOutputPath())
+                textures.append((path, texture.getFormat(), texture.getChannels(), slice))
+            self.mManifest.write(textures)
+
+    # Set up the animation bake of the set (see Animation.AnimationBake), returns None unless the view
+    # bakes animation
+    #   inScene is the live scene the frames are sampled from, the range defaults to its playback range.
+    #   Call this once the elements have their final indices, LOD sets never bake (their primary does).
+    def createAnimationBake(self, inScene):
+
+        self.mAnimation = None
+        advanced = self.mView.getAdvancedView()
+        if not advanced.getBakeAnimation() or self.mView.getLODPrimary() is not None:
+            return None
+
+        start, end = advanced.getBakeFrameRange()
+        if start is None or end is None:
+            playback = inScene.getPlaybackRange()
+            start = playback[0] if start is None else start
+            end = playback[1] if end is None else end
+
+        elements = [(data.getIndex(), data.getNode()) for data in self.mElements]
+        frames = Animation.getFrames(start, end, advanced.getBakeFrameStep())
+        self.mAnimation = Animation.AnimationBake(self.mView.getRootNode(), elements, len(self.getParentIndices()), frames, self.mScene)
+        return self.mAnimation
+
+    # Get what the animation bake covered, None unless the set bakes animation
+    def getAnimationReport(self):
+        if self.mAnimation is None:
+            return None
+        return { 'frames': self.mAnimation.getFrameCount(), 'textures': self.mAnimation.getOutputPaths() }
+
+    # Move written textures into place and point the texture views at them
+    #   This saves the pivot node, so it has to be called from the main thread. With packed channels each
+    #   view points at the texture holding its RGB (or its alpha, when it has no RGB). Views of textures
+    #   written into an array point at the array and their slice. Baked animation textures are recorded
+    #   on the view as well.
+    def commitTextures(self):
+
+        if self.mAnimation is not None:
+            self.mAnimation.commit()
+        self.mView.setAnimationPaths(self.mAnimation.getOutputPaths() if self.mAnimation is not None else None)
+
+        for texture in self.mTextures:
+            if TextureArray.getLocation(self.mArrays, texture.getOutputPath())[1] is None:
+                texture.commit()
+        for array in self.mArrays:
+            array.commit()
+
+        if self.mManifest is None:
+            for texture in self.mTextures:
+                texture.mView.setOutputPath(*TextureArray.getLocation(self.mArrays, texture.getOutputPath()))
+            self.mView.setManifestPath(None)
+            return
+
+        self.mManifest.commit()
+        for view in self.mView.getTextureViews():
+            source = view.getRGB() if view.getRGB() != RenderType.NoRender else view.getA()
+            paths = [texture.getOutputPath() for texture in self.mTextures if source in texture.getSources()]
+            view.setOutputPath(*(TextureArray.getLocation(self.mArrays, paths[0]) if len(paths) > 0 else (None, None)))
+        self.mView.setManifestPath(self.mManifest.getOutputPath())
+
+    # Remove any textures which were written but not committed
+    def discardTextures(self):
+
+        for texture in self.mTextures:
+            texture.discard()
+        for array in self.mArrays:
+            array.discard()
+        if self.mManifest is not None:
+            self.mManifest.discard()
+        if self.mAnimation is not None:
+            self.mAnimation.discard()
 
     # Get the required texture width/height to fit inObjectCount
+    #   Picks the layout with the fewest unused texels, ties go to the squarest (then widest) layout.
+    #   Sides are powers of two unless the view allows otherwise, in which case they're multiples of 4
+    #   so block compressed formats stay valid. Either way the layout is at most 2:1.
     def getTextureDimension(self, inObjectCount):
 
-        validSizes = [4, 8, 16, 32, 64, 128, 256, 512, 1024]
+        advanced = self.mView.getAdvancedView()
+        return getTextureDimension(inObjectCount, advanced.getAllowNonPowerOfTwo(), advanced.getMaxTextureSize())
 
-        width = (math.ceil(math.pow(inObjectCount, 0.5)))
-        for size in validSizes:
-            if width <= size:
-                width = size
-                break
+    # Get the number of elements in the set, or the number an atlas set's atlas holds
+    def getIndexCount(self):
+        return self.mAtlas.getCapacity() if self.mAtlas is not None else self.mTotalIndices
 
-        height = math.ceil(inObjectCount / width)
-        for size in validSizes:
-            if height <= size:
-                height = size
-                break
+    # Get the parent index of every element, by index (atlas sets start from the atlas's first index)
+    def getParentIndices(self):
+        end = self.mAtlas.getOffset() + self.mTotalIndices if self.mAtlas is not None else self.mTotalIndices
+        parents = [-1] * end
+        for data in self.mElements:
+            parents[data.getIndex()] = data.getParentIndex()
+        return parents
 
-        return (width, height)
+    # Get the first RenderFunctions.AncestorLevels ancestor indices of an element
+    def getAncestorIndices(self, inIndex):
 
-    # Add a UV set if necesary
-    def tryMakeUVSet(self, inNode, inName):
+        if self.mAncestors is None:
+            self.mAncestors = RenderFunctions.getAncestorTable(self.getParentIndices())
+        return self.mAncestors[inIndex]
+
+    # Get the last index within the subtree of an element, elements have to be numbered depth first
+    def getSubtreeEnd(self, inIndex):
+
+        if self.mSubtreeEnds is None:
+            self.mSubtreeEnds = RenderFunctions.getSubtreeEnds(self.getParentIndices())
+        return self.mSubtreeEnds[inIndex]
 
-        sets = cmds.polyUVSet(inNode.mNode, q=True, auv=True)
+    # Get the GPU memory used by all of the textures, in bytes
+    def getTextureMemory(self):
+        return sum([texture.getMemorySize() for texture in self.mTextures])
 
-        # We need a source UV set to copy from
-        if sets is None:
-            raise Exception('%s has no sets' % inNode.mNode)
+    # Add a UV set if necesary
+    def tryMakeUVSet(self, inNode, inName):
 
-        if inName not in sets:
-            cmds.polyUVSet(inNode.mNode, create=True, uvSet=inName)
-        
-        cmds.polyCopyUV(inNode.mNode, uvi=sets[0], uvs=inName)
+        self.mScene.ensureUVSet(inNode.mNode, inName)
 
     # Get coordinate from index
     def getUVCoordinate(self, inIndex):
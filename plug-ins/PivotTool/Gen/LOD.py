@@ -0,0 +1,64 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import re
+
+# NOTE: Nothing in here may import Maya.
+
+# Pattern stripped from the end of element names before they're matched across LODs (eg. 'Branch_LOD1')
+DefaultSuffix = '_?LOD[0-9]+$'
+
+
+# Get the name an element is matched across LODs by, its short name without namespaces or inPattern
+def getMatchName(inNode, inPattern=DefaultSuffix):
+    name = inNode.split('|')[-1].split(':')[-1]
+    return re.sub(inPattern, '', name) if inPattern else name
+
+
+# Pair the nodes of a set's output hierarchy with the input nodes they were copied from
+#   Builds duplicate the inputs, which can rename them, so names are taken from the inputs. Both
+#   hierarchies are filtered the same way and have the same shape, so they flatten in the same order.
+def getSourceNodes(inOutput, inInput):
+    outputs = [node.mNode for node, parent in inOutput.flatten()]
+    inputs = [node.mNode for node, parent in inInput.flatten()] if inInput is not None else [ ]
+    if len(outputs) != len(inputs):
+        raise Exception("The output hierarchy of '%s' doesn't match its input!" % inOutput.mNode)
+    return dict(zip(outputs, inputs))
+
+
+# Map the elements of a LOD onto the elements of its primary set by name
+#   inPrimary and inLOD list (index, parent index, name) for each element. Returns (index map,
+#   unmatched, missing, ambiguous). The index map takes each LOD index to the primary index of the
+#   element with the same name. LOD elements without a match of their own take the index of their
+#   nearest matched ancestor, and are listed in unmatched. Missing lists the primary elements the LOD
+#   doesn't have, and ambiguous the names more than one primary element has (the first is used).
+def mapElements(inPrimary, inLOD):
+    indices = { }
+    ambiguous = [ ]
+    for index, parentIndex, name in sorted(inPrimary):
+        if name in indices and name not in ambiguous:
+            ambiguous.append(name)
+        indices.setdefault(name, index)
+
+    # Parents are always numbered before their children, so their mapping is known first
+    lod = sorted(inLOD)
+    indexMap = [None] * (lod[-1][0] + 1 if len(lod) > 0 else 0)
+    unmatched = [ ]
+    for index, parentIndex, name in lod:
+        if name in indices:
+            indexMap[index] = indices[name]
+            continue
+
+        unmatched.append(name)
+        if parentIndex >= 0 and indexMap[parentIndex] is not None:
+            indexMap[index] = indexMap[parentIndex]
+        else:
+            raise Exception("LOD element '%s' has no match in its primary set, and no ancestor with one!" % name)
+
+    names = set([name for index, parentIndex, name in lod])
+    missing = [name for index, parentIndex, name in sorted(inPrimary) if name not in names]
+
+    return (indexMap, unmatched, missing, ambiguous)
@@ -0,0 +1,175 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import os
+
+import RenderFunctions
+from RenderType import *
+from ..Util import LwDDS
+
+# NOTE: Nothing in here may import Maya, the render process writes manifests for packed jobs.
+
+# Names of the channels of a packed texture, in order
+ChannelNames = 'RGBA'
+
+# Number of channels in a packed texture
+ChannelCount = 4
+
+
+# Get the name a render type has in RenderType (eg. 'PivotPosition')
+def getTypeName(inType):
+    names = [name for name, value in vars(RenderType).items() if isinstance(value, int) and value == inType]
+    return names[0] if len(names) > 0 else str(inType)
+
+
+# Get the name of a DXGI format (eg. 'R16G16B16A16_Float')
+def getFormatName(inFormat):
+    names = [name for name, value in vars(LwDDS.DXGIFormat).items() if isinstance(value, int) and value == inFormat]
+    return names[0] if len(names) > 0 else str(inFormat)
+
+
+# Get the file name of the inIndex'th packed texture of a pivot set
+def getPackedFilename(inRootNode, inIndex, inUVSetName):
+    return '%s_packed%i_UV_%s.dds' % (inRootNode, inIndex, inUVSetName)
+
+
+# Get the file name of the manifest describing the packed textures of a pivot set
+def getManifestFilename(inRootNode, inUVSetName):
+    return '%s_packed_UV_%s.json' % (inRootNode, inUVSetName)
+
+
+# Get the quantities requested by a list of (RGB, alpha) outputs as (render type, channel count), in
+# the order they're requested, without repeats or NoRender
+def getQuantities(inOutputs):
+    quantities = [ ]
+    for rgb, a in inOutputs:
+        if rgb != RenderType.NoRender:
+            quantities.append((rgb, RenderType.getChannelCount(rgb)))
+        if a != RenderType.NoRender:
+            quantities.append((a, 1))
+
+    unique = [ ]
+    for quantity in quantities:
+        if quantity not in unique:
+            unique.append(quantity)
+    return unique
+
+
+# Bin pack the quantities of a list of (RGB, alpha) outputs into as few textures as possible
+#   Returns a list of channel layouts, one per texture. Each layout holds ChannelCount slots of
+#   [render type, component] (or None when unused), the component being the channel of the rendered
+#   pixel the slot takes its value from. Quantities only share a texture with others of the same
+#   precision, and multi-channel quantities keep their channels together and in order. Placing the
+#   largest quantities first is optimal here: three channel quantities only leave room for a single
+#   channel, and two channel quantities pair up.
+def packChannels(inOutputs, inIndexCount):
+    quantities = getQuantities(inOutputs)
+
+    for type, count in quantities:
+        RenderType.checkIndexLimit(type, inIndexCount)
+        if type == RenderType.ParentIndexWide and RenderFunctions.needsWideIndices(inIndexCount):
+            raise Exception("%i elements need 32-bit parent indices, which can't be packed with other outputs!" % inIndexCount)
+
+    layouts = [ ]
+    for precision in [RenderPrecision.FP16, RenderPrecision.U8]:
+        bins = [ ]
+        ordered = sorted([quantity for quantity in quantities if RenderType.fromType(quantity[0]).getPrecision() == precision], key=lambda quantity: -quantity[1])
+
+        for type, count in ordered:
+            components = range(count) if RenderType.fromType(type).isRGB() else [3]
+
+            target = None
+            for layout in bins:
+                if layout.count(None) >= count:
+                    target = layout
+                    break
+            if target is None:
+                target = [None] * ChannelCount
+                bins.append(target)
+
+            offset = target.index(None)
+            for channel, component in enumerate(components):
+                target[offset + channel] = [type, component]
+
+        layouts.extend(bins)
+
+    return layouts
+
+
+# Get the precision of the quantities in a packed layout
+def getLayoutPrecision(inLayout):
+    return [RenderType.fromType(slot[0]).getPrecision() for slot in inLayout if slot is not None][0]
+
+
+# Get the names of the channels holding a render type in a packed layout (eg. 'RGB')
+def getLayoutChannels(inLayout, inType):
+    return ''.join([ChannelNames[channel] for channel, slot in enumerate(inLayout) if slot is not None and slot[0] == inType])
+
+
+# Get a readable name for a slot of a packed layout, RGB types name the component they hold (eg. 'PivotPosition.G')
+def getSlotName(inSlot):
+    if inSlot is None:
+        return None
+    if RenderType.fromType(inSlot[0]).isAlpha():
+        return getTypeName(inSlot[0])
+    return '%s.%s' % (getTypeName(inSlot[0]), ChannelNames[inSlot[1]])
+
+
+#
+# Manifest mapping every quantity of a pivot set to the packed texture and channels which hold it,
+# written and committed alongside the textures
+#
+class Manifest:
+
+    def __init__(self, inPath, inRootNode, inUVSetName, inWidth, inHeight):
+        self.mPath = inPath
+        self.mRootNode = inRootNode
+        self.mUVSetName = inUVSetName
+        self.mWidth = inWidth
+        self.mHeight = inHeight
+
+    # Get the path this manifest is written to
+    def getOutputPath(self):
+        return self.mPath
+
+    # Get the path this manifest is written to before it's committed
+    def getPendingPath(self):
+        return self.mPath + '.pending'
+
+    # Write the manifest for the given textures, a list of (path, DXGI format, layout, slice)
+    #   Textures written into a texture array (see Gen.TextureArray) give the array's path and their slice,
+    #   others a slice of None
+    def write(self, inTextures):
+        textures = [ ]
+        quantities = [ ]
+        for path, format, layout, slice in inTextures:
+            name = os.path.basename(path)
+            textures.append({ 'file': name, 'format': getFormatName(format), 'channels': [getSlotName(slot) for slot in layout] })
+
+            for type in sorted(set([slot[0] for slot in layout if slot is not None])):
+                quantities.append({ 'type': getTypeName(type), 'displayName': RenderType.fromType(type).getDisplayName(), 'file': name, 'channels': getLayoutChannels(layout, type) })
+
+            if slice is not None:
+                textures[-1]['slice'] = slice
+                for quantity in quantities:
+                    if quantity['file'] == name and 'slice' not in quantity:
+                        quantity['slice'] = slice
+
+        manifest = { 'set': self.mRootNode, 'uvSet': self.mUVSetName, 'width': self.mWidth, 'height': self.mHeight, 'textures': textures, 'quantities': quantities }
+        with open(self.getPendingPath(), 'w') as fp:
+            json.dump(manifest, fp, indent=4, sort_keys=True)
+
+    # Replace the manifest at getOutputPath() with the one written by write()
+    def commit(self):
+        if os.path.exists(self.mPath):
+            os.remove(self.mPath)
+        os.rename(self.getPendingPath(), self.mPath)
+
+    # Remove the manifest written by write() if it wasn't committed
+    def discard(self):
+        if os.path.exists(self.getPendingPath()):
+            os.remove(self.getPendingPath())
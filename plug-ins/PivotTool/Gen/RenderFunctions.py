@@ -7,11 +7,23 @@
 
 import math
 import random
-import maya.cmds as cmds
 
 from ..Util import Half
 from ..Util import Vector
 
+# Number of ancestors held by the ancestor render types (three in RGB, the fourth in alpha)
+AncestorLevels = 4
+
+# Largest index a half float holds exactly (the 'Float: Max 2048' types)
+MaxFloatIndex = 2048
+
+# Largest index int16ToHalf can encode before the bits reach infinity/NaN (the 'Int as Float' types)
+MaxIntIndex = 0x7BFF - 1024
+
+# Split indices are stored as index / SplitIndexBase and index % SplitIndexBase, both exact in a half float
+SplitIndexBase = 2048
+MaxSplitIndex = SplitIndexBase * SplitIndexBase - 1
+
 
 # Clamp a value between a min and max
 def clamp(inV, inMin, inMax):
@@ -24,14 +36,61 @@ def int16ToHalf(inValue):
     return Half.ToSingle(int(inValue) + 1024)
 
 
+# Split an index across two channels, index = hi * SplitIndexBase + lo
+def splitIndex(inValue):
+    return [float(int(inValue) / SplitIndexBase), float(int(inValue) % SplitIndexBase)]
+
+
+# Check whether indices of a set with inIndexCount elements have to be written as 32-bit integers
+#   Smaller sets are split across two half float channels, see parentIndexWide
+def needsWideIndices(inIndexCount):
+    return inIndexCount - 1 > MaxSplitIndex
+
+
+# Get the first inLevels ancestor indices of every element from the parent index of each element
+#   inParents is indexed by element, roots have a parent of -1. Every level is found from the level
+#   below it in a single pass over the whole array, rather than walking each element's chain. Like the
+#   parent index types, a root is its own parent, so chains which reach the root keep repeating it.
+def getAncestorTable(inParents, inLevels=AncestorLevels):
+    parents = [index if parent < 0 else parent for index, parent in enumerate(inParents)]
+
+    levels = [parents]
+    for level in range(1, inLevels):
+        levels.append([parents[index] for index in levels[-1]])
+
+    return zip(*levels)
+
+
+# Get the last index within the subtree of every element from the parent index of each element
+#   Found in one pass from the last element back, which sees children before their parents. The
+#   ranges only hold when elements are numbered depth first (pre-order), where parents come before
+#   their children and every subtree is a contiguous run of indices, so any other order raises.
+def getSubtreeEnds(inParents):
+    ends = range(len(inParents))
+    sizes = [1] * len(inParents)
+
+    for index in range(len(inParents) - 1, -1, -1):
+        parent = inParents[index]
+        if parent >= index:
+            raise Exception('Subtree ranges need elements to be numbered depth first, element %i comes before its parent %i!' % (index, parent))
+        if parent >= 0:
+            ends[parent] = max(ends[parent], ends[index])
+            sizes[parent] = sizes[parent] + sizes[index]
+
+        if ends[index] - index + 1 != sizes[index]:
+            raise Exception('Subtree ranges need elements to be numbered depth first!')
+
+    return ends
+
+
 def pivotPosition(inNode, outPixel, inContext):
-    outPixel.setRGB(cmds.xform(inNode.getNode(), q=True, ws=True, rp=True))
+    outPixel.setRGB(inContext.getScene().getWorldPivot(inNode.getNode()))
 
 
 def originPosition(inNode, outPixel, inContext):
     # JB: The Max script uses object.center, I don't know if the BB center is actually equivalent,
     #     since the function refers to the origin? Check Max docs when you get a chance!
-    bb = cmds.xform(inNode.getNode(), q=True, ws=True, bb=True)
+    bb = inContext.getScene().getWorldBounds(inNode.getNode())
     outPixel.setRGB(Vector.sub(bb[3:6], bb[0:3]))
 
 
@@ -65,44 +124,55 @@ def parentIndexFloat(inNode, outPixel, inContext):
     outPixel.setA(float(index))
 
 
+def parentIndexWide(inNode, outPixel, inContext):
+    index = inNode.getParentIndex()
+
+    if index < 0:
+        index = inNode.getIndex()
+    if needsWideIndices(inContext.getIndexCount()):
+        outPixel.setRGB([float(index), 0.0, 0.0])
+    else:
+        outPixel.setRGB(splitIndex(index) + [0.0])
+
+
 def xvector(inNode, outPixel, inContext):
-    m = cmds.xform(inNode.getNode(), q=True, ws=True, m=True)
+    m = inContext.getScene().getWorldMatrix(inNode.getNode())
     v = Vector.toTextureSpace(Vector.normalize(m[0:3]))
     outPixel.setRGB(v)
 
 
 def yvector(inNode, outPixel, inContext):
-    m = cmds.xform(inNode.getNode(), q=True, ws=True, m=True)
+    m = inContext.getScene().getWorldMatrix(inNode.getNode())
     v = Vector.toTextureSpace(Vector.normalize(m[4:7]))
     outPixel.setRGB(v)
 
 
 def zvector(inNode, outPixel, inContext):
-    m = cmds.xform(inNode.getNode(), q=True, ws=True, m=True)
+    m = inContext.getScene().getWorldMatrix(inNode.getNode())
     v = Vector.toTextureSpace(Vector.normalize(m[8:11]))
     outPixel.setRGB(v)
 
 
 def maxBoundingBoxDistanceX(inNode, outPixel, inContext):
-    bb = cmds.xform(inNode.getNode(), q=True, bb=True)
-    vec = Vector.normalize(cmds.xform(inNode.getNode(), q=True, ws=True, m=True)[0:3])
+    bb = inContext.getScene().getLocalBounds(inNode.getNode())
+    vec = Vector.normalize(inContext.getScene().getWorldMatrix(inNode.getNode())[0:3])
     outPixel.setA(Vector.dotAbs(Vector.sub(bb[3:6], bb[0:3]), vec))
 
 
 def maxBoundingBoxDistanceY(inNode, outPixel, inContext):
-    bb = cmds.xform(inNode.getNode(), q=True, bb=True)
-    vec = Vector.normalize(cmds.xform(inNode.getNode(), q=True, ws=True, m=True)[4:7])
+    bb = inContext.getScene().getLocalBounds(inNode.getNode())
+    vec = Vector.normalize(inContext.getScene().getWorldMatrix(inNode.getNode())[4:7])
     outPixel.setA(Vector.dotAbs(Vector.sub(bb[3:6], bb[0:3]), vec))
 
 
 def maxBoundingBoxDistanceZ(inNode, outPixel, inContext):
-    bb = cmds.xform(inNode.getNode(), q=True, bb=True)
-    vec = Vector.normalize(cmds.xform(inNode.getNode(), q=True, ws=True, m=True)[8:11])
+    bb = inContext.getScene().getLocalBounds(inNode.getNode())
+    vec = Vector.normalize(inContext.getScene().getWorldMatrix(inNode.getNode())[8:11])
     outPixel.setA(Vector.dotAbs(Vector.sub(bb[3:6], bb[0:3]), vec))
 
 
 def boundingBoxDiameter(inNode, outPixel, inContext):
-    bb = cmds.xform(inNode.getNode(), q=True, bb=True)
+    bb = inContext.getScene().getLocalBounds(inNode.getNode())
     d = Vector.sub(bb[3:5], bb[0:3])
     outPixel.setA(math.sqrt(Vector.dot(d, d)))
 
@@ -132,3 +202,27 @@ def normalizedStepsToRoot(inNode, outPixel, inContext):
 
 def random01(inNode, outPixel, inContext):
     outPixel.setA(random.random())
+
+
+def ancestorIndicesInt(inNode, outPixel, inContext):
+    outPixel.setRGB([int16ToHalf(index) for index in inContext.getAncestorIndices(inNode.getIndex())[0:3]])
+
+
+def ancestorIndicesFloat(inNode, outPixel, inContext):
+    outPixel.setRGB([float(index) for index in inContext.getAncestorIndices(inNode.getIndex())[0:3]])
+
+
+def fourthAncestorIndexInt(inNode, outPixel, inContext):
+    outPixel.setA(int16ToHalf(inContext.getAncestorIndices(inNode.getIndex())[3]))
+
+
+def fourthAncestorIndexFloat(inNode, outPixel, inContext):
+    outPixel.setA(float(inContext.getAncestorIndices(inNode.getIndex())[3]))
+
+
+def subtreeEndInt(inNode, outPixel, inContext):
+    outPixel.setA(int16ToHalf(inContext.getSubtreeEnd(inNode.getIndex())))
+
+
+def subtreeEndFloat(inNode, outPixel, inContext):
+    outPixel.setA(float(inContext.getSubtreeEnd(inNode.getIndex())))
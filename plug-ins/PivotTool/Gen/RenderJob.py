@@ -0,0 +1,282 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import os
+import time
+
+import Atlas
+import Packing
+import RenderFunctions
+import TextureArray
+from RenderType import *
+from Texture import Texture, Compression, getFilename
+from StaticMeshBuilder import StaticMeshData
+
+# NOTE: Nothing in here may import Maya. Jobs are plain dictionaries of lists, numbers and strings so
+#       they can be pickled across to a render process (see RenderProcess), which may not be running
+#       inside Maya at all.
+
+# Bumped whenever the layout of a job changes
+JobVersion = 7
+
+
+#
+# Scene queries answered from the node tables of a job, enough for the render functions
+#
+class JobScene:
+
+    def __init__(self, inNodes):
+        self.mNodes = inNodes
+
+    def _get(self, inNode, inKey):
+        if inNode not in self.mNodes:
+            raise Exception("'%s' isn't part of the render job!" % inNode)
+        return self.mNodes[inNode][inKey]
+
+    def getWorldMatrix(self, inNode):
+        return self._get(inNode, 'worldMatrix')
+
+    def getWorldPivot(self, inNode):
+        return self._get(inNode, 'worldPivot')
+
+    def getWorldBounds(self, inNode):
+        return self._get(inNode, 'worldBounds')
+
+    def getLocalBounds(self, inNode):
+        return self._get(inNode, 'localBounds')
+
+
+#
+# Render context handed to the render functions in place of the Builder
+#
+class JobContext:
+
+    # inIndexCount overrides the number of elements index formats have to hold, see Builder.getIndexCount
+    def __init__(self, inScene, inMaxDepth, inElements, inIndexCount=None):
+        self.mScene = inScene
+        self.mMaxDepth = inMaxDepth
+        self.mElements = inElements
+        self.mIndexEnd = max([element.getIndex() for element in inElements]) + 1 if len(inElements) > 0 else 0
+        self.mIndexCount = inIndexCount if inIndexCount is not None else self.mIndexEnd
+        self.mAncestors = None
+        self.mSubtreeEnds = None
+
+    def getScene(self):
+        return self.mScene
+
+    # Get the number of elements in the set
+    def getIndexCount(self):
+        return self.mIndexCount
+
+    # Get the parent index of every element, by index
+    def getParentIndices(self):
+        parents = [-1] * self.mIndexEnd
+        for element in self.mElements:
+            parents[element.getIndex()] = element.getParentIndex()
+        return parents
+
+    # Get the first RenderFunctions.AncestorLevels ancestor indices of an element
+    def getAncestorIndices(self, inIndex):
+
+        if self.mAncestors is None:
+            self.mAncestors = RenderFunctions.getAncestorTable(self.getParentIndices())
+        return self.mAncestors[inIndex]
+
+    # Get the last index within the subtree of an element, elements have to be numbered depth first
+    def getSubtreeEnd(self, inIndex):
+
+        if self.mSubtreeEnds is None:
+            self.mSubtreeEnds = RenderFunctions.getSubtreeEnds(self.getParentIndices())
+        return self.mSubtreeEnds[inIndex]
+
+
+#
+# Texture described by a job rather than by a texture view
+#
+class JobTexture(Texture):
+
+    def __init__(self, inWidth, inHeight, inDesc):
+        Texture.__init__(self, inWidth, inHeight, None, None)
+        self.mDesc = inDesc
+        self.setChannels(inDesc.get('channels', None))
+
+    def getRGBSource(self):
+        return self.mDesc['rgb']
+
+    def getASource(self):
+        return self.mDesc['a']
+
+    def getCompression(self):
+        return self.mDesc.get('compression', Compression.Uncompressed)
+
+    def getOutputPath(self):
+        return self.mDesc['path']
+
+
+# Build a render job for a set once its hierarchy and texture info are ready
+#   Elements are [node, index, parent index, depth, mesh] and are listed in the order the builder
+#   would render them. The mesh is the node the element came from, for skinned meshes this is the
+#   mesh each joint is bound to. The node tables hold every element and mesh node. Packed textures
+#   carry their channel layout, and the manifest describing them is written with the textures. Texture
+#   arrays list the output paths of their slices. Atlas sets carry their region (see Atlas.AtlasRegion),
+#   their elements are already numbered within the atlas.
+def createJob(inBuilder, inHierarchy):
+
+    scene = inBuilder.getScene()
+
+    elements = [ ]
+    nodes = { }
+    for node, parent in inHierarchy.flatten():
+        if node.mDataBuilder is None:
+            continue
+
+        for data in node.mDataBuilder.getRenderData():
+            if data.getIndex() < 0:
+                continue
+            elements.append([data.getNode(), data.getIndex(), data.getParentIndex(), data.getDepth(), node.mNode])
+
+            for name in [data.getNode(), node.mNode]:
+                if name not in nodes:
+                    nodes[name] = {
+                        'worldMatrix': list(scene.getWorldMatrix(name)),
+                        'worldPivot': list(scene.getWorldPivot(name)),
+                        'worldBounds': list(scene.getWorldBounds(name)),
+                        'localBounds': list(scene.getLocalBounds(name))
+                    }
+
+    textures = [ ]
+    for texture in inBuilder.mTextures:
+        textures.append({ 'rgb': texture.getRGBSource(), 'a': texture.getASource(), 'compression': texture.getCompression(), 'path': texture.getOutputPath() })
+        if texture.getChannels() is not None:
+            textures[-1]['channels'] = texture.getChannels()
+
+    return {
+        'version': JobVersion,
+        'name': inBuilder.mView.getRootNode(),
+        'uvSet': inBuilder.mView.getAdvancedView().getUVSetName(),
+        'width': int(inBuilder.mTextureWidth),
+        'height': int(inBuilder.mTextureHeight),
+        'maxDepth': inBuilder.mMaxDepth,
+        'compactFormats': bool(inBuilder.mView.getAdvancedView().getCompactFormats()),
+        'textures': textures,
+        'manifest': inBuilder.mManifest.getOutputPath() if inBuilder.mManifest is not None else None,
+        'arrays': [{ 'path': array.getOutputPath(), 'slices': list(array.getSlices()) } for array in inBuilder.mArrays],
+        'atlas': inBuilder.mAtlas.toDict() if inBuilder.mAtlas is not None else None,
+        'elements': elements,
+        'nodes': nodes
+    }
+
+
+# Render every texture of a job and write it to its pending path (see Texture.write)
+#   Returns a report dictionary with the time spent rendering and the time spent writing each texture
+def renderJob(inJob):
+
+    if inJob.get('version', None) != JobVersion:
+        raise Exception("Render job version %s isn't supported (expected %i)!" % (inJob.get('version', None), JobVersion))
+
+    report = { 'name': inJob['name'], 'elements': len(inJob['elements']), 'renderTime': 0.0, 'writeTime': 0.0, 'textures': [ ] }
+
+    atlas = getAtlas(inJob)
+
+    elements = [StaticMeshData(node, parentIndex, index, depth) for node, index, parentIndex, depth, mesh in inJob['elements']]
+    context = JobContext(JobScene(inJob['nodes']), inJob['maxDepth'], elements, atlas.getCapacity() if atlas is not None else None)
+
+    written = [ ]
+    for desc in inJob['textures']:
+        texture = JobTexture(inJob['width'], atlas.getRowCount() if atlas is not None else inJob['height'], desc)
+        texture.setAtlas(atlas)
+        texture.setIndexCount(context.getIndexCount())
+        texture.setCompactFormats(inJob['compactFormats'])
+        texture.checkIndexLimits()
+        texture.checkCompression()
+
+        start = time.time()
+        texture.renderElements(elements, context)
+        renderTime = time.time() - start
+
+        start = time.time()
+        texture.write()
+        writeTime = time.time() - start
+
+        report['renderTime'] = report['renderTime'] + renderTime
+        report['writeTime'] = report['writeTime'] + writeTime
+        report['textures'].append({ 'path': texture.getOutputPath(), 'renderTime': renderTime, 'writeTime': writeTime, 'compression': texture.getCompressionReport() })
+        written.append((texture.getOutputPath(), texture.getFormat(), texture.getChannels()))
+
+    arrays = getArrays(inJob)
+    for array in arrays:
+        array.write()
+
+    if inJob['manifest'] is not None:
+        textures = [ ]
+        for path, format, channels in written:
+            location, slice = TextureArray.getLocation(arrays, path)
+            textures.append((location, format, channels, slice))
+        getManifest(inJob).write(textures)
+
+    return report
+
+
+# Get the manifest of a job's packed textures
+def getManifest(inJob):
+    return Packing.Manifest(inJob['manifest'], inJob['name'], inJob['uvSet'], inJob['width'], inJob['height'])
+
+
+# Get the texture arrays of a job
+def getArrays(inJob):
+    return [TextureArray.TextureArray(array['path'], array['slices']) for array in inJob['arrays']]
+
+
+# Get the atlas region of a job, None unless the set is in an atlas
+def getAtlas(inJob):
+    return Atlas.fromDict(inJob['name'], inJob['atlas'])
+
+
+# Get the path a job's texture is written to before it's committed, see Texture.getPendingPath
+def getPendingPath(inJob, inPath):
+    if inJob['atlas'] is not None:
+        return Atlas.getPendingPath(inPath, inJob['name'])
+    return inPath + '.pending'
+
+
+# Get a copy of a job which renders inTextures, a list of (RGB, alpha, compression), into inOutputDir
+#   Texture names follow the ones a build would give them (after the atlas, for atlas sets). Without
+#   inTextures the job's own textures (and manifest) are moved to inOutputDir.
+def retargetJob(inJob, inTextures, inOutputDir):
+    job = dict(inJob)
+    root = inJob['atlas']['name'] if inJob['atlas'] is not None else inJob['name']
+    if inTextures is None:
+        job['textures'] = [dict(desc, path=os.path.join(inOutputDir, os.path.basename(desc['path']))) for desc in inJob['textures']]
+        job['manifest'] = os.path.join(inOutputDir, os.path.basename(inJob['manifest'])) if inJob['manifest'] is not None else None
+        job['arrays'] = [{ 'path': os.path.join(inOutputDir, os.path.basename(array['path'])), 'slices': [os.path.join(inOutputDir, os.path.basename(path)) for path in array['slices']] } for array in inJob['arrays']]
+    else:
+        job['textures'] = [{ 'rgb': rgb, 'a': a, 'compression': compression, 'path': os.path.join(inOutputDir, getFilename(root, rgb, a, inJob['uvSet'])) } for rgb, a, compression in inTextures]
+        job['manifest'] = None
+        job['arrays'] = [ ]
+    return job
+
+
+# Move the textures written by renderJob into place, as Texture.commit
+#   Textures written into an array only exist as its slices. Atlas sets only replace their region of the
+#   atlas textures, so jobs sharing an atlas mustn't be committed at the same time.
+def commitJob(inJob):
+    arrays = getArrays(inJob)
+    atlas = getAtlas(inJob)
+    for desc in inJob['textures']:
+        if TextureArray.getLocation(arrays, desc['path'])[1] is not None:
+            continue
+        if atlas is not None:
+            Atlas.commitRegion(getPendingPath(inJob, desc['path']), desc['path'], atlas)
+            continue
+        if os.path.exists(desc['path']):
+            os.remove(desc['path'])
+        os.rename(desc['path'] + '.pending', desc['path'])
+
+    for array in arrays:
+        array.commit()
+
+    if inJob['manifest'] is not None:
+        getManifest(inJob).commit()
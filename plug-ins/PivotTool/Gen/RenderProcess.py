@@ -0,0 +1,174 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import cPickle
+import os
+import subprocess
+import sys
+import threading
+import traceback
+
+import RenderJob
+
+# NOTE: Like RenderJob, nothing in here may import Maya, serve() runs in a plain (maya)python process.
+
+# Set to False to have builds render and write textures in Maya's process (see BuildOutput)
+Enabled = True
+
+# Interpreter used for the render process, None picks mayapy when running inside Maya
+Python = None
+
+# The plug-ins directory, added to the render process' path so it can import the tool
+PluginDir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bootstrap passed to the interpreter with -c
+ServeScript = 'import sys; sys.path.insert(0, %r); from PivotTool.Gen import RenderProcess; RenderProcess.serve()'
+
+# Keeps a console window from popping up for the process on Windows
+CreateNoWindow = 0x08000000
+
+# The render process shared by every build, see getRenderProcess()
+ActiveProcess = None
+ActiveLock = threading.Lock()
+
+
+#
+# Long lived helper process which renders and writes textures for render jobs
+#   Requests and responses are pickled over the process' stdin/stdout, one request at a time. The
+#   calling thread blocks on the pipe without holding the GIL, so Maya carries on in the meantime.
+#
+class RenderProcess:
+
+    def __init__(self, inPython):
+        flags = CreateNoWindow if os.name == 'nt' else 0
+        self.mProcess = subprocess.Popen([inPython, '-u', '-c', ServeScript % PluginDir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, creationflags=flags)
+        self.mLock = threading.Lock()
+
+    def isAlive(self):
+        return self.mProcess.poll() is None
+
+    # Send a request and wait for the response, errors raised by the process are raised here
+    def request(self, inName, inData=None):
+        with self.mLock:
+            try:
+                cPickle.dump((inName, inData), self.mProcess.stdin, cPickle.HIGHEST_PROTOCOL)
+                self.mProcess.stdin.flush()
+                result, error = cPickle.load(self.mProcess.stdout)
+            except (EOFError, IOError, OSError, cPickle.UnpicklingError):
+                if self.isAlive():
+                    self.mProcess.kill()
+                raise Exception('Render process %i exited unexpectedly (exit code %s)!' % (self.mProcess.pid, self.mProcess.wait()))
+
+        if error is not None:
+            raise Exception('Render process failed:\n%s' % error)
+        return result
+
+    # Render and write the textures of a job (see RenderJob.renderJob), returns its report
+    def render(self, inJob):
+        return self.request('render', inJob)
+
+    # Ask the process to quit and wait for it
+    def close(self):
+        with self.mLock:
+            if not self.isAlive():
+                return
+            try:
+                cPickle.dump(('quit', None), self.mProcess.stdin, cPickle.HIGHEST_PROTOCOL)
+                self.mProcess.stdin.close()
+            except (IOError, OSError):
+                self.mProcess.kill()
+            self.mProcess.wait()
+
+
+# Get the interpreter to run the render process with
+#   Inside Maya sys.executable is Maya itself, so look for mayapy alongside it
+def getPython():
+    if Python is not None:
+        return Python
+
+    folder = os.path.dirname(sys.executable)
+    for path in [os.path.join(folder, 'mayapy.exe'), os.path.join(folder, 'mayapy'), os.path.join(folder, '..', 'bin', 'mayapy')]:
+        if os.path.exists(path):
+            return os.path.normpath(path)
+    return sys.executable
+
+
+# Get the shared render process, starting it if it isn't running
+#   A new process has to answer a ping before it's used, so a broken interpreter fails here
+def getRenderProcess():
+    global ActiveProcess
+
+    with ActiveLock:
+        if ActiveProcess is None or not ActiveProcess.isAlive():
+            process = RenderProcess(getPython())
+            process.request('ping')
+            ActiveProcess = process
+        return ActiveProcess
+
+
+# Stop the shared render process, if it's running
+def shutdown():
+    global ActiveProcess
+
+    with ActiveLock:
+        if ActiveProcess is not None:
+            ActiveProcess.close()
+            ActiveProcess = None
+
+
+# Render a job in the shared render process, falling back to this process if it can't be started
+#   The report gains 'process', the pid which did the work, and 'fallback', why it wasn't the render
+#   process (or None)
+def renderJob(inJob):
+    try:
+        process = getRenderProcess()
+    except:
+        fallback = "Couldn't start the render process:\n%s" % traceback.format_exc()
+        print fallback
+
+        report = RenderJob.renderJob(inJob)
+        report['process'] = os.getpid()
+        report['fallback'] = fallback
+        return report
+
+    report = process.render(inJob)
+    report['process'] = process.mProcess.pid
+    report['fallback'] = None
+    return report
+
+
+# Render process main loop, answers requests from stdin until told to quit (or the pipe closes)
+def serve():
+    requests = sys.stdin
+    responses = sys.stdout
+
+    # Anything printed while rendering goes to stderr, stdout only carries responses
+    sys.stdout = sys.stderr
+
+    handlers = {
+        'ping': lambda inData: os.getpid(),
+        'render': RenderJob.renderJob
+    }
+
+    while True:
+        try:
+            name, data = cPickle.load(requests)
+        except EOFError:
+            return
+        if name == 'quit':
+            return
+
+        result = None
+        error = None
+        try:
+            if name not in handlers:
+                raise Exception("Unknown render process request '%s'!" % name)
+            result = handlers[name](data)
+        except:
+            error = traceback.format_exc()
+
+        cPickle.dump((result, error), responses, cPickle.HIGHEST_PROTOCOL)
+        responses.flush()
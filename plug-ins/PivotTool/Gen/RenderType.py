@@ -93,6 +93,13 @@ class RenderType:
     XExtent = 21
     YExtent = 22
     ZExtent = 23
+    AncestorIndicesInt = 24
+    AncestorIndicesFloat = 25
+    FourthAncestorIndexInt = 26
+    FourthAncestorIndexFloat = 27
+    SubtreeEndInt = 28
+    SubtreeEndFloat = 29
+    ParentIndexWide = 30
 
     Items = [
         RenderTypeItem(NoRender,				RenderPrecision.Both,	None,										None,	'', 								'Nothing'),
@@ -116,9 +123,33 @@ class RenderType:
         RenderTypeItem(RandomValueLDR,			RenderPrecision.U8,		RenderFunctions.random01,					True,	'Random0-1',						'Random 0-1 Value Per Element'),
         RenderTypeItem(XExtent,					RenderPrecision.U8,		RenderFunctions.maxBoundingBoxDistanceXLDR,	True,	'XExtentDividedby2048reaches2048',	'X Extent (0-2048)'),
         RenderTypeItem(YExtent,					RenderPrecision.U8,		RenderFunctions.maxBoundingBoxDistanceYLDR,	True,	'YExtentDividedby2048reaches2048',	'Y Extent (0-2048)'),
-        RenderTypeItem(ZExtent,					RenderPrecision.U8,		RenderFunctions.maxBoundingBoxDistanceZLDR,	True,	'ZExtentDividedby2048reaches2048',	'Z Extent (0-2048)')
+        RenderTypeItem(ZExtent,					RenderPrecision.U8,		RenderFunctions.maxBoundingBoxDistanceZLDR,	True,	'ZExtentDividedby2048reaches2048',	'Z Extent (0-2048)'),
+        RenderTypeItem(AncestorIndicesInt,		RenderPrecision.FP16,	RenderFunctions.ancestorIndicesInt,			False,	'AncestorIndicesInt',				'Ancestor Indices 1-3 (Int as Float)'),
+        RenderTypeItem(AncestorIndicesFloat,	RenderPrecision.FP16,	RenderFunctions.ancestorIndicesFloat,		False,	'AncestorIndicesFloat',				'Ancestor Indices 1-3 (Float: Max 2048)'),
+        RenderTypeItem(FourthAncestorIndexInt,	RenderPrecision.FP16,	RenderFunctions.fourthAncestorIndexInt,		True,	'Ancestor4IndexInt',				'Ancestor Index 4 (Int as Float)'),
+        RenderTypeItem(FourthAncestorIndexFloat,RenderPrecision.FP16,	RenderFunctions.fourthAncestorIndexFloat,	True,	'Ancestor4IndexFloat',				'Ancestor Index 4 (Float: Max 2048)'),
+        RenderTypeItem(SubtreeEndInt,			RenderPrecision.FP16,	RenderFunctions.subtreeEndInt,				True,	'SubtreeEndInt',					'Subtree End Index (Int as Float)'),
+        RenderTypeItem(SubtreeEndFloat,			RenderPrecision.FP16,	RenderFunctions.subtreeEndFloat,			True,	'SubtreeEndFloat',					'Subtree End Index (Float: Max 2048)'),
+        RenderTypeItem(ParentIndexWide,			RenderPrecision.FP16,	RenderFunctions.parentIndexWide,			False,	'ParentIndexWide',					'Parent Index (Split, No Limit)')
     ]
 
+    # Channels written by RGB types which don't fill all three, compact formats leave the rest out
+    ChannelCounts = {
+        ParentIndexWide: 2
+    }
+
+    # Largest element index each index type can hold, anything beyond would be written corrupted
+    IndexLimits = {
+        ParentIndexInt: RenderFunctions.MaxIntIndex,
+        ParentIndexFloat: RenderFunctions.MaxFloatIndex,
+        AncestorIndicesInt: RenderFunctions.MaxIntIndex,
+        AncestorIndicesFloat: RenderFunctions.MaxFloatIndex,
+        FourthAncestorIndexInt: RenderFunctions.MaxIntIndex,
+        FourthAncestorIndexFloat: RenderFunctions.MaxFloatIndex,
+        SubtreeEndInt: RenderFunctions.MaxIntIndex,
+        SubtreeEndFloat: RenderFunctions.MaxFloatIndex
+    }
+
     @staticmethod
     def fromType(inType):
         filtered = [item for item in RenderType.Items if item.getType() == inType]
@@ -128,6 +159,25 @@ class RenderType:
     def getAlphas(inPrecision):
         return [item for item in RenderType.Items if item.isPrecision(inPrecision) and item.isAlpha()]
 
+    # Get the number of RGB channels an RGB type writes
+    @staticmethod
+    def getChannelCount(inType):
+        return RenderType.ChannelCounts.get(inType, 3)
+
+    # Raise if a set with inIndexCount elements holds indices beyond what inType can store
+    @staticmethod
+    def checkIndexLimit(inType, inIndexCount):
+        limit = RenderType.IndexLimits.get(inType, None)
+        if limit is None or inIndexCount - 1 <= limit:
+            return
+
+        # Only parent indices have a split type without a limit, the others need fewer elements
+        if inType in [RenderType.ParentIndexInt, RenderType.ParentIndexFloat]:
+            advice = "Use '%s' instead." % RenderType.fromType(RenderType.ParentIndexWide).getDisplayName()
+        else:
+            advice = "Reduce the number of elements, eg. with an element budget or by collapsing groups."
+        raise Exception("'%s' can only hold indices up to %i, but there are %i elements! %s" % (RenderType.fromType(inType).getDisplayName(), limit, inIndexCount, advice))
+
     @staticmethod
     def getRGBs():
         return [item for item in RenderType.Items if item.isRGB()]
@@ -4,8 +4,6 @@
     For license details please check: PivotTool-License.txt
 """
 
-import maya.cmds as cmds
-
 import Trees
 
 
@@ -14,14 +12,15 @@ import Trees
 #
 class SkeletonBuilder:
 
-    def __init__(self, inClusterNodes):
+    def __init__(self, inClusterNodes, inScene):
         self.mNodes = inClusterNodes
+        self.mScene = inScene
         self.mSkeleton = None
 
     def build(self):
         base = findCommonBase(self.mNodes)
 
-        self.mSkeleton = Trees.getMeshHierarchy(base)
+        self.mSkeleton = Trees.getMeshHierarchy(base, self.mScene)
         self._markNode(self.mSkeleton)
         self._removeNodes(self.mSkeleton)
 
@@ -52,37 +51,16 @@ class SkeletonBuilder:
         inNode.mChildren = children
 
 
-# Convert a node name reference to a full path (if necessary)
-# TODO:? Move this to Util
-#        Can do if necessary, but it's not used anywhere else in this application
-def getFullPath(inNode):
-    nodeName = inNode.split('|')[-1]
-    parents = cmds.listRelatives(inNode, allParents=True, fullPath=True)
-    if parents is None or len(parents) == 0:
-        return '|%s' % nodeName
-
-    allChildren = [cmds.listRelatives(node, children=True, fullPath=True) for node in parents]
-    allChildren = [child for sublist in allChildren for child in sublist]
-    filtered = [child for child in allChildren if child.split('|')[-1] == nodeName]
-
-    if len(filtered) == 0:
-        raise Exception("Filtered child list shouldn't have 0 members??")
-
-    return filtered[0]
-
-
 # Get influcing nodes from a skin cluster
-def getInfluenceNodes(inSkinCluster):
-    return [getFullPath(node) for node in cmds.skinCluster(inSkinCluster, q=True, inf=True)]
+def getInfluenceNodes(inSkinCluster, inScene):
+    return inScene.getInfluences(inSkinCluster)
 
 
-# Get an array which contains the path to the new from it's root
+# Get an array which contains the path to the node from it's root
+#   Nodes are full paths, so every parent is a prefix of the path
 def getAllParents(inNode):
-    parents = cmds.listRelatives(inNode, allParents=True, fullPath=True)
-    if parents is None or len(parents) == 0:
-        return [ inNode ]
-    else:
-        return getAllParents(parents[0]) + [ inNode ]
+    parts = inNode.split('|')
+    return ['|'.join(parts[0:i + 1]) for i in range(1, len(parts))]
 
 
 # Find the lowest common ancestor in a given array of nodes
@@ -98,7 +76,7 @@ def findCommonBase(inNodes):
             break
 
         needle = allParents[0][depth]
-        if len([True for parents in allParents if needle not in parents or parents.index(needle) != depth]) > 0:
+        if len([True for parents in allParents if len(parents) <= depth or parents[depth] != needle]) > 0:
             break
 
         depth = depth + 1
@@ -108,11 +86,24 @@ def findCommonBase(inNodes):
     return allParents[0][depth - 1]
 
 
-# Get a skeleton hierarchy from a skincluster node
-def fromSkinCluster(inSkinCluster):
-    nodes = getInfluenceNodes(inSkinCluster)
+# Group the influence lists of several skin clusters by the rig they're bound to
+#   Returns a dictionary taking each list (as a frozenset) to the largest list containing it, so a
+#   skeleton built from that list holds every joint the smaller one needs. Lists which only partly
+#   overlap are kept apart.
+def groupInfluences(inInfluences):
+    keys = set([frozenset(influences) for influences in inInfluences])
+    rigs = sorted(keys, key=lambda key: (-len(key), sorted(key)))
+    return dict([(key, [rig for rig in rigs if key <= rig][0]) for key in keys])
+
 
-    builder = SkeletonBuilder(nodes)
+# Get a skeleton hierarchy from a list of influence nodes
+def fromInfluences(inNodes, inScene):
+    builder = SkeletonBuilder(inNodes, inScene)
     builder.build()
 
     return builder.mSkeleton
+
+
+# Get a skeleton hierarchy from a skincluster node
+def fromSkinCluster(inSkinCluster, inScene):
+    return fromInfluences(getInfluenceNodes(inSkinCluster, inScene), inScene)
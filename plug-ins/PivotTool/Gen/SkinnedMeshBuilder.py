@@ -4,7 +4,6 @@
     For license details please check: PivotTool-License.txt
 """
 
-import maya.cmds as cmds
 from RenderType import *
 from Texture import Texture
 import Skeleton
@@ -32,13 +31,22 @@ class SkinnedMeshData:
     def getNode(self):
         return self.mNode
 
+    # Move the joint to new indices, inMap gives the new index of each old index
+    def remapIndices(self, inMap):
+        self.mIndex = inMap[self.mIndex]
+        self.mParentIndex = inMap[self.mParentIndex] if self.mParentIndex >= 0 else -1
+
 
 #
-# Builder for static mesh objects, has a single StaticMeshData
+# Builder for skinned mesh objects, has a SkinnedMeshData per joint of its compacted skeleton
+#   Meshes bound to the same rig share one skeleton (see Skeleton.groupInfluences). The first mesh
+#   builds it and owns its joints, the others take no indices of their own and only lay their UVs out
+#   on the owner's joints. Their children hang off the element above them, as with collapsed groups,
+#   so every subtree stays a contiguous run of indices.
 #
 class SkinnedMeshDataBuilder:
 
-    def __init__(self, inNode, inParentIndex, inStartIndex, inParentDepth):
+    def __init__(self, inNode, inParentIndex, inStartIndex, inParentDepth, inScene, inInfluences=None, inShared=None):
         self.mNode = inNode
         self.mParentIndex = inParentIndex
         self.mIndex = inStartIndex
@@ -46,9 +54,22 @@ class SkinnedMeshDataBuilder:
         self.mMaxDepth = self.mDepth
         self.mData = [ ]
 
-        # Get a compacted skeleton for this skin cluster
-        self.mSkinCluster = SkinnedMeshDataBuilder.getSkinCluster(inNode)
-        self.mSkeleton = Skeleton.fromSkinCluster(self.mSkinCluster)
+        self.mScene = inScene
+        self.mSkinCluster = SkinnedMeshDataBuilder.getSkinCluster(inNode, inScene)
+
+        # Meshes sharing a skeleton only borrow its joints, their children hang off their own parent
+        if inShared is not None:
+            self.mIndex = inParentIndex
+            self.mMaxDepth = inParentDepth
+            self.mJoints = inShared.mJoints
+            self.mIndexCount = 0
+            return
+
+        # Get a compacted skeleton for this skin cluster, or the rig it's bound to
+        if inInfluences is not None:
+            self.mSkeleton = Skeleton.fromInfluences(inInfluences, inScene)
+        else:
+            self.mSkeleton = Skeleton.fromSkinCluster(self.mSkinCluster, inScene)
 
         self.mSkeleton.mIndex = self.mIndex
         self.mSkeleton.mParentIndex = inParentIndex
@@ -59,6 +80,7 @@ class SkinnedMeshDataBuilder:
         self.mSkeleton.iterate(self._assignSkeletonData)
 
         self.mIndexCount = self.mSkeletonIndex - self.mIndex
+        self.mJoints = dict([(data.getNode(), data) for data in self.mData])
 
     def getRootIndex(self):
         return self.mIndex
@@ -69,6 +91,20 @@ class SkinnedMeshDataBuilder:
     def getIndexCount(self):
         return self.mIndexCount
 
+    # Get the data objects rendered for this node, one per joint
+    def getRenderData(self):
+        return self.mData
+
+    # Move the joints to new indices (see Builder.orderElements)
+    #   The skeleton itself isn't updated, it's only used while indices are assigned. Shared joints are
+    #   moved by the builder owning them.
+    def remapIndices(self, inMap):
+        for data in self.mData:
+            data.remapIndices(inMap)
+
+        self.mIndex = inMap[self.mIndex] if self.mIndex >= 0 else -1
+        self.mParentIndex = inMap[self.mParentIndex] if self.mParentIndex >= 0 else -1
+
     # Tree iterator to assign indices and metadata to skeletal joints
     def _assignSkeletonData(self, inNode, inParent):
 
@@ -92,48 +128,32 @@ class SkinnedMeshDataBuilder:
         # Add a UV set to the mesh, if necessary
         inBuilder.tryMakeUVSet(inNode, inBuilder.mView.getAdvancedView().getUVSetName())
 
-        # Get data objects ordered by influence
-        influences = Skeleton.getInfluenceNodes(self.mSkinCluster)
-        influences = [[data for data in self.mData if data.mNode == influence][0] for influence in influences]
+        # Get data objects ordered by influence, these belong to the owner when the skeleton is shared
+        influences = Skeleton.getInfluenceNodes(self.mSkinCluster, self.mScene)
+        influences = [self.mJoints[influence] for influence in influences]
 
-        uvCount = cmds.polyEvaluate(self.mNode.mNode, uv=True)
-        for uv in range(0, uvCount):
+        # Group UVs by their primary influence so each joint only needs a single edit
+        uvsByInfluence = { }
+        primary = self.mScene.getPrimaryInfluences(self.mNode.mNode)
+        for uv in range(0, len(primary)):
+            uvsByInfluence.setdefault(primary[uv], [ ]).append(uv)
 
-            # Get primary influence
-            weights = cmds.skinPercent(self.mSkinCluster, '%s.map[%i]' % (self.mNode.mNode, uv), q=True, v=True)
-            index = weights.index(max(weights))
+        for index, uvs in uvsByInfluence.iteritems():
             data = influences[index]
 
             # Get coordinate from index
             ucoord, vcoord = inBuilder.getUVCoordinate(data.getIndex())
 
             # Move UVs
-            cmds.polyEditUV('%s.map[%i]' % (self.mNode.mNode, uv), r=False, u=ucoord, v=vcoord)
+            self.mScene.setUVs(self.mNode.mNode, inBuilder.mView.getAdvancedView().getUVSetName(), uvs, ucoord, vcoord)
 
     # Render texture data
     def renderTextures(self, inBuilder, inNode):
 
+        elements = [data for data in self.mData if data.getIndex() >= 0]
         for texture in inBuilder.mTextures:
-            for source in [texture.getRGBSource(), texture.getASource()]:
-                renderType = RenderType.fromType(source)
-
-                for data in self.mData:
-                    if data.getIndex() < 0:
-                        continue
-                    renderType.call(data, inBuilder, texture.getData()[data.getIndex()])
+            texture.renderElements(elements, inBuilder)
 
     @staticmethod
-    def getSkinCluster(inNode):
-
-        shapes = cmds.listRelatives(inNode.mNode, s=True, typ='mesh')
-        hasMeshes = shapes is not None and len(shapes) > 0
-
-        if not hasMeshes:
-            return None
-
-        inputs = cmds.listConnections('%s.inMesh' % inNode.mNode, d=False, s=True)
-        
-        if inputs is None:
-            return None
-        clusters = [node for node in inputs if cmds.nodeType(node) == 'skinCluster']
-        return clusters[0] if len(clusters) > 0 else None
+    def getSkinCluster(inNode, inScene):
+        return inScene.getSkinCluster(inNode.mNode)
@@ -0,0 +1,271 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import struct
+
+import RenderJob
+
+# NOTE: Nothing in here may import Maya, snapshots are read back on machines without it.
+
+#
+# Snapshot files hold the render jobs (see RenderJob) of one or more pivot sets, so their textures can
+# be rendered again without the scene. All values are little endian:
+#
+#   Header:
+#     char[4]   'PTSN'
+#     uint32    file version
+#     uint32    set count
+#
+#   Per set:
+#     string    pivot node name
+#     string    UV set name
+#     uint32    texture width, texture height
+#     int32     max depth
+#     uint32    compact formats (0 or 1)
+#     uint32    texture count
+#       int32     RGB render type, alpha render type
+#       uint32    compression (see Gen.Texture.Compression)
+#       string    output path
+#       uint32    packed channel count (0 unless the texture is packed, see Gen.Packing)
+#         int32     per channel: render type, component (-1, -1 when unused)
+#     string    manifest path (empty unless textures are packed)
+#     uint32    texture array count
+#       string    array path
+#       uint32    slice count
+#         string    slice output paths
+#     string    atlas name (empty unless the set is in an atlas, see Gen.Atlas)
+#       uint32    atlas width, atlas height, first element, element count (only with an atlas name)
+#     uint32    node count
+#       string    node names
+#       float64   per node: world matrix (16), world pivot (3), world bounds (6), local bounds (6)
+#     uint32    element count
+#       int32     per element: node, index, parent index, depth, mesh (nodes as positions in the node list)
+#
+#   Strings are a uint32 byte count followed by UTF-8.
+#
+
+# File identifier
+Magic = 'PTSN'
+
+# Bumped whenever the layout above (or RenderJob.JobVersion) changes
+FileVersion = 6
+
+# Extension given to snapshot files
+Extension = '.pivotsnap'
+
+# Node table entries, in the order they're written
+NodeFields = [('worldMatrix', 16), ('worldPivot', 3), ('worldBounds', 6), ('localBounds', 6)]
+NodeSize = sum([size for field, size in NodeFields])
+
+# Values per element
+ElementSize = 5
+
+
+#
+# Buffered writer for the primitive types of a snapshot
+#
+class SnapshotWriter:
+
+    def __init__(self):
+        self.mParts = [ ]
+
+    def uint(self, inValue):
+        self.mParts.append(struct.pack('<I', inValue))
+
+    def ints(self, inValues):
+        self.mParts.append(struct.pack('<%ii' % len(inValues), *inValues))
+
+    def doubles(self, inValues):
+        self.mParts.append(struct.pack('<%id' % len(inValues), *inValues))
+
+    def string(self, inValue):
+        data = inValue.encode('utf-8') if isinstance(inValue, unicode) else inValue
+        self.uint(len(data))
+        self.mParts.append(data)
+
+    def getData(self):
+        return ''.join(self.mParts)
+
+
+#
+# Reader for the primitive types of a snapshot
+#
+class SnapshotReader:
+
+    def __init__(self, inData):
+        self.mData = inData
+        self.mOffset = 0
+
+    def _read(self, inFormat, inSize):
+        if self.mOffset + inSize > len(self.mData):
+            raise Exception('Snapshot is truncated!')
+        values = struct.unpack_from(inFormat, self.mData, self.mOffset)
+        self.mOffset = self.mOffset + inSize
+        return values
+
+    def uint(self):
+        return self._read('<I', 4)[0]
+
+    def ints(self, inCount):
+        return list(self._read('<%ii' % inCount, inCount * 4))
+
+    def doubles(self, inCount):
+        return list(self._read('<%id' % inCount, inCount * 8))
+
+    def string(self):
+        size = self.uint()
+        if self.mOffset + size > len(self.mData):
+            raise Exception('Snapshot is truncated!')
+        value = self.mData[self.mOffset:self.mOffset + size].decode('utf-8')
+        self.mOffset = self.mOffset + size
+        return value
+
+
+# Append a single job to a writer
+def _writeJob(inWriter, inJob):
+
+    inWriter.string(inJob['name'])
+    inWriter.string(inJob['uvSet'])
+    inWriter.uint(inJob['width'])
+    inWriter.uint(inJob['height'])
+    inWriter.ints([inJob['maxDepth']])
+    inWriter.uint(1 if inJob['compactFormats'] else 0)
+
+    inWriter.uint(len(inJob['textures']))
+    for texture in inJob['textures']:
+        inWriter.ints([texture['rgb'], texture['a']])
+        inWriter.uint(texture.get('compression', 0))
+        inWriter.string(texture['path'])
+
+        channels = texture.get('channels', [ ])
+        inWriter.uint(len(channels))
+        for slot in channels:
+            inWriter.ints(slot if slot is not None else [-1, -1])
+    inWriter.string(inJob['manifest'] if inJob['manifest'] is not None else '')
+
+    inWriter.uint(len(inJob['arrays']))
+    for array in inJob['arrays']:
+        inWriter.string(array['path'])
+        inWriter.uint(len(array['slices']))
+        for path in array['slices']:
+            inWriter.string(path)
+
+    atlas = inJob['atlas']
+    inWriter.string(atlas['name'] if atlas is not None else '')
+    if atlas is not None:
+        for key in ['width', 'height', 'offset', 'count']:
+            inWriter.uint(atlas[key])
+
+    names = sorted(inJob['nodes'].keys())
+    indices = dict([(name, i) for i, name in enumerate(names)])
+
+    inWriter.uint(len(names))
+    for name in names:
+        inWriter.string(name)
+
+    values = [ ]
+    for name in names:
+        for field, size in NodeFields:
+            values.extend(inJob['nodes'][name][field])
+    inWriter.doubles(values)
+
+    values = [ ]
+    for node, index, parentIndex, depth, mesh in inJob['elements']:
+        values.extend([indices[node], index, parentIndex, depth, indices[mesh]])
+    inWriter.uint(len(inJob['elements']))
+    inWriter.ints(values)
+
+
+# Read a single job from a reader
+def _readJob(inReader):
+
+    job = { 'version': RenderJob.JobVersion }
+    job['name'] = inReader.string()
+    job['uvSet'] = inReader.string()
+    job['width'] = inReader.uint()
+    job['height'] = inReader.uint()
+    job['maxDepth'] = inReader.ints(1)[0]
+    job['compactFormats'] = inReader.uint() != 0
+
+    job['textures'] = [ ]
+    for i in range(inReader.uint()):
+        rgb, a = inReader.ints(2)
+        compression = inReader.uint()
+        job['textures'].append({ 'rgb': rgb, 'a': a, 'compression': compression, 'path': inReader.string() })
+
+        count = inReader.uint()
+        if count > 0:
+            slots = [inReader.ints(2) for channel in range(count)]
+            job['textures'][-1]['channels'] = [slot if slot[0] >= 0 else None for slot in slots]
+    manifest = inReader.string()
+    job['manifest'] = manifest if len(manifest) > 0 else None
+
+    job['arrays'] = [ ]
+    for i in range(inReader.uint()):
+        path = inReader.string()
+        job['arrays'].append({ 'path': path, 'slices': [inReader.string() for slice in range(inReader.uint())] })
+
+    name = inReader.string()
+    job['atlas'] = None
+    if len(name) > 0:
+        job['atlas'] = { 'name': name }
+        for key in ['width', 'height', 'offset', 'count']:
+            job['atlas'][key] = inReader.uint()
+
+    names = [inReader.string() for i in range(inReader.uint())]
+    values = inReader.doubles(len(names) * NodeSize)
+
+    job['nodes'] = { }
+    offset = 0
+    for name in names:
+        node = { }
+        for field, size in NodeFields:
+            node[field] = values[offset:offset + size]
+            offset = offset + size
+        job['nodes'][name] = node
+
+    count = inReader.uint()
+    values = inReader.ints(count * ElementSize)
+
+    job['elements'] = [ ]
+    for i in range(0, len(values), ElementSize):
+        node, index, parentIndex, depth, mesh = values[i:i + ElementSize]
+        if node >= len(names) or mesh >= len(names):
+            raise Exception("Element %i of '%s' refers to a node which isn't in the snapshot!" % (i / ElementSize, job['name']))
+        job['elements'].append([names[node], index, parentIndex, depth, names[mesh]])
+
+    return job
+
+
+# Write render jobs to a snapshot file
+def write(inPath, inJobs):
+
+    writer = SnapshotWriter()
+    writer.mParts.append(Magic)
+    writer.uint(FileVersion)
+    writer.uint(len(inJobs))
+    for job in inJobs:
+        _writeJob(writer, job)
+
+    with open(inPath, 'wb') as fp:
+        fp.write(writer.getData())
+
+
+# Read the render jobs from a snapshot file
+def read(inPath):
+
+    with open(inPath, 'rb') as fp:
+        reader = SnapshotReader(fp.read())
+
+    if reader.mData[0:4] != Magic:
+        raise Exception("'%s' isn't a pivot snapshot!" % inPath)
+    reader.mOffset = 4
+
+    version = reader.uint()
+    if version != FileVersion:
+        raise Exception("Snapshot '%s' is version %i, only version %i is supported!" % (inPath, version, FileVersion))
+
+    return [_readJob(reader) for i in range(reader.uint())]
@@ -4,7 +4,6 @@
     For license details please check: PivotTool-License.txt
 """
 
-import maya.cmds as cmds
 from RenderType import *
 from Texture import Texture
 
@@ -31,6 +30,11 @@ class StaticMeshData:
     def getNode(self):
         return self.mNode
 
+    # Move the element to new indices, inMap gives the new index of each old index
+    def remapIndices(self, inMap):
+        self.mIndex = inMap[self.mIndex]
+        self.mParentIndex = inMap[self.mParentIndex] if self.mParentIndex >= 0 else -1
+
 
 #
 # Builder for static mesh objects, has a single StaticMeshData
@@ -53,6 +57,16 @@ class StaticMeshDataBuilder:
     def getIndexCount(self):
         return 1
 
+    # Get the data objects rendered for this node
+    def getRenderData(self):
+        return [self.mData]
+
+    # Move the element to new indices (see Builder.orderElements)
+    def remapIndices(self, inMap):
+        self.mData.remapIndices(inMap)
+        self.mIndex = self.mData.getIndex()
+        self.mParentIndex = self.mData.getParentIndex()
+
     # Perform UV layout
     def layoutUVs(self, inBuilder, inNode):
 
@@ -67,8 +81,7 @@ class StaticMeshDataBuilder:
         ucoord, vcoord = inBuilder.getUVCoordinate(self.mData.getIndex())
 
         # Move UVs
-        uvCount = cmds.polyEvaluate(inNode.mNode, uv=True)
-        cmds.polyEditUV('%s.map[0:%i]' % (inNode.mNode, uvCount), r=False, u=ucoord, v=vcoord)
+        inBuilder.getScene().setUVs(inNode.mNode, inBuilder.mView.getAdvancedView().getUVSetName(), None, ucoord, vcoord)
 
     # Render texture data
     def renderTextures(self, inBuilder, inNode):
@@ -77,6 +90,59 @@ class StaticMeshDataBuilder:
             return
 
         for texture in inBuilder.mTextures:
-            for source in [texture.getRGBSource(), texture.getASource()]:
-                renderType = RenderType.fromType(source)
-                renderType.call(self.mData, inBuilder, texture.getData()[self.mData.getIndex()])
+            texture.renderElements([self.mData], inBuilder)
+
+
+#
+# Builder for transforms without geometry when groups are collapsed (see Builder.fillHierarchyInfo),
+# takes up no indices and passes its parent's index and depth on to its children
+#
+class GroupDataBuilder:
+
+    def __init__(self, inNode, inParentIndex, inParentDepth):
+        self.mNode = inNode
+        self.mParentIndex = inParentIndex
+        self.mDepth = inParentDepth
+
+    def getRootIndex(self):
+        return self.mParentIndex
+
+    def getMaxDepth(self):
+        return self.mDepth
+
+    def getIndexCount(self):
+        return 0
+
+    # Get the data objects rendered for this node
+    def getRenderData(self):
+        return [ ]
+
+    # Move the element this node uses to its new index (see Builder.orderElements)
+    def remapIndices(self, inMap):
+        self.mParentIndex = inMap[self.mParentIndex] if self.mParentIndex >= 0 else -1
+
+    # Perform UV layout
+    def layoutUVs(self, inBuilder, inNode):
+        pass
+
+    # Render texture data
+    def renderTextures(self, inBuilder, inNode):
+        pass
+
+
+#
+# Builder for static meshes merged into their parent to meet the element budget (see
+# Builder.reduceHierarchy), takes up no indices and is laid out on its parent's texel
+#
+class MergedDataBuilder(GroupDataBuilder):
+
+    # Perform UV layout
+    def layoutUVs(self, inBuilder, inNode):
+
+        if inNode.mNode is None or len(inNode.mShapes) == 0:
+            return
+
+        inBuilder.tryMakeUVSet(inNode, inBuilder.mView.getAdvancedView().getUVSetName())
+
+        ucoord, vcoord = inBuilder.getUVCoordinate(self.mParentIndex)
+        inBuilder.getScene().setUVs(inNode.mNode, inBuilder.mView.getAdvancedView().getUVSetName(), None, ucoord, vcoord)
@@ -4,9 +4,21 @@
     For license details please check: PivotTool-License.txt
 """
 
+import Queue
+import threading
+import time
 import traceback
-import maya.cmds as cmds
-from ..UI.ProgressTemplate import ProgressTemplate
+
+from ..Scene import Backend
+
+# Number of worker threads runTaskGraph uses for tasks which don't touch Maya
+DefaultWorkers = 2
+
+# Seconds of main thread work between progress updates (and checks for cancellation)
+UIInterval = 0.05
+
+# Error reported for builds cancelled from the progress dialog
+CancelledError = 'Cancelled by user'
 
 
 #
@@ -20,12 +32,37 @@ class Task:
     def run(self, inState):
         pass
 
+    # Run the task a piece at a time, yielding the fraction complete after each piece so the caller
+    # can update the UI (or cancel) in between. Tasks which can't be split run in a single piece.
+    def runChunks(self, inState):
+        self.run(inState)
+        yield 1.0
+
     def getDisplayString(self):
         return 'Default Task'
 
     def getTimeImpact(self):
         return 1.0
 
+    # Name used to group timings of this task
+    def getStageName(self):
+        return self.__class__.__name__
+
+    # Names of the data this task reads, used to order tasks in a graph
+    #   A task which declares no inputs or outputs waits for everything before it (and everything
+    #   after it waits for it), so undeclared tasks keep running in sequence
+    def getInputs(self):
+        return [ ]
+
+    # Names of the data this task writes
+    def getOutputs(self):
+        return [ ]
+
+    # Get whether this task has to run on the main thread, tasks which never touch Maya can run on
+    # worker threads. This can depend on earlier tasks, so answer True when they haven't run yet.
+    def isMayaBound(self):
+        return True
+
 
 #
 # Task processor
@@ -35,12 +72,14 @@ class TaskManager:
     def __init__(self):
         pass
 
-    # Execute the array of input tasks
+    # Execute the array of input tasks, returns True if every task succeeded
+    #   The progress dialog is skipped when inShowProgress is False or the scene backend has no UI,
+    #   if inTimings is given then (stage name, seconds) is appended for each task run
     @staticmethod
-    def runTasks(inTasks, inDisplayName, inState, onSuccess = None, onFail = None):
+    def runTasks(inTasks, inDisplayName, inState, onSuccess = None, onFail = None, inShowProgress = True, inTimings = None):
 
         if len(inTasks) == 0:
-            return
+            return True
 
         # Determine a time scale for progressbar updates
         totalTime = 0.0
@@ -49,37 +88,344 @@ class TaskManager:
         timeScale = 1.0 / totalTime
 
         # Create progress dialog
-        dialog = ProgressTemplate(inDisplayName)
-        dialog.show()
+        dialog = None
+        if inShowProgress and Backend.getBackend().isInteractive():
+            from ..UI.ProgressTemplate import ProgressTemplate
+            dialog = ProgressTemplate(inDisplayName)
+            dialog.show()
 
         progress = 0
         taskNum = 1
 
         for task in inTasks:
             # Update the UI
-            dialog.setProgress(progress)
-            dialog.setDisplayString(task.getDisplayString())
             print '[%i/%i] %s' % (taskNum, len(inTasks), task.getDisplayString())
-            cmds.refresh()
+            if dialog is not None:
+                dialog.setProgress(progress)
+                dialog.setDisplayString(task.getDisplayString())
+                Backend.getBackend().refresh()
 
             # Run!
+            start = time.time()
             try:
                 task.run(inState)
             except:
                 error = traceback.format_exc()
-                dialog.close()
+                if dialog is not None:
+                    dialog.close()
 
                 print error
                 if onFail is not None:
                     onFail(inState, error)
-                return
+                return False
+
+            if inTimings is not None:
+                inTimings.append((task.getStageName(), time.time() - start))
 
             # Update progress
             progress = min(100.0, progress + (task.getTimeImpact() * timeScale * 100.0))
             taskNum = taskNum + 1
 
-        dialog.close()
+        if dialog is not None:
+            dialog.close()
 
         print 'Tasks Complete!'
         if onSuccess is not None:
             onSuccess(inState)
+        return True
+
+    # Execute the array of input tasks as a dependency graph, returns True if every task succeeded
+    #   See TaskGraph, this blocks until the graph is finished (the progress dialog is kept alive
+    #   between chunks of work). Other arguments are as runTasks.
+    @staticmethod
+    def runTaskGraph(inTasks, inDisplayName, inState, onSuccess = None, onFail = None, inShowProgress = True, inTimings = None, inWorkers = None):
+
+        graph = TaskGraph(inTasks, inDisplayName, inState, onSuccess, onFail, inShowProgress, inTimings, inWorkers)
+        graph.start()
+        try:
+            while graph.step(True):
+                pass
+        except:
+            graph.fail(traceback.format_exc())
+        return graph.finish()
+
+    # Execute the array of input tasks as a dependency graph without blocking Maya
+    #   Each chunk of work is queued with maya.utils.executeDeferred, so Maya's event loop runs in
+    #   between. Returns the TaskGraph straight away, onComplete(success) is called once it's finished.
+    @staticmethod
+    def runTaskGraphDeferred(inTasks, inDisplayName, inState, onSuccess = None, onFail = None, inShowProgress = True, inTimings = None, inWorkers = None, onComplete = None):
+        import maya.utils
+
+        graph = TaskGraph(inTasks, inDisplayName, inState, onSuccess, onFail, inShowProgress, inTimings, inWorkers)
+
+        def step():
+            try:
+                if graph.step(False):
+                    maya.utils.executeDeferred(step)
+                    return
+            except:
+                graph.fail(traceback.format_exc())
+
+            success = graph.finish()
+            if onComplete is not None:
+                onComplete(success)
+
+        graph.start()
+        maya.utils.executeDeferred(step)
+        return graph
+
+
+# Get the indices of the tasks each task has to wait for
+#   A task waits for earlier tasks which write what it reads or writes, or read what it writes
+def getDependencies(inTasks):
+
+    dependencies = [ ]
+    for index, task in enumerate(inTasks):
+        inputs = set(task.getInputs())
+        outputs = set(task.getOutputs())
+        isBarrier = len(inputs) == 0 and len(outputs) == 0
+
+        depends = set()
+        for prevIndex in range(index):
+            prev = inTasks[prevIndex]
+            prevOutputs = set(prev.getOutputs())
+            prevInputs = set(prev.getInputs())
+
+            if isBarrier or (len(prevInputs) == 0 and len(prevOutputs) == 0):
+                depends.add(prevIndex)
+            elif len(prevOutputs & (inputs | outputs)) > 0 or len(prevInputs & outputs) > 0:
+                depends.add(prevIndex)
+        dependencies.append(depends)
+
+    return dependencies
+
+
+#
+# Scheduler for a list of tasks with declared inputs and outputs
+#   Maya bound tasks run on the main thread in the order given, while Maya free tasks are handed to
+#   inWorkers threads as soon as their inputs are ready (inWorkers 0 runs everything in order).
+#   Main thread tasks run a chunk at a time (see Task.runChunks) so the progress dialog can update
+#   and be cancelled part way through. The graph is driven by step() until it returns False, then
+#   finish() joins the workers and reports the result. Timings of worker tasks are the time spent
+#   on the worker.
+#
+class TaskGraph:
+
+    def __init__(self, inTasks, inDisplayName, inState, onSuccess = None, onFail = None, inShowProgress = True, inTimings = None, inWorkers = None):
+        self.mTasks = inTasks
+        self.mDisplayName = inDisplayName
+        self.mState = inState
+        self.mOnSuccess = onSuccess
+        self.mOnFail = onFail
+        self.mShowProgress = inShowProgress
+        self.mTimings = inTimings
+        self.mWorkerCount = DefaultWorkers if inWorkers is None else inWorkers
+        self.mDependencies = getDependencies(inTasks)
+
+        # Determine a time scale for progressbar updates
+        totalTime = 0.0
+        for task in inTasks:
+            totalTime = totalTime + max(0.001, task.getTimeImpact())
+        self.mTimeScale = 1.0 / totalTime if totalTime > 0.0 else 0.0
+
+        self.mDialog = None
+        self.mWorkers = [ ]
+        self.mPending = Queue.Queue()
+        self.mFinished = Queue.Queue()
+        self.mStop = threading.Event()
+
+        self.mStarted = set()
+        self.mDone = set()
+        self.mRunning = 0
+        self.mErrors = [ ]
+        self.mCursor = 0
+        self.mProgress = 0.0
+
+        # The main thread task in progress, as (index, chunk generator, fraction complete, seconds so far)
+        self.mActive = None
+
+    # Create the progress dialog and start the workers
+    def start(self):
+
+        if self.mShowProgress and len(self.mTasks) > 0 and Backend.getBackend().isInteractive():
+            from ..UI.ProgressTemplate import ProgressTemplate
+            self.mDialog = ProgressTemplate(self.mDisplayName)
+            self.mDialog.show()
+
+        for i in range(min(self.mWorkerCount, len(self.mTasks))):
+            worker = threading.Thread(target=self._work, name='PivotToolWorker%i' % i)
+            worker.daemon = True
+            worker.start()
+            self.mWorkers.append(worker)
+
+    # Worker loop, pulls task indices from the pending queue and posts back (index, seconds, error)
+    def _work(self):
+        while True:
+            index = self.mPending.get()
+            if index is None:
+                return
+
+            # Once the graph has stopped (something failed) the rest of the queue is skipped
+            if self.mStop.isSet():
+                self.mFinished.put((index, None, None))
+                continue
+
+            start = time.time()
+            try:
+                self.mTasks[index].run(self.mState)
+                self.mFinished.put((index, time.time() - start, None))
+            except:
+                self.mFinished.put((index, time.time() - start, traceback.format_exc()))
+
+    def _isReady(self, inIndex):
+        return inIndex not in self.mStarted and len(self.mDependencies[inIndex] - self.mDone) == 0
+
+    # Record a finished task, inSeconds is None for tasks skipped after a failure
+    def _complete(self, inIndex, inSeconds, inError):
+        self.mProgress = self.mProgress + self.mTasks[inIndex].getTimeImpact() * self.mTimeScale * 100.0
+        if inSeconds is None:
+            return
+        if inError is not None:
+            self.mErrors.append(inError)
+            return
+        self.mDone.add(inIndex)
+        if self.mTimings is not None:
+            self.mTimings.append((self.mTasks[inIndex].getStageName(), inSeconds))
+
+    # Pick up results from the workers, waiting up to inTimeout seconds for the first (None to not wait)
+    def _collect(self, inTimeout):
+        while self.mRunning > 0:
+            try:
+                if inTimeout is None:
+                    index, seconds, error = self.mFinished.get(False)
+                else:
+                    index, seconds, error = self.mFinished.get(True, inTimeout)
+            except Queue.Empty:
+                return
+            self.mRunning = self.mRunning - 1
+            self._complete(index, seconds, error)
+            inTimeout = None
+
+    # Hand every ready Maya free task to the workers
+    def _dispatch(self):
+        if self.mWorkerCount <= 0:
+            return
+
+        for index in range(len(self.mTasks)):
+            if self._isReady(index) and not self.mTasks[index].isMayaBound():
+                print '[%i/%i] %s (worker)' % (index + 1, len(self.mTasks), self.mTasks[index].getDisplayString())
+                self.mStarted.add(index)
+                self.mRunning = self.mRunning + 1
+                self.mPending.put(index)
+
+    # Get whether anything is left for step() to do
+    def isRunning(self):
+        if len(self.mErrors) > 0:
+            return False
+        return self.mActive is not None or self.mRunning > 0 or len(self.mStarted) < len(self.mTasks)
+
+    # Stop the graph with an error, tasks already running on workers are left to finish
+    def fail(self, inError):
+        self.mErrors.append(inError)
+
+    # Stop the graph as cancelled
+    def cancel(self):
+        if CancelledError not in self.mErrors:
+            self.fail(CancelledError)
+
+    # Do up to UIInterval seconds of work, returns True while there's more to do
+    #   inProcessEvents keeps the progress dialog alive when the caller is blocking Maya's event loop
+    def step(self, inProcessEvents = False):
+        deadline = time.time() + UIInterval
+
+        while self.isRunning() and time.time() < deadline:
+            self._collect(None)
+            if not self.isRunning():
+                break
+
+            # Start the next task in line
+            if self.mActive is None:
+                self._dispatch()
+
+                # Skip tasks which are with the workers, or will be once their inputs are ready
+                while self.mCursor < len(self.mTasks) and (self.mCursor in self.mStarted or (self.mWorkerCount > 0 and not self._isReady(self.mCursor) and not self.mTasks[self.mCursor].isMayaBound())):
+                    self.mCursor = self.mCursor + 1
+
+                # Wait for the workers if the next task in line isn't ready yet
+                if self.mCursor >= len(self.mTasks) or not self._isReady(self.mCursor):
+                    if self.mRunning == 0:
+                        raise Exception('Tasks are waiting on tasks which can never run!')
+                    self._collect(max(0.001, deadline - time.time()))
+                    continue
+
+                task = self.mTasks[self.mCursor]
+                print '[%i/%i] %s' % (self.mCursor + 1, len(self.mTasks), task.getDisplayString())
+                if self.mDialog is not None:
+                    self.mDialog.setDisplayString(task.getDisplayString())
+
+                self.mStarted.add(self.mCursor)
+                self.mActive = (self.mCursor, task.runChunks(self.mState), 0.0, 0.0)
+                self.mCursor = self.mCursor + 1
+
+            # Run the next chunk of the active task
+            index, chunks, fraction, seconds = self.mActive
+            start = time.time()
+            try:
+                fraction = next(chunks)
+                self.mActive = (index, chunks, fraction, seconds + (time.time() - start))
+            except StopIteration:
+                self.mActive = None
+                self._complete(index, seconds + (time.time() - start), None)
+            except:
+                self.mActive = None
+                self._complete(index, seconds + (time.time() - start), traceback.format_exc())
+
+        # Update the UI
+        if self.mDialog is not None:
+            progress = self.mProgress
+            if self.mActive is not None:
+                progress = progress + self.mActive[2] * self.mTasks[self.mActive[0]].getTimeImpact() * self.mTimeScale * 100.0
+            self.mDialog.setProgress(min(100.0, progress))
+
+            if inProcessEvents:
+                self.mDialog.processEvents()
+            if self.mDialog.isCancelled():
+                self.cancel()
+
+        return self.isRunning()
+
+    # Wait for the workers and report the result, returns True if every task succeeded
+    def finish(self):
+
+        # Let anything still running on the workers finish, queued tasks are skipped
+        self.mStop.set()
+        try:
+            while self.mRunning > 0:
+                self._collect(UIInterval)
+                if self.mDialog is not None:
+                    self.mDialog.processEvents()
+        finally:
+            for worker in self.mWorkers:
+                self.mPending.put(None)
+            for worker in self.mWorkers:
+                worker.join()
+            self.mWorkers = [ ]
+
+            if self.mActive is not None:
+                self.mActive[1].close()
+                self.mActive = None
+
+            if self.mDialog is not None:
+                self.mDialog.close()
+                self.mDialog = None
+
+        if len(self.mErrors) > 0:
+            print self.mErrors[0]
+            if self.mOnFail is not None:
+                self.mOnFail(self.mState, self.mErrors[0])
+            return False
+
+        print 'Tasks Complete!'
+        if self.mOnSuccess is not None:
+            self.mOnSuccess(self.mState)
+        return True
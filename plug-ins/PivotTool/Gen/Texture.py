@@ -4,8 +4,12 @@
     For license details please check: PivotTool-License.txt
 """
 
+import math
 import os
 import tempfile
+import Atlas
+import Packing
+import RenderFunctions
 from RenderType import *
 from ..Util import LwDDS
 
@@ -28,6 +32,16 @@ class Pixel:
     def setA(self, inA):
         self.mA = inA
 
+    def setChannel(self, inChannel, inValue):
+        if inChannel == 0:
+            self.mR = inValue
+        elif inChannel == 1:
+            self.mG = inValue
+        elif inChannel == 2:
+            self.mB = inValue
+        else:
+            self.mA = inValue
+
     def getA(self):
         return self.mA
 
@@ -40,6 +54,144 @@ class Pixel:
     def getBGRA(self):
         return [ self.mB, self.mG, self.mR, self.mA ]
 
+    def getR(self):
+        return [ self.mR ]
+
+    def getRG(self):
+        return [ self.mR, self.mG ]
+
+    def getAChannel(self):
+        return [ self.mA ]
+
+
+#
+# Block compression an output texture can be written with
+#
+class Compression:
+
+    # Written as is (see getFormat)
+    Uncompressed = 0
+
+    # BC4, a single 8-bit channel holding the alpha of an alpha only texture, 4 bits per texel
+    BC4 = 1
+
+    # BC5, the R and G of an 8-bit vector without an alpha, 8 bits per texel. Shaders reconstruct
+    # B = sqrt(1 - R * R - G * G) after expanding the vector to -1 - 1, which loses the sign of B.
+    BC5 = 2
+
+    Items = [Uncompressed, BC4, BC5]
+
+    # Display names, by compression
+    Names = ['Uncompressed', 'BC4', 'BC5']
+
+
+# Get whether a texture with the given render types can be written with a block compression
+def canCompress(inRGB, inA, inCompression):
+    rgb = RenderType.fromType(inRGB)
+    alpha = RenderType.fromType(inA)
+
+    if inCompression == Compression.BC4:
+        return inRGB == RenderType.NoRender and inA != RenderType.NoRender and not alpha.isHDR()
+    if inCompression == Compression.BC5:
+        return inRGB != RenderType.NoRender and inA == RenderType.NoRender and not rgb.isHDR()
+    return inCompression == Compression.Uncompressed
+
+
+# Get the file name of a texture from its pivot set, render types and UV set
+def getFilename(inRootNode, inRGB, inA, inUVSetName):
+    rgb = RenderType.fromType(inRGB)
+    alpha = RenderType.fromType(inA)
+
+    return '%s_rgb_%s_a_%s_UV_%s.dds' % (inRootNode, rgb.getFilename(), alpha.getFilename(), inUVSetName)
+
+
+# Get the DXGI format a texture with the given render types is written as, for a set with inIndexCount elements
+#   Split parent indices outgrow half floats past RenderFunctions.MaxSplitIndex, those sets get a single
+#   32-bit integer channel instead (which drops the alpha). Compact formats leave out unused channels:
+#   alpha only textures become a single channel (holding the alpha in R), two channel RGB types drop B
+#   and A, and 8-bit RGB types without an alpha get 10 bits per channel in the same space. Block
+#   compression (see canCompress) takes precedence over both.
+def getFormat(inRGB, inA=RenderType.NoRender, inIndexCount=0, inCompact=False, inCompression=Compression.Uncompressed):
+    rgb = RenderType.fromType(inRGB)
+    alpha = RenderType.fromType(inA)
+
+    if inRGB == RenderType.ParentIndexWide and RenderFunctions.needsWideIndices(inIndexCount):
+        return LwDDS.DXGIFormat.R32_UInt
+
+    if inCompression == Compression.BC4 and canCompress(inRGB, inA, inCompression):
+        return LwDDS.DXGIFormat.BC4_UNorm
+    if inCompression == Compression.BC5 and canCompress(inRGB, inA, inCompression):
+        return LwDDS.DXGIFormat.BC5_UNorm
+
+    if inCompact and inRGB == RenderType.NoRender and inA != RenderType.NoRender:
+        return LwDDS.DXGIFormat.R16_Float if alpha.isHDR() else LwDDS.DXGIFormat.R8_UNorm
+    if inCompact and inRGB != RenderType.NoRender and inA == RenderType.NoRender:
+        if RenderType.getChannelCount(inRGB) == 2:
+            return LwDDS.DXGIFormat.R16G16_Float if rgb.isHDR() else LwDDS.DXGIFormat.R8G8_UNorm
+        if not rgb.isHDR():
+            return LwDDS.DXGIFormat.R10G10B10A2_UNorm
+
+    if rgb.isHDR():
+        return LwDDS.DXGIFormat.R16G16B16A16_Float
+    return LwDDS.DXGIFormat.B8G8R8A8_UNorm
+
+
+# Get the DXGI format a packed texture (see Packing.packChannels) is written as
+#   Packed channels are filled from R, so compact formats only have to drop the ones past the last used
+def getPackedFormat(inLayout, inCompact=False):
+    hdr = Packing.getLayoutPrecision(inLayout) == RenderPrecision.FP16
+    used = len([slot for slot in inLayout if slot is not None])
+
+    if inCompact and used == 1:
+        return LwDDS.DXGIFormat.R16_Float if hdr else LwDDS.DXGIFormat.R8_UNorm
+    if inCompact and used == 2:
+        return LwDDS.DXGIFormat.R16G16_Float if hdr else LwDDS.DXGIFormat.R8G8_UNorm
+    return LwDDS.DXGIFormat.R16G16B16A16_Float if hdr else LwDDS.DXGIFormat.B8G8R8A8_UNorm
+
+
+# Get the number of bytes per texel of a texture with the given render types, as written by Texture.write
+#   Block compressed formats take up less than a byte per texel
+def getBytesPerTexel(inRGB, inA=RenderType.NoRender, inIndexCount=0, inCompact=False, inCompression=Compression.Uncompressed):
+    return LwDDS.DXGIFormat.GetSurfaceSize(getFormat(inRGB, inA, inIndexCount, inCompact, inCompression), 4, 4) / 16.0
+
+
+# Measure the error of block compressed texels against the uncompressed 8-bit values
+#   inSource and inDecoded are laid out as LwDDS.BlockEncoder.Encode, only the first inCount texels (the
+#   elements) are measured. Errors are in 8-bit steps. BC5 vectors also report the error of their
+#   reconstructed B against inB, and how many elements had a negative B (which can't be reconstructed).
+def getCompressionReport(inFormat, inSource, inDecoded, inCount, inB=None):
+    channels = LwDDS.BlockEncoder.GetChannelCount(inFormat)
+    count = inCount * channels
+
+    quantized = [LwDDS.SequenceConverter.Clamp(math.floor(c * 255), 0, 255) for c in inSource[0:count]]
+    errors = [abs(value * 255.0 - original) for value, original in zip(inDecoded[0:count], quantized)]
+
+    report = {
+        'format': Compression.Names[Compression.BC4 if inFormat == LwDDS.DXGIFormat.BC4_UNorm else Compression.BC5],
+        'texels': inCount,
+        'maxError': max(errors) if len(errors) > 0 else 0.0,
+        'rmsError': math.sqrt(sum([error * error for error in errors]) / len(errors)) if len(errors) > 0 else 0.0
+    }
+
+    if inB is not None:
+        rebuilt = [ ]
+        for i in range(inCount):
+            x, y = [c * 2.0 - 1.0 for c in inDecoded[i * 2:i * 2 + 2]]
+            rebuilt.append(math.sqrt(max(0.0, 1.0 - x * x - y * y)) * 0.5 + 0.5)
+
+        report['maxReconstructionError'] = max([abs(b - original) * 255.0 for b, original in zip(rebuilt, inB)]) if inCount > 0 else 0.0
+        report['negativeB'] = len([True for original in inB[0:inCount] if original < 0.5])
+
+    return report
+
+
+# Get a one line summary of a compression report
+def formatCompressionReport(inReport):
+    text = '%s error over %i texels: max %.1f/255, RMS %.2f/255' % (inReport['format'], inReport['texels'], inReport['maxError'], inReport['rmsError'])
+    if 'maxReconstructionError' in inReport:
+        text = text + ', reconstructed B max %.1f/255 (%i elements with a negative B)' % (inReport['maxReconstructionError'], inReport['negativeB'])
+    return text
+
 
 #
 # Rendered texture container
@@ -52,6 +204,11 @@ class Texture:
 
         self.mView = inTextureView
         self.mRootView = inRootView
+        self.mIndexCount = 0
+        self.mCompactFormats = False
+        self.mChannels = None
+        self.mCompressionReport = None
+        self.mAtlas = None
 
     def getWidth(self):
         return self.mWidth
@@ -65,29 +222,177 @@ class Texture:
     def getASource(self):
         return self.mView.getA()
 
+    # Get the block compression the texture is written with, one of Compression
+    def getCompression(self):
+        return self.mView.getCompression()
+
     def getData(self):
         return self.mData
 
+    # Set the channel layout of a packed texture (see Packing.packChannels), None for an RGB/alpha texture
+    def setChannels(self, inChannels):
+        self.mChannels = inChannels
+
+    def getChannels(self):
+        return self.mChannels
+
+    # Set the atlas region (see Atlas.AtlasRegion) the texture writes, None for a texture of its own
+    #   Atlas textures only hold the rows of the region, so they're created as wide as the atlas and
+    #   AtlasRegion.getRowCount() high
+    def setAtlas(self, inAtlas):
+        self.mAtlas = inAtlas
+
+    def getAtlas(self):
+        return self.mAtlas
+
+    # Get the render types written to this texture
+    def getSources(self):
+        if self.mChannels is None:
+            return [self.getRGBSource(), self.getASource()]
+        return sorted(set([slot[0] for slot in self.mChannels if slot is not None]))
+
+    # Render a list of elements into their texels
+    #   Packed textures render each type into a scratch pixel and copy its components into their channels
+    def renderElements(self, inElements, inContext):
+        first = self.mAtlas.getFirstTexel() if self.mAtlas is not None else 0
+        for source in self.getSources():
+            renderType = RenderType.fromType(source)
+
+            if self.mChannels is None:
+                for element in inElements:
+                    renderType.call(element, inContext, self.mData[element.getIndex() - first])
+                continue
+
+            slots = [(channel, slot[1]) for channel, slot in enumerate(self.mChannels) if slot is not None and slot[0] == source]
+            for element in inElements:
+                scratch = Pixel()
+                renderType.call(element, inContext, scratch)
+
+                values = scratch.getRGBA()
+                pixel = self.mData[element.getIndex() - first]
+                for channel, component in slots:
+                    pixel.setChannel(channel, values[component])
+
+    # Set the number of elements in the set, the format of index textures depends on it
+    def setIndexCount(self, inIndexCount):
+        self.mIndexCount = inIndexCount
+
+    # Set whether the texture is written in the smallest format which holds its channels
+    def setCompactFormats(self, inCompact):
+        self.mCompactFormats = inCompact
+
+    # Get the DXGI format the texture is written as
+    def getFormat(self):
+        if self.mChannels is not None:
+            return getPackedFormat(self.mChannels, self.mCompactFormats)
+        return getFormat(self.getRGBSource(), self.getASource(), self.mIndexCount, self.mCompactFormats, self.getCompression())
+
+    # Raise if the set has more elements than the index types of this texture can hold
+    def checkIndexLimits(self):
+        for source in self.getSources():
+            RenderType.checkIndexLimit(source, self.mIndexCount)
+
+        if self.getFormat() == LwDDS.DXGIFormat.R32_UInt and self.getASource() != RenderType.NoRender:
+            print 'WARNING: %i elements need 32-bit parent indices, the alpha of %s is dropped' % (self.mIndexCount, os.path.basename(self.getOutputPath()))
+
+    # Raise if the texture's block compression can't hold its render types
+    def checkCompression(self):
+        if not canCompress(self.getRGBSource(), self.getASource(), self.getCompression()):
+            rgb = RenderType.fromType(self.getRGBSource()).getDisplayName()
+            alpha = RenderType.fromType(self.getASource()).getDisplayName()
+            raise Exception("%s can't hold [%s, %s]! BC4 only holds an 8-bit alpha without RGB, and BC5 an 8-bit RGB without alpha." % (Compression.Names[self.getCompression()], rgb, alpha))
+
+    # Get the block compression error report of the last write(), None unless the texture is block compressed
+    def getCompressionReport(self):
+        return self.mCompressionReport
+
+    # Get the number of bytes the texture takes up on the GPU, atlas textures count the whole atlas
+    def getMemorySize(self):
+        if self.mAtlas is not None:
+            return LwDDS.DXGIFormat.GetSurfaceSize(self.getFormat(), self.mAtlas.getWidth(), self.mAtlas.getHeight())
+        return LwDDS.DXGIFormat.GetSurfaceSize(self.getFormat(), self.mWidth, self.mHeight)
+
+    # Get the path this texture is written to, atlas textures are named after the atlas rather than the set
+    def getOutputPath(self):
+        root = self.mAtlas.getName() if self.mAtlas is not None else self.mRootView.getRootNode()
+        name = getFilename(root, self.getRGBSource(), self.getASource(), self.mRootView.getAdvancedView().getUVSetName())
+        return os.path.join(tempfile.gettempdir(), name)
+
+    # Get the path this texture is written to before it's committed
+    def getPendingPath(self):
+        if self.mAtlas is not None:
+            return Atlas.getPendingPath(self.getOutputPath(), self.mAtlas.getSetName())
+        return self.getOutputPath() + '.pending'
+
+    # Write the texture to getPendingPath(), commit() moves it into place
+    #   This doesn't touch the scene (or the view), so it's safe to call from a worker thread
     def write(self):
-        rgb = RenderType.fromType(self.getRGBSource())
-        alpha = RenderType.fromType(self.getASource())
+        format = self.getFormat()
 
         # Get extractor function
-        format = LwDDS.DXGIFormat.B8G8R8A8_UNorm
         func = Pixel.getBGRA
-        if rgb.isHDR():
-            format = LwDDS.DXGIFormat.R16G16B16A16_Float
+        if format in [LwDDS.DXGIFormat.R16G16B16A16_Float, LwDDS.DXGIFormat.R10G10B10A2_UNorm]:
             func = Pixel.getRGBA
+        elif format == LwDDS.DXGIFormat.R32_UInt:
+            func = Pixel.getR
+        elif format in [LwDDS.DXGIFormat.R16G16_Float, LwDDS.DXGIFormat.R8G8_UNorm, LwDDS.DXGIFormat.BC5_UNorm]:
+            func = Pixel.getRG
+        elif format in [LwDDS.DXGIFormat.R16_Float, LwDDS.DXGIFormat.R8_UNorm, LwDDS.DXGIFormat.BC4_UNorm]:
+            func = Pixel.getAChannel if self.mChannels is None else Pixel.getR
 
-        # Build a suitable filename
-        name = '%s_rgb_%s_a_%s_UV_%s.dds' % (self.mRootView.getRootNode(), rgb.getFilename(), alpha.getFilename(), self.mRootView.getAdvancedView().getUVSetName())
-        targetPath = os.path.join(tempfile.gettempdir(), name)
-        self.mView.setOutputPath(targetPath)
+        targetPath = self.getPendingPath()
 
         # Flatten the pixels into a giant float array
-        flat = []
-        for px in self.getData():
-            flat = flat + func(px)
+        flat = [value for px in self.getData() for value in func(px)]
+
+        # Write the texture, block compressed ones report their error against the uncompressed data
+        decoded = LwDDS.WriteTexture2D(targetPath, self.mWidth, self.mHeight, format, 1, flat, LwDDS.DataFormat.Float32)
+
+        self.mCompressionReport = None
+        if decoded is not None:
+            count = min(self.mIndexCount, len(self.mData)) if self.mIndexCount > 0 else len(self.mData)
+            b = [px.getRGB()[2] for px in self.mData[0:count]] if format == LwDDS.DXGIFormat.BC5_UNorm else None
+
+            self.mCompressionReport = getCompressionReport(format, flat, decoded, count, b)
+            print '%s: %s' % (os.path.basename(self.getOutputPath()), formatCompressionReport(self.mCompressionReport))
+
+    # Replace the texture at getOutputPath() with the one written by write()
+    #   Atlas textures only have the set's region replaced (see Atlas.commitRegion)
+    def commit(self):
+        if self.mAtlas is not None:
+            Atlas.commitRegion(self.getPendingPath(), self.getOutputPath(), self.mAtlas)
+            return
+
+        targetPath = self.getOutputPath()
+        if os.path.exists(targetPath):
+            os.remove(targetPath)
+        os.rename(self.getPendingPath(), targetPath)
+
+    # Remove the texture written by write(), if it hasn't been committed
+    def discard(self):
+        if os.path.exists(self.getPendingPath()):
+            os.remove(self.getPendingPath())
+
+
+#
+# Texture holding channels packed from several outputs, see Packing.packChannels
+#
+class PackedTexture(Texture):
+
+    def __init__(self, inWidth, inHeight, inRootView, inIndex, inLayout):
+        Texture.__init__(self, inWidth, inHeight, inRootView, None)
+        self.mIndex = inIndex
+        self.setChannels(inLayout)
+
+    def getRGBSource(self):
+        return RenderType.NoRender
+
+    def getASource(self):
+        return RenderType.NoRender
+
+    def getCompression(self):
+        return Compression.Uncompressed
 
-        # Write the texture
-        LwDDS.WriteTexture2D(targetPath, self.mWidth, self.mHeight, format, 1, flat, LwDDS.DataFormat.Float32)
+    def getOutputPath(self):
+        name = Packing.getPackedFilename(self.mRootView.getRootNode(), self.mIndex, self.mRootView.getAdvancedView().getUVSetName())
+        return os.path.join(tempfile.gettempdir(), name)
@@ -0,0 +1,139 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import os
+
+import Packing
+from ..Util import LwDDS
+
+# NOTE: Nothing in here may import Maya, the render process assembles the texture arrays of its jobs.
+
+
+# Get the file name of the texture array holding a pivot set's textures of one format
+def getArrayFilename(inRootNode, inFormat, inUVSetName):
+    return '%s_array_%s_UV_%s.dds' % (inRootNode, Packing.getFormatName(inFormat), inUVSetName)
+
+
+# Get the file name of the texture array holding the same output across several pivot sets
+def getSetArrayFilename(inOutputName):
+    return 'sets_%s' % inOutputName
+
+
+# Group the textures of a pivot set which share a format
+#   inTextures is a list of (path, format) in output order. Returns a list of (format, paths), one for
+#   each format more than one texture is written in. Textures with a format of their own stay plain files.
+def groupByFormat(inTextures):
+    groups = [ ]
+    for path, format in inTextures:
+        matches = [group for group in groups if group[0] == format]
+        if len(matches) > 0:
+            matches[0][1].append(path)
+        else:
+            groups.append((format, [path]))
+    return [group for group in groups if len(group[1]) > 1]
+
+
+# Get where a texture ended up, (array path, slice) when it's a slice of one of inArrays or (inPath, None)
+def getLocation(inArrays, inPath):
+    for array in inArrays:
+        if inPath in array.getSlices():
+            return (array.getOutputPath(), array.getSlices().index(inPath))
+    return (inPath, None)
+
+
+#
+# Texture array assembled from textures already written to their pending paths (see Texture.write)
+#
+class TextureArray:
+
+    def __init__(self, inPath, inSlices):
+        self.mPath = inPath
+        self.mSlices = inSlices
+
+    # Get the path this array is written to
+    def getOutputPath(self):
+        return self.mPath
+
+    # Get the path this array is written to before it's committed
+    def getPendingPath(self):
+        return self.mPath + '.pending'
+
+    # Get the output paths of the textures making up the array, in slice order
+    def getSlices(self):
+        return self.mSlices
+
+    # Stream the pending texture of each slice into the array, the slices are removed once it's written
+    def write(self):
+        writeArray(self.getPendingPath(), [path + '.pending' for path in self.mSlices])
+
+        for path in self.mSlices:
+            os.remove(path + '.pending')
+
+    # Replace the array at getOutputPath() with the one written by write()
+    def commit(self):
+        if os.path.exists(self.mPath):
+            os.remove(self.mPath)
+        os.rename(self.getPendingPath(), self.mPath)
+
+    # Remove the array written by write() if it wasn't committed
+    def discard(self):
+        if os.path.exists(self.getPendingPath()):
+            os.remove(self.getPendingPath())
+
+
+# Write a texture array from single texture DDS files of the same size and format, one slice at a time
+def writeArray(inPath, inSlicePaths):
+    header = LwDDS.ReadHeader(inSlicePaths[0])
+    writer = LwDDS.TextureArrayWriter(inPath, header['width'], header['height'], header['format'], len(inSlicePaths))
+
+    try:
+        for path in inSlicePaths:
+            writer.CopySlice(path)
+    except:
+        writer.mFile.close()
+        os.remove(inPath)
+        raise
+    writer.Close()
+
+
+# Combine the same output across pivot sets into texture arrays, replacing the textures of each set
+#   inSets is a list of (pivot node, texture paths), all within inOutputDir. Textures are matched by their
+#   name without the pivot node, and only combined when their size and format match. Each array gets an
+#   index (the array's name with .json) listing the set and original texture of every slice. Returns the
+#   paths of the arrays written.
+def combineSets(inSets, inOutputDir):
+    groups = [ ]
+    for node, paths in inSets:
+        for path in paths:
+            name = os.path.basename(path)
+            if not name.startswith(node + '_') or not os.path.exists(path):
+                continue
+
+            header = LwDDS.ReadHeader(path)
+            key = (name[len(node) + 1:], header['width'], header['height'], header['format'])
+            matches = [group for group in groups if group[0] == key]
+            if len(matches) > 0:
+                matches[0][1].append((node, path))
+            else:
+                groups.append((key, [(node, path)]))
+
+    written = [ ]
+    for key, slices in groups:
+        if len(slices) < 2:
+            continue
+
+        path = os.path.join(inOutputDir, getSetArrayFilename(key[0]))
+        writeArray(path, [slice for node, slice in slices])
+
+        with open(os.path.splitext(path)[0] + '.json', 'w') as fp:
+            json.dump({ 'slices': [{ 'set': node, 'file': os.path.basename(slice) } for node, slice in slices] }, fp, indent=4, sort_keys=True)
+
+        for node, slice in slices:
+            os.remove(slice)
+        written.append(path)
+
+    return written
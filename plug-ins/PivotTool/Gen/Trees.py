@@ -4,39 +4,28 @@
     For license details please check: PivotTool-License.txt
 """
 
-import maya.cmds as cmds
-
 
 class TreeNode:
 
-    def __init__(self, inNode):
+    def __init__(self, inNode, inScene):
 
         self.mNode = inNode
+        self.mScene = inScene
         self.mChildren = [ ]
+        self.mMerged = False
 
         if inNode is None:
             return
-        shapes = cmds.listRelatives(self.mNode, c=True, s=True, f=True)
-        if shapes is None:
-            self.mShapes = [ ]
-        else:
-            self.mShapes = shapes
+        self.mShapes = inScene.getShapes(self.mNode)
 
     def discoverNodeChildren(self):
 
         # TODO:? Allow children to be ignored from hierarchy
         #        I'm not really sure if this is necessary, maybe wait for a request?
-        children = cmds.listRelatives(self.mNode, c=True, s=False, f=True)
-        shapes = cmds.listRelatives(self.mNode, c=True, s=True, f=True)
-
-        if shapes is not None and children is not None:
-            children = [c for c in children if c not in shapes]
-
-        if children is None:
-            return
+        children = self.mScene.getChildren(self.mNode)
 
         for child in children:
-            node = TreeNode(child)
+            node = TreeNode(child, self.mScene)
             node.discoverNodeChildren()
             self.mChildren.append(node)
 
@@ -45,12 +34,10 @@ class TreeNode:
     def filterByShape(self, inTypes):
 
         hasTargetType = False
-        newSelf = TreeNode(self.mNode)
+        newSelf = TreeNode(self.mNode, self.mScene)
 
-        shapes = cmds.listRelatives(self.mNode, shapes=True, f=True)
-        shapes = shapes if shapes is not None else []
-        for shape in shapes:
-            hasTargetType = cmds.nodeType(shape) in inTypes or hasTargetType
+        for shape in self.mShapes:
+            hasTargetType = self.mScene.getNodeType(shape) in inTypes or hasTargetType
 
         for c in self.mChildren:
             newChild = c.filterByShape(inTypes)
@@ -65,6 +52,12 @@ class TreeNode:
     def iterate(self, inFn):
         self._iterate(None, inFn)
 
+    # Get the (node, parent) pairs iterate() would visit, in the same order
+    def flatten(self):
+        nodes = [ ]
+        self.iterate(lambda inNode, inParent: nodes.append((inNode, inParent)))
+        return nodes
+
     def _iterate(self, inParent, inFn):
         if self.mNode is not None:
             inFn(self, inParent)
@@ -73,10 +66,10 @@ class TreeNode:
             c._iterate(self, inFn)
 
 
-# Build a hierarchy of TreeNodes from the given node name
-def getMeshHierarchy(inNode):
+# Build a hierarchy of TreeNodes from the given node name (a full path within inScene)
+def getMeshHierarchy(inNode, inScene):
 
-    root = TreeNode(inNode)
+    root = TreeNode(inNode, inScene)
     root.discoverNodeChildren()
 
     return root
@@ -6,10 +6,31 @@
 
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.OpenMayaMPx as mpx
+
+import UI.PivotNodeView as PivotNodeView
 
 MenuItems = [ ]
 
 
+#
+# Command to regenerate every pivot set in the scene, returns the number of sets which failed
+#
+class RegenerateAllCommand(mpx.MPxCommand):
+    Name = 'RegenerateAllPivotSets'
+
+    def __init__(self):
+        mpx.MPxCommand.__init__(self)
+
+    def doIt(self, inArgs):
+        states = PivotNodeView.regenerateAll()
+        mpx.MPxCommand.setResult(len([True for state in states if state.hasFailed()]))
+
+    @staticmethod
+    def Creator():
+        return RegenerateAllCommand()
+
+
 # Handle creation of a pivot set
 def _createPivotSet(*args):
 
@@ -29,6 +50,25 @@ def _createPivotSet(*args):
     cmds.select(inputNode, r=True)
 
 
+# Report the results of regenerating every pivot set
+def _onRegenerateAllComplete(inStates):
+
+    if len([True for state in inStates if state.wasCancelled()]) > 0:
+        print 'Regenerate cancelled, pivot sets have been restored'
+        return
+
+    failed = [state for state in inStates if state.hasFailed()]
+    if len(failed) > 0:
+        message = '\n'.join(["%s failed, see the script editor for details" % state.getView().getRootNode() for state in failed])
+        cmds.confirmDialog(title='Regenerate Errors', message=message, icon='critical')
+    print 'Regenerated %i pivot sets (%i failed)' % (len(inStates), len(failed))
+
+
+# Handle regeneration of every pivot set
+def _regenerateAll(*args):
+    PivotNodeView.regenerateAllDeferred(_onRegenerateAllComplete)
+
+
 # Custom menu implementation
 def registerMenu():
     global MenuItems
@@ -51,6 +91,9 @@ def registerMenu():
         # Functionality to create a pivot set
         MenuItems.append(cmds.menuItem(parent=createMenu, l='Create Pivot Set', c=_createPivotSet))
 
+        # Functionality to rebuild every pivot set in the scene
+        MenuItems.append(cmds.menuItem(parent=createMenu, l='Regenerate All Pivot Sets', c=_regenerateAll))
+
 
 # Clean up custom menus
 def unregisterMenu():
@@ -0,0 +1,20 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+#
+# Names of the plugin node types
+#   Kept apart from PivotNodes so code outside Maya (views, scene backends) can refer to them
+#   without pulling in OpenMaya.
+#
+
+# Primary 'input' node
+PivotNode = 'PivotNode'
+
+# Preview node
+PivotPreviewNode = 'PivotPreviewNode'
+
+# Output node
+PivotOutputNode = 'PivotOutputNode'
@@ -8,6 +8,8 @@ import maya.OpenMaya as OpenMaya
 import maya.OpenMayaMPx as OpenMayaMPx
 import maya.cmds as cmds
 
+import NodeTypes
+
 
 #
 # Simple matrix for a custom node
@@ -40,7 +42,7 @@ class PivotNodeBase(OpenMayaMPx.MPxTransform):
 # Primary 'input' node
 #
 class PivotNode(PivotNodeBase):
-    Name = 'PivotNode'
+    Name = NodeTypes.PivotNode
     ID = OpenMaya.MTypeId(0xCCA1)
 
     OutputNodeAttribute = OpenMaya.MObject()
@@ -80,7 +82,7 @@ class PivotNode(PivotNodeBase):
 # Intermediate output node (not currently used)
 #
 class PivotPreviewNode(PivotNodeBase):
-    Name = 'PivotPreviewNode'
+    Name = NodeTypes.PivotPreviewNode
     ID = OpenMaya.MTypeId(0xCCA2)
 
     InputNodeAttribute = OpenMaya.MObject()
@@ -114,7 +116,7 @@ class PivotPreviewNode(PivotNodeBase):
 # Output node containing collapsed data
 #
 class PivotOutputNode(PivotNodeBase):
-    Name = 'PivotOutputNode'
+    Name = NodeTypes.PivotOutputNode
     ID = OpenMaya.MTypeId(0xCCA3)
 
     InputNodeAttribute = OpenMaya.MObject()
@@ -4,6 +4,9 @@
     For license details please check: PivotTool-License.txt
 """
 
+import maya.cmds as cmds
+
+import Gen.RenderProcess
 import Menu
 import Nodes.PivotNodes
 import UI.CustomEditorTemplate
@@ -18,7 +21,8 @@ Templates = {
 # Custom Commands
 Commands = [
     UI.CustomEditorTemplate.BuildCommand,
-    UI.CustomEditorTemplate.UpdateCommand
+    UI.CustomEditorTemplate.UpdateCommand,
+    Menu.RegenerateAllCommand
 ]
 
 # Custom Transform Nodes
@@ -44,8 +48,9 @@ def onInitialize(inPlugin):
     for node in TransformNodes:
         inPlugin.registerTransform(node[0].Name, node[0].ID, node[0].Creator, node[0].Initialize, node[1].Creator, node[1].ID)
 
-    # Add to build in Maya UIs
-    Menu.registerMenu()
+    # Add to build in Maya UIs (there are none in batch mode)
+    if not cmds.about(batch=True):
+        Menu.registerMenu()
 
 
 # Plugin Shutdown
@@ -61,3 +66,6 @@ def onUninitialize(inPlugin):
 
     # Clean up menus
     Menu.unregisterMenu()
+
+    # Stop the texture render process, if a build started one
+    Gen.RenderProcess.shutdown()
@@ -0,0 +1,260 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import time
+import traceback
+
+from Gen import Packing
+from Gen import RenderJob
+from Gen import SnapshotFile
+from Gen import TextureArray
+from Gen.Texture import Compression, canCompress, getBytesPerTexel, getPackedFormat
+from Gen.RenderType import RenderType
+from Util import LwDDS
+
+# NOTE: Nothing in here may import Maya. Textures are rendered from snapshot files (see
+#       Gen.SnapshotFile) written by a build, or straight from Maya ASCII scenes (see
+#       Scene.MayaAscii), so this runs with any Python 2.7 interpreter.
+
+
+# Get a render type from its name in RenderType (eg. 'PivotPosition') or its number
+def parseRenderType(inText):
+    if inText.isdigit():
+        value = int(inText)
+    elif isinstance(getattr(RenderType, inText, None), int):
+        value = getattr(RenderType, inText)
+    else:
+        raise Exception("Unknown render type '%s'!" % inText)
+
+    if len([item for item in RenderType.Items if item.getType() == value]) == 0:
+        raise Exception("Unknown render type '%s'!" % inText)
+    return value
+
+
+# Get an (RGB, alpha, compression) texture configuration from 'RGB:Alpha' or 'RGB:Alpha:Compression'
+#   The alpha has to suit the RGB's precision, and the compression (eg. BC4) has to suit both
+def parseTexture(inText):
+    parts = inText.split(':')
+    if len(parts) not in [2, 3]:
+        raise Exception("Textures are given as RGB:Alpha or RGB:Alpha:Compression, not '%s'!" % inText)
+
+    rgb = RenderType.fromType(parseRenderType(parts[0]))
+    alpha = RenderType.fromType(parseRenderType(parts[1]))
+    if not rgb.isRGB():
+        raise Exception("'%s' can't be rendered to RGB!" % parts[0])
+    if alpha not in RenderType.getAlphas(rgb.getPrecision()):
+        raise Exception("'%s' can't be rendered to the alpha of a '%s' texture!" % (parts[1], parts[0]))
+
+    compression = Compression.Uncompressed
+    if len(parts) == 3:
+        if parts[2] not in Compression.Names:
+            raise Exception("Unknown compression '%s', expected one of %s!" % (parts[2], ', '.join(Compression.Names)))
+        compression = Compression.Names.index(parts[2])
+    if not canCompress(rgb.getType(), alpha.getType(), compression):
+        raise Exception("%s can't hold '%s:%s'!" % (parts[2], parts[0], parts[1]))
+
+    return (rgb.getType(), alpha.getType(), compression)
+
+
+# Render, write and commit the textures of a single job, returns a report dictionary
+#   The random number generator is reseeded for each set so random values are reproducible. Without
+#   inCommit the textures are left at their pending paths for RenderJob.commitJob.
+def renderJob(inJob, inSeed=0, inCommit=True):
+
+    report = { 'node': inJob['name'], 'worker': os.getpid(), 'success': False, 'error': None, 'textures': [ ], 'compression': { }, 'renderTime': 0.0, 'writeTime': 0.0, 'time': 0.0 }
+
+    start = time.time()
+    try:
+        random.seed(inSeed)
+        result = RenderJob.renderJob(inJob)
+        if inCommit:
+            RenderJob.commitJob(inJob)
+
+        # Textures written into an array are listed as the array
+        arrays = RenderJob.getArrays(inJob)
+        for texture in result['textures']:
+            path = TextureArray.getLocation(arrays, texture['path'])[0]
+            if path not in report['textures']:
+                report['textures'].append(path)
+        report['compression'] = dict([(texture['path'], texture['compression']) for texture in result['textures'] if texture['compression'] is not None])
+        report['renderTime'] = result['renderTime']
+        report['writeTime'] = result['writeTime']
+        report['success'] = True
+    except:
+        report['error'] = traceback.format_exc()
+        discardJob(inJob)
+
+    report['time'] = time.time() - start
+    return report
+
+
+# Remove any textures a job wrote which weren't committed
+def discardJob(inJob):
+    for texture in inJob['textures']:
+        path = RenderJob.getPendingPath(inJob, texture['path'])
+        if os.path.exists(path):
+            os.remove(path)
+    if inJob['manifest'] is not None:
+        RenderJob.getManifest(inJob).discard()
+    for array in RenderJob.getArrays(inJob):
+        array.discard()
+
+
+# Pool entry point, imap only passes a single argument
+def _renderJobArgs(inArgs):
+    return renderJob(*inArgs)
+
+
+# Read the pivot sets of a Maya ASCII scene and create their render jobs, as a build would
+#   Returns (jobs, problems), problems lists anything the reader skipped and the errors of sets which
+#   couldn't be read or built
+def createSceneJobs(inScenePath):
+    from Scene import Backend
+    from Scene import MayaAscii
+    from Gen import BuildOutput
+    from UI import PivotNodeView
+    from Nodes import NodeTypes
+
+    scene, problems = MayaAscii.loadScene(inScenePath)
+
+    Backend.setBackend(scene)
+    try:
+        # A set whose settings can't be read is skipped, rather than failing every set
+        views = [ ]
+        for node in scene.listNodes(NodeTypes.PivotNode):
+            try:
+                view = PivotNodeView.fromNode(node)
+            except Exception as ex:
+                problems.append("%s: Can't read its settings (%s)" % (node, ex))
+                continue
+            if view is not None:
+                views.append(view)
+
+        states = BuildOutput.createRenderJobs(views, False)
+    finally:
+        Backend.setBackend(None)
+
+    problems = problems + ['%s: %s' % (state.getView().getRootNode(), state.mError) for state in states if state.hasFailed()]
+    return ([state.mRenderJob for state in states if not state.hasFailed() and state.mRenderJob is not None], problems)
+
+
+# Get the render jobs of a snapshot, or of a Maya ASCII scene (see createSceneJobs)
+#   Returns (jobs, problems)
+def loadJobs(inPath):
+    if inPath.lower().endswith('.ma'):
+        return createSceneJobs(inPath)
+    if inPath.lower().endswith('.mb'):
+        raise Exception("'%s' is a Maya binary scene, only Maya ASCII scenes can be read without Maya!" % inPath)
+    return (SnapshotFile.read(inPath), [ ])
+
+
+# Render pivot sets into inOutputDir across a pool of worker processes
+#   inPath is a snapshot or a Maya ASCII scene. inTextures replaces the texture configuration saved
+#   with every set (a list of (RGB, alpha, compression)), inSets limits rendering to the named pivot nodes.
+#   With inSetArrays the same output across sets is combined into texture arrays (see
+#   TextureArray.combineSets) once every set is rendered.
+def renderSnapshot(inPath, inOutputDir, inTextures=None, inSets=None, inJobs=None, inSeed=0, inSetArrays=False):
+
+    jobs, problems = loadJobs(inPath)
+    for problem in problems:
+        print 'WARNING: %s' % problem
+
+    if inSets is not None:
+        jobs = [job for job in jobs if job['name'] in inSets]
+
+    if not os.path.isdir(inOutputDir):
+        os.makedirs(inOutputDir)
+
+    # Textures always go to the output directory, with the names a build would give them. Sets in an
+    #   atlas write into the same textures, so they're committed once every set is rendered.
+    jobs = [RenderJob.retargetJob(job, inTextures, os.path.abspath(inOutputDir)) for job in jobs]
+    args = [(job, inSeed, job['atlas'] is None) for job in jobs]
+
+    workers = inJobs if inJobs is not None and inJobs > 0 else multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(args)))
+
+    summary = { 'snapshot': inPath, 'jobs': workers, 'warnings': problems, 'sets': [ ], 'arrays': [ ], 'failed': 0, 'time': 0.0 }
+    if len(args) == 0:
+        return summary
+
+    start = time.time()
+    if workers == 1:
+        reports = [renderJob(*item) for item in args]
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            reports = pool.map(_renderJobArgs, args, 1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    for job, report in zip(jobs, reports):
+        if report['success'] and job['atlas'] is not None:
+            try:
+                RenderJob.commitJob(job)
+            except:
+                report['success'] = False
+                report['error'] = traceback.format_exc()
+                discardJob(job)
+
+    for report in reports:
+        summary['sets'].append(report)
+        print '%s %s (%.2fs, %i textures)' % ('OK  ' if report['success'] else 'FAIL', report['node'], report['time'], len(report['textures']))
+
+    summary['failed'] = len([True for report in summary['sets'] if not report['success']])
+
+    if inSetArrays:
+        summary['arrays'] = TextureArray.combineSets([(report['node'], report['textures']) for report in summary['sets'] if report['success']], os.path.abspath(inOutputDir))
+        for path in summary['arrays']:
+            print 'ARRAY %s' % os.path.basename(path)
+    summary['time'] = time.time() - start
+
+    return summary
+
+
+# List the pivot sets and texture configurations held by a list of render jobs
+def printJobs(inJobs):
+    for job in inJobs:
+        print '%s (%i elements, %ix%i, UV set %s)' % (job['name'], len(job['elements']), job['width'], job['height'], job['uvSet'])
+        for texture in job['textures']:
+            if 'channels' in texture:
+                size = job['width'] * job['height'] * LwDDS.DXGIFormat.GetBytesPerPixel(getPackedFormat(texture['channels'], job['compactFormats']))
+                names = ['%s.%s' % (RenderType.fromType(type).getDisplayName(), Packing.getLayoutChannels(texture['channels'], type)) for type in sorted(set([slot[0] for slot in texture['channels'] if slot is not None]))]
+                print '    Packed: %s (%.2fMB)' % (', '.join(names), size / (1024.0 * 1024.0))
+                continue
+
+            compression = texture.get('compression', Compression.Uncompressed)
+            size = job['width'] * job['height'] * getBytesPerTexel(texture['rgb'], texture['a'], len(job['elements']), job['compactFormats'], compression)
+            print '    %s : %s%s (%.2fMB)' % (RenderType.fromType(texture['rgb']).getDisplayName(), RenderType.fromType(texture['a']).getDisplayName(), ', ' + Compression.Names[compression] if compression != Compression.Uncompressed else '', size / (1024.0 * 1024.0))
+
+        for array in job['arrays']:
+            print '    Array: %s (%i slices)' % (os.path.basename(array['path']), len(array['slices']))
+        if job['atlas'] is not None:
+            print '    Atlas: %s (elements %i-%i)' % (job['atlas']['name'], job['atlas']['offset'], job['atlas']['offset'] + job['atlas']['count'] - 1)
+
+
+# Dump a render summary as JSON
+def writeReport(inPath, inSummary):
+    with open(inPath, 'w') as fp:
+        json.dump(inSummary, fp, indent=4)
+
+
+# Print a readable breakdown of failures in a render summary
+def printSummary(inSummary):
+    print '------------------------'
+    print 'Sets: %i, Failed: %i, Workers: %i, Time: %.2fs' % (len(inSummary['sets']), inSummary['failed'], inSummary['jobs'], inSummary['time'])
+
+    for report in inSummary['sets']:
+        if report['error'] is not None:
+            print '%s\n%s' % (report['node'], report['error'])
+    print '------------------------'
@@ -0,0 +1,228 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+from CmdsBackend import CmdsBackend
+from ..Gen import Skeleton
+
+
+#
+# Scene backend which reads from a bulk OpenMaya 2.0 snapshot
+#   All DAG, transform, bounds and skin data for the union of several hierarchies is pulled in a
+#   single pass by extract(), so multiple pivot sets (or several render types on the same node)
+#   never query Maya for the same thing twice. Nodes are keyed by their full DAG path. Edits and
+#   node/attribute access go through CmdsBackend.
+#
+class ApiBackend(CmdsBackend):
+
+    def __init__(self):
+        CmdsBackend.__init__(self)
+
+        self.mFullPaths = { }
+        self.mTypes = { }
+        self.mChildren = { }
+        self.mShapes = { }
+        self.mWorldMatrices = { }
+        self.mWorldPivots = { }
+        self.mWorldBounds = { }
+        self.mLocalBounds = { }
+        self.mSkinClusters = { }
+        self.mInfluences = { }
+        self.mPrimaryInfluences = { }
+        self.mMatrixPlugs = { }
+        self.mDetached = False
+
+    # Extract the hierarchies beneath inRoots (inclusive) along with any skeletons bound to them
+    def extract(self, inRoots):
+        snapshot = ApiBackend()
+        snapshot.mDetached = True
+
+        for root in inRoots:
+            path = snapshot._getDagPath(root)
+            snapshot.mFullPaths[root] = path.fullPathName()
+            snapshot._extractHierarchy(path)
+
+        # Skeletons can live anywhere in the scene, pull in the hierarchy the influences share
+        for cluster in list(set(snapshot.mSkinClusters.values())):
+            base = Skeleton.findCommonBase(snapshot.mInfluences[cluster])
+            if base is None:
+                raise Exception("Influences of '%s' don't share a common root!" % cluster)
+
+            if base not in snapshot.mTypes:
+                snapshot._extractHierarchy(snapshot._getDagPath(base))
+
+        return snapshot
+
+    def isDetached(self):
+        return self.mDetached
+
+    def _getDagPath(self, inNode):
+        selection = om.MSelectionList()
+        selection.add(inNode)
+        return selection.getDagPath(0)
+
+    # Depth first walk over a DAG path, recording everything the build stages need
+    def _extractHierarchy(self, inPath):
+
+        name = inPath.fullPathName()
+        node = inPath.node()
+        self.mTypes[name] = om.MFnDependencyNode(node).typeName
+
+        if node.hasFn(om.MFn.kShape):
+            return
+
+        children = [ ]
+        shapes = [ ]
+        for i in range(inPath.childCount()):
+            childPath = om.MDagPath(inPath)
+            childPath.push(inPath.child(i))
+
+            if childPath.node().hasFn(om.MFn.kShape):
+                shapes.append(childPath.fullPathName())
+            else:
+                children.append(childPath.fullPathName())
+
+            self._extractHierarchy(childPath)
+
+        self.mChildren[name] = children
+        self.mShapes[name] = shapes
+
+        if node.hasFn(om.MFn.kTransform):
+            matrix = inPath.inclusiveMatrix()
+            pivot = om.MFnTransform(inPath).rotatePivot(om.MSpace.kWorld)
+
+            self.mWorldMatrices[name] = [matrix[i] for i in range(16)]
+            self.mWorldPivots[name] = [pivot.x, pivot.y, pivot.z]
+
+            # JB: The API bounding boxes are in parent space rather than the spaces xform reports,
+            #     so stick with xform to keep the rendered values identical
+            self.mWorldBounds[name] = cmds.xform(name, q=True, ws=True, bb=True)
+            self.mLocalBounds[name] = cmds.xform(name, q=True, bb=True)
+
+        if len([True for shape in shapes if self.mTypes[shape] == 'mesh']) > 0:
+            self._extractSkin(name, inPath)
+
+    # Find the skin cluster driving a mesh and resolve the primary influence of each UV
+    def _extractSkin(self, inName, inPath):
+
+        inputs = cmds.listConnections('%s.inMesh' % inName, d=False, s=True)
+        clusters = [node for node in inputs if cmds.nodeType(node) == 'skinCluster'] if inputs is not None else [ ]
+        if len(clusters) == 0:
+            return
+
+        cluster = clusters[0]
+        self.mSkinClusters[inName] = cluster
+
+        selection = om.MSelectionList()
+        selection.add(cluster)
+        skin = oma.MFnSkinCluster(selection.getDependNode(0))
+
+        if cluster not in self.mInfluences:
+            self.mInfluences[cluster] = [path.fullPathName() for path in skin.influenceObjects()]
+
+        shapePath = om.MDagPath(inPath)
+        shapePath.extendToShape()
+        mesh = om.MFnMesh(shapePath)
+
+        # Map UVs back to the vertex which owns them
+        uvSet = mesh.currentUVSetName()
+        uvCounts, uvIds = mesh.getAssignedUVs(uvSet)
+        vertexCounts, vertexIds = mesh.getVertices()
+        uvToVertex = [0] * mesh.numUVs(uvSet)
+
+        uvOffset = 0
+        vertexOffset = 0
+        for face in range(len(vertexCounts)):
+            count = vertexCounts[face]
+            if uvCounts[face] == count:
+                for i in range(count):
+                    uvToVertex[uvIds[uvOffset + i]] = vertexIds[vertexOffset + i]
+            uvOffset = uvOffset + uvCounts[face]
+            vertexOffset = vertexOffset + count
+
+        # Grab every vertex weight in one call, then pick the strongest influence per vertex
+        components = om.MFnSingleIndexedComponent()
+        componentsObj = components.create(om.MFn.kMeshVertComponent)
+        components.setCompleteData(mesh.numVertices)
+
+        weights, influenceCount = skin.getWeights(shapePath, componentsObj)
+        weights = list(weights)
+
+        primary = [ ]
+        for vertex in range(mesh.numVertices):
+            vertexWeights = weights[vertex * influenceCount:(vertex + 1) * influenceCount]
+            primary.append(vertexWeights.index(max(vertexWeights)))
+
+        self.mPrimaryInfluences[inName] = [primary[vertex] for vertex in uvToVertex]
+
+    def _get(self, inTable, inNode):
+        if inNode not in inTable:
+            raise Exception("'%s' wasn't captured by the scene snapshot!" % inNode)
+        return inTable[inNode]
+
+    def getFullPath(self, inNode):
+        return self._get(self.mFullPaths, inNode)
+
+    def getNodeType(self, inNode):
+        if inNode in self.mTypes:
+            return self.mTypes[inNode]
+        return CmdsBackend.getNodeType(self, inNode)
+
+    def getChildren(self, inNode):
+        return self._get(self.mChildren, inNode)
+
+    def getShapes(self, inNode):
+        return self._get(self.mShapes, inNode)
+
+    def getWorldMatrix(self, inNode):
+        return self._get(self.mWorldMatrices, inNode)
+
+    def getWorldPivot(self, inNode):
+        return self._get(self.mWorldPivots, inNode)
+
+    def getWorldBounds(self, inNode):
+        return self._get(self.mWorldBounds, inNode)
+
+    def getLocalBounds(self, inNode):
+        return self._get(self.mLocalBounds, inNode)
+
+    def getSkinCluster(self, inNode):
+        return self.mSkinClusters.get(inNode, None)
+
+    def getInfluences(self, inSkinCluster):
+        return self._get(self.mInfluences, inSkinCluster)
+
+    def getPrimaryInfluences(self, inNode):
+        return self._get(self.mPrimaryInfluences, inNode)
+
+    # Evaluate the world matrix plugs of every node in a single MDGContext for inFrame
+    #   Plugs are looked up the first time a node is read and kept, so each frame only evaluates and
+    #   copies the matrices. Reads come from the live scene, even on a detached snapshot.
+    def getWorldMatricesAt(self, inNodes, inFrame, outMatrices):
+
+        plugs = [ ]
+        for node in inNodes:
+            if node not in self.mMatrixPlugs:
+                path = self._getDagPath(node)
+                plug = om.MFnDagNode(path).findPlug('worldMatrix', False)
+                self.mMatrixPlugs[node] = plug.elementByLogicalIndex(path.instanceNumber())
+            plugs.append(self.mMatrixPlugs[node])
+
+        # Maya 2019 deprecates passing a context to each read in favour of making it current
+        context = om.MDGContext(om.MTime(inFrame, om.MTime.uiUnit()))
+        previous = context.makeCurrent() if hasattr(context, 'makeCurrent') else None
+        try:
+            for i, plug in enumerate(plugs):
+                value = plug.asMObject() if previous is not None else plug.asMObject(context)
+                matrix = om.MFnMatrixData(value).matrix()
+                for j in range(16):
+                    outMatrices[i * 16 + j] = matrix[j]
+        finally:
+            if previous is not None:
+                previous.makeCurrent()
@@ -0,0 +1,201 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+# The backend used by the build pipeline and views, created on demand (see getBackend)
+ActiveBackend = None
+
+
+#
+# Interface for everything the pivot tool reads from, or writes to, a scene
+#   Nodes are passed around by name; the query functions return full DAG paths. Implementations
+#   live in CmdsBackend (live maya.cmds queries), ApiBackend (bulk OpenMaya 2.0 snapshot) and
+#   MemoryBackend (pure Python scene graph, no Maya required, read through a SceneSnapshot).
+#
+class SceneBackend:
+
+    def __init__(self):
+        pass
+
+    def _notImplemented(self, inName):
+        raise Exception("'%s' isn't implemented by %s" % (inName, self.__class__.__name__))
+
+    #
+    # Session
+    #
+
+    # Get whether there is a UI to update
+    def isInteractive(self):
+        return False
+
+    # Redraw the UI
+    def refresh(self):
+        pass
+
+    # Suspend undo (if requested) and viewport updates, returns a token for resume()
+    def suspend(self, inUndo):
+        return None
+
+    # Restore the state captured by suspend()
+    def resume(self, inToken):
+        pass
+
+    # Get the current selection
+    def getSelection(self):
+        return [ ]
+
+    # Replace the current selection
+    def setSelection(self, inNodes):
+        pass
+
+    #
+    # Nodes and attributes
+    #
+
+    # Get whether a node exists
+    def objectExists(self, inNode):
+        self._notImplemented('objectExists')
+
+    # Get the type name of a node
+    def getNodeType(self, inNode):
+        self._notImplemented('getNodeType')
+
+    # Get all nodes of a given type
+    def listNodes(self, inType):
+        self._notImplemented('listNodes')
+
+    # Get the value of an attribute
+    def getAttr(self, inNode, inAttr):
+        self._notImplemented('getAttr')
+
+    # Set the value of an attribute (strings are stored as string attributes)
+    def setAttr(self, inNode, inAttr, inValue):
+        self._notImplemented('setAttr')
+
+    # Get the nodes connected to an attribute
+    def getConnections(self, inNode, inAttr):
+        self._notImplemented('getConnections')
+
+    #
+    # Hierarchy, transforms, bounds and skinning
+    #
+
+    # Prepare the hierarchies beneath inRoots for reading, returns the backend to read them from
+    def extract(self, inRoots):
+        return self
+
+    # Get whether reads are served from data captured by extract() rather than the live scene
+    #   Detached reads never touch Maya, so they're safe to make from worker threads
+    def isDetached(self):
+        return False
+
+    # Get the full path of a node
+    def getFullPath(self, inNode):
+        self._notImplemented('getFullPath')
+
+    # Get the non-shape children of a node
+    def getChildren(self, inNode):
+        self._notImplemented('getChildren')
+
+    # Get the shapes beneath a node
+    def getShapes(self, inNode):
+        self._notImplemented('getShapes')
+
+    # Get the world matrix of a node (as xform -q -ws -m)
+    def getWorldMatrix(self, inNode):
+        self._notImplemented('getWorldMatrix')
+
+    # Get the world space rotate pivot of a node (as xform -q -ws -rp)
+    def getWorldPivot(self, inNode):
+        self._notImplemented('getWorldPivot')
+
+    # Get the world space bounding box of a node (as xform -q -ws -bb)
+    def getWorldBounds(self, inNode):
+        self._notImplemented('getWorldBounds')
+
+    # Get the object space bounding box of a node (as xform -q -bb)
+    def getLocalBounds(self, inNode):
+        self._notImplemented('getLocalBounds')
+
+    # Get the skin cluster driving a mesh (or None)
+    def getSkinCluster(self, inNode):
+        self._notImplemented('getSkinCluster')
+
+    # Get the full paths to the influences of a skin cluster
+    def getInfluences(self, inSkinCluster):
+        self._notImplemented('getInfluences')
+
+    # Get the index of the strongest influence for each UV of a skinned mesh
+    def getPrimaryInfluences(self, inNode):
+        self._notImplemented('getPrimaryInfluences')
+
+    #
+    # Animation, read from the live scene (detached reads only hold the current frame)
+    #
+
+    # Get the (start, end) frames of the playback range
+    def getPlaybackRange(self):
+        self._notImplemented('getPlaybackRange')
+
+    # Read the world matrices of inNodes at inFrame into outMatrices, 16 values per node as getWorldMatrix
+    #   outMatrices is allocated by the caller and filled in place, so sampling a long frame range
+    #   doesn't allocate anything per frame. The scene's current time isn't changed.
+    def getWorldMatricesAt(self, inNodes, inFrame, outMatrices):
+        self._notImplemented('getWorldMatricesAt')
+
+    #
+    # Edits
+    #
+
+    # Delete every child of a node
+    def deleteChildren(self, inNode):
+        self._notImplemented('deleteChildren')
+
+    # Move the children of a node aside (hidden and renamed, so their names are free for a rebuild)
+    #   Returns a token for restoreChildren or discardStash, None if there were no children
+    def stashChildren(self, inNode):
+        self._notImplemented('stashChildren')
+
+    # Replace the children of a node with the ones moved aside by stashChildren
+    def restoreChildren(self, inNode, inToken):
+        self._notImplemented('restoreChildren')
+
+    # Delete the children moved aside by stashChildren
+    def discardStash(self, inToken):
+        self._notImplemented('discardStash')
+
+    # Duplicate the children of inSource (and their inputs) beneath inTarget
+    def duplicateChildren(self, inSource, inTarget):
+        self._notImplemented('duplicateChildren')
+
+    # Create a UV set (if necessary) and fill it with a copy of the first UV set
+    def ensureUVSet(self, inNode, inUVSet):
+        self._notImplemented('ensureUVSet')
+
+    # Move UVs to a single coordinate, inUVs is a list of UV indices or None for every UV
+    def setUVs(self, inNode, inUVSet, inUVs, inU, inV):
+        self._notImplemented('setUVs')
+
+    # Merge the mesh children of a node into a single mesh called inName (if given), returns its name
+    #   The merged mesh is linked from inNode.outputMesh and any other children are removed
+    def combineChildren(self, inNode, inName):
+        self._notImplemented('combineChildren')
+
+
+# Get the active scene backend, inside Maya this defaults to the OpenMaya 2.0 backend
+def getBackend():
+    global ActiveBackend
+
+    if ActiveBackend is None:
+        from ApiBackend import ApiBackend
+        ActiveBackend = ApiBackend()
+
+    return ActiveBackend
+
+
+# Replace the active scene backend
+def setBackend(inBackend):
+    global ActiveBackend
+    ActiveBackend = inBackend
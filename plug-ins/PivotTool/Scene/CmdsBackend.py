@@ -0,0 +1,283 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import maya.cmds as cmds
+
+from Backend import SceneBackend
+from ..Nodes import NodeTypes
+
+
+#
+# Scene backend which talks to Maya through maya.cmds
+#   Every query goes straight to the scene, which makes it slow for big hierarchies but means
+#   it's always up to date. ApiBackend builds on this for the edits and replaces the queries.
+#
+class CmdsBackend(SceneBackend):
+
+    def __init__(self):
+        SceneBackend.__init__(self)
+
+    #
+    # Session
+    #
+
+    def isInteractive(self):
+        return not cmds.about(batch=True)
+
+    def refresh(self):
+        cmds.refresh()
+
+    def suspend(self, inUndo):
+        token = (inUndo, cmds.undoInfo(q=True, state=True))
+
+        if inUndo:
+            cmds.undoInfo(state=False)
+        if self.isInteractive():
+            cmds.refresh(suspend=True)
+
+        return token
+
+    def resume(self, inToken):
+        if self.isInteractive():
+            cmds.refresh(suspend=False)
+        if inToken[0]:
+            cmds.undoInfo(state=inToken[1])
+
+    def getSelection(self):
+        selection = cmds.ls(sl=True)
+        return selection if selection is not None else [ ]
+
+    def setSelection(self, inNodes):
+        cmds.select(inNodes, r=True)
+
+    #
+    # Nodes and attributes
+    #
+
+    def objectExists(self, inNode):
+        return inNode is not None and cmds.objExists(inNode)
+
+    def getNodeType(self, inNode):
+        return cmds.nodeType(inNode)
+
+    def listNodes(self, inType):
+        nodes = cmds.ls(type=inType)
+        return nodes if nodes is not None else [ ]
+
+    def getAttr(self, inNode, inAttr):
+        return cmds.getAttr('%s.%s' % (inNode, inAttr))
+
+    def setAttr(self, inNode, inAttr, inValue):
+        if isinstance(inValue, basestring):
+            cmds.setAttr('%s.%s' % (inNode, inAttr), inValue, type='string')
+        else:
+            cmds.setAttr('%s.%s' % (inNode, inAttr), inValue)
+
+    def getConnections(self, inNode, inAttr):
+        connections = cmds.listConnections('%s.%s' % (inNode, inAttr))
+        return connections if connections is not None else [ ]
+
+    #
+    # Hierarchy, transforms, bounds and skinning
+    #
+
+    def getFullPath(self, inNode):
+        return cmds.ls(inNode, l=True)[0]
+
+    def getChildren(self, inNode):
+        children = cmds.listRelatives(inNode, c=True, s=False, f=True)
+        shapes = cmds.listRelatives(inNode, c=True, s=True, f=True)
+
+        if children is None:
+            return [ ]
+        if shapes is not None:
+            children = [c for c in children if c not in shapes]
+        return children
+
+    def getShapes(self, inNode):
+        shapes = cmds.listRelatives(inNode, c=True, s=True, f=True)
+        return shapes if shapes is not None else [ ]
+
+    def getWorldMatrix(self, inNode):
+        return cmds.xform(inNode, q=True, ws=True, m=True)
+
+    def getWorldPivot(self, inNode):
+        return cmds.xform(inNode, q=True, ws=True, rp=True)
+
+    def getWorldBounds(self, inNode):
+        return cmds.xform(inNode, q=True, ws=True, bb=True)
+
+    def getLocalBounds(self, inNode):
+        return cmds.xform(inNode, q=True, bb=True)
+
+    def getSkinCluster(self, inNode):
+
+        shapes = cmds.listRelatives(inNode, s=True, typ='mesh')
+        if shapes is None or len(shapes) == 0:
+            return None
+
+        inputs = cmds.listConnections('%s.inMesh' % inNode, d=False, s=True)
+        if inputs is None:
+            return None
+
+        clusters = [node for node in inputs if cmds.nodeType(node) == 'skinCluster']
+        return clusters[0] if len(clusters) > 0 else None
+
+    def getInfluences(self, inSkinCluster):
+        return [self.getFullPath(node) for node in cmds.skinCluster(inSkinCluster, q=True, inf=True)]
+
+    def getPrimaryInfluences(self, inNode):
+
+        skinCluster = self.getSkinCluster(inNode)
+
+        primary = [ ]
+        for uv in range(0, cmds.polyEvaluate(inNode, uv=True)):
+            weights = cmds.skinPercent(skinCluster, '%s.map[%i]' % (inNode, uv), q=True, v=True)
+            primary.append(weights.index(max(weights)))
+
+        return primary
+
+    #
+    # Animation
+    #
+
+    def getPlaybackRange(self):
+        return (cmds.playbackOptions(q=True, min=True), cmds.playbackOptions(q=True, max=True))
+
+    # Each node is evaluated at inFrame on its own, ApiBackend reads them all from one context
+    def getWorldMatricesAt(self, inNodes, inFrame, outMatrices):
+        for i, node in enumerate(inNodes):
+            matrix = cmds.getAttr('%s.worldMatrix' % node, time=inFrame)
+            for j in range(16):
+                outMatrices[i * 16 + j] = matrix[j]
+
+    #
+    # Edits
+    #
+
+    def deleteChildren(self, inNode):
+        children = cmds.listRelatives(inNode, f=True)
+        if children is not None:
+            for child in children:
+                cmds.delete(child)
+
+    def stashChildren(self, inNode):
+        children = cmds.listRelatives(inNode, f=True)
+        if children is None:
+            return None
+
+        stash = cmds.createNode('transform', n='pivotToolStash#', ss=True)
+        cmds.setAttr('%s.visibility' % stash, False)
+
+        names = [child.split('|')[-1] for child in children]
+        cmds.parent(children, stash)
+        for child, name in zip(cmds.listRelatives(stash, f=True), names):
+            cmds.rename(child, '%sStash' % name)
+
+        return (stash, names)
+
+    def restoreChildren(self, inNode, inToken):
+        self.deleteChildren(inNode)
+        if inToken is None:
+            return
+
+        stash, names = inToken
+        for child, name in zip(cmds.listRelatives(stash, f=True), names):
+            name = cmds.rename(child, name)
+            cmds.parent('%s|%s' % (stash, name.split('|')[-1]), inNode)
+        cmds.delete(stash)
+
+    def discardStash(self, inToken):
+        if inToken is not None and cmds.objExists(inToken[0]):
+            cmds.delete(inToken[0])
+
+    def duplicateChildren(self, inSource, inTarget):
+
+        # JB: duplicate -un copies the root nodes, which is annoying
+        existingNodes = cmds.ls(type=NodeTypes.PivotNode)
+
+        children = cmds.listRelatives(inSource, f=True)
+        children = cmds.duplicate(children, un=True, rr=True, rc=True)
+        children = cmds.parent(children, inTarget)
+
+        # Clean up the extra nodes
+        newNodes = list(set(cmds.ls(type=NodeTypes.PivotNode)) - set(existingNodes))
+        if newNodes is not None and len(newNodes) > 0:
+            cmds.delete(newNodes)
+
+    def ensureUVSet(self, inNode, inUVSet):
+
+        sets = cmds.polyUVSet(inNode, q=True, auv=True)
+
+        # We need a source UV set to copy from
+        if sets is None:
+            raise Exception('%s has no sets' % inNode)
+
+        if inUVSet not in sets:
+            cmds.polyUVSet(inNode, create=True, uvSet=inUVSet)
+
+        cmds.polyCopyUV(inNode, uvi=sets[0], uvs=inUVSet)
+
+    def setUVs(self, inNode, inUVSet, inUVs, inU, inV):
+
+        if inUVs is None:
+            uvCount = cmds.polyEvaluate(inNode, uv=True)
+            cmds.polyEditUV('%s.map[0:%i]' % (inNode, uvCount), r=False, u=inU, v=inV, uvSetName=inUVSet)
+        else:
+            cmds.polyEditUV(['%s.map[%i]' % (inNode, uv) for uv in inUVs], r=False, u=inU, v=inV, uvSetName=inUVSet)
+
+    def _canMerge(self, inNodeName):
+        if cmds.objectType(inNodeName) == 'mesh':
+            return True
+
+        shapes = cmds.listRelatives(inNodeName, s=True, typ='mesh')
+        if shapes is not None and len(shapes) > 0:
+            return True
+
+        return False
+
+    def combineChildren(self, inNode, inName):
+
+        # Merge all child meshes under the output mode
+        children = cmds.listRelatives(inNode, f=True)
+        children = [child for child in children if self._canMerge(child)]
+        united = children
+
+        if len(children) > 0:
+            try:
+                # You could have a single object which is a root of many child objects
+                # I could check for that...
+                united = cmds.polyUnite(children, ch=True, mergeUVSets=True, centerPivot=True)
+            except:
+                pass
+
+        # Clean the construction history
+        cmds.select(united[0], r=True)
+        cmds.delete(ch=True)
+
+        # Ensure the output is correctly parented
+        finalName = united[0]
+        try:
+            finalName = cmds.parent(united[0], inNode)[0]
+        except:
+            pass
+
+        # Add a link from the output node so we can track it in the future
+        cmds.addAttr(ln='pivotParent', at='message')
+        cmds.connectAttr('%s.outputMesh' % inNode, '%s.pivotParent' % finalName)
+
+        # If there is an output name then use it since polySurfaceN is boring!
+        if inName is not None:
+            finalName = cmds.rename(finalName, inName.split('|')[-1])
+
+        # Filter out any non-merged nodes
+        # These could be joints, lights or anything else attached to the objects
+        children = cmds.listRelatives(inNode, f=True)
+        children = [child for child in children if child.split('|')[-1] != finalName.split('|')[-1]]
+        for child in children:
+            cmds.delete(child)
+
+        return finalName
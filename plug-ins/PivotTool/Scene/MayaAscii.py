@@ -0,0 +1,416 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import re
+
+from MemoryBackend import MemoryBackend
+from ..Nodes import NodeTypes
+from ..Util import Matrix
+
+# NOTE: Nothing in here may import Maya, the point is to read pivot sets without launching it.
+
+# MEL tokens: quoted strings, statement ends and bare words (flags, numbers, names)
+Tokens = re.compile(r'"(?:[^"\\]|\\.)*"|;|[^\s;"]+')
+
+# MEL string escapes
+Escapes = { 'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\' }
+
+# Node types treated as transforms even when they sit at the root of the scene
+TransformTypes = ['transform', 'joint', NodeTypes.PivotNode, NodeTypes.PivotOutputNode, NodeTypes.PivotPreviewNode]
+
+# Number of arguments taken by the setAttr flags which take any (others take none)
+SetAttrFlags = { '-s': 1, '-size': 1, '-type': 1, '-k': 1, '-keyable': 1, '-l': 1, '-lock': 1, '-cb': 1, '-channelBox': 1, '-ch': 1, '-caching': 1 }
+
+# Transform attributes, short name -> (MemoryNode field, component or None for all three)
+TransformAttributes = {
+    't': ('translate', None), 'tx': ('translate', 0), 'ty': ('translate', 1), 'tz': ('translate', 2),
+    'r': ('rotate', None), 'rx': ('rotate', 0), 'ry': ('rotate', 1), 'rz': ('rotate', 2),
+    's': ('scale', None), 'sx': ('scale', 0), 'sy': ('scale', 1), 'sz': ('scale', 2),
+    'jo': ('jointOrient', None), 'jox': ('jointOrient', 0), 'joy': ('jointOrient', 1), 'joz': ('jointOrient', 2),
+    'rp': ('rotatePivot', None), 'sp': ('scalePivot', None),
+    'rpt': ('rotatePivotTranslate', None), 'spt': ('scalePivotTranslate', None)
+}
+
+# Plugin and skinning attributes .ma files use short names for, short name -> name used by the backends
+ConnectionAttributes = {
+    'opvn': 'outputPivotNode', 'ppvn': 'previewPivotNode', 'ipvn': 'inputPivotNode', 'popm': 'outputMesh',
+    'msg': 'message', 'wm': 'worldMatrix', 'ma': 'matrix', 'og': 'outputGeometry', 'i': 'inMesh', 'ip': 'input'
+}
+
+# Attributes connecting pivot nodes together (and to their output mesh)
+PivotAttributes = ['outputPivotNode', 'previewPivotNode', 'inputPivotNode', 'outputMesh']
+
+
+#
+# Quoted MEL string, kept apart from bare words
+#
+class MelString(unicode):
+    pass
+
+
+#
+# A node read from the scene file
+#
+class AsciiNode:
+
+    def __init__(self, inName, inType, inParent):
+        self.mName = inName
+        self.mType = inType
+        self.mParent = inParent
+        self.mChildren = [ ]
+        self.mAttributes = { }
+        self.mTransform = { }
+        self.mRotateOrder = 0
+        self.mUnderPivot = inParent is not None and (inParent.mType == NodeTypes.PivotNode or inParent.mUnderPivot)
+
+        # Mesh data, only kept for meshes beneath a PivotNode
+        self.mPoints = { }
+        self.mTweaks = { }
+        self.mUVSets = { }
+        self.mIntermediate = False
+
+        # Skin cluster influences, by index
+        self.mInfluences = { }
+
+        # Name of the node in the MemoryBackend
+        self.mSceneName = None
+
+    def getFullPath(self):
+        return (self.mParent.getFullPath() if self.mParent is not None else '') + '|' + self.mName
+
+    def isDag(self):
+        return self.mParent is not None or len(self.mChildren) > 0 or self.mType in TransformTypes
+
+    def getVector(self, inField, inDefault):
+        return list(self.mTransform.get(inField, inDefault))
+
+    # Get the object space bounding box of a mesh, None when the file has no vertices for it
+    def getBounds(self):
+        if len(self.mPoints) == 0:
+            return None
+
+        points = [ ]
+        for index, point in self.mPoints.iteritems():
+            tweak = self.mTweaks.get(index, (0.0, 0.0, 0.0))
+            points.append([point[axis] + tweak[axis] for axis in range(3)])
+        return [min([p[axis] for p in points]) for axis in range(3)] + [max([p[axis] for p in points]) for axis in range(3)]
+
+    # Get the local matrix of a joint, joint orient sits between rotation and translation
+    def getJointMatrix(self):
+        m = Matrix.compose([0.0, 0.0, 0.0], self.getVector('rotate', [0.0, 0.0, 0.0]), self.getVector('scale', [1.0, 1.0, 1.0]), self.mRotateOrder)
+        m = Matrix.multiply(m, Matrix.compose([0.0, 0.0, 0.0], self.getVector('jointOrient', [0.0, 0.0, 0.0]), [1.0, 1.0, 1.0]))
+        return Matrix.multiply(m, Matrix.translation(self.getVector('translate', [0.0, 0.0, 0.0])))
+
+
+# Turn a MEL string literal into its value
+def _unquote(inToken):
+    return MelString(re.sub(r'\\(.)', lambda inMatch: Escapes.get(inMatch.group(1), inMatch.group(1)), inToken[1:-1]))
+
+
+# Read the statements of a MEL file one at a time, as lists of tokens
+#   Strings joined with '+' (which .ma files use to wrap long strings over lines) are merged, and the
+#   brackets wrapped around them are dropped
+def readStatements(inFile):
+    tokens = [ ]
+    for line in inFile:
+        if line.startswith('//'):
+            continue
+
+        for token in Tokens.findall(line.decode('utf-8')):
+            if token == ';':
+                yield tokens
+                tokens = [ ]
+            elif token.startswith('"'):
+                if len(tokens) >= 2 and tokens[-1] == '+' and isinstance(tokens[-2], MelString):
+                    tokens.pop()
+                    tokens[-1] = MelString(tokens[-1] + _unquote(token))
+                else:
+                    tokens.append(_unquote(token))
+            elif token == ')' and len(tokens) >= 2 and isinstance(tokens[-1], MelString) and not isinstance(tokens[-2], MelString) and tokens[-2] == '(':
+                tokens.pop(-2)
+            else:
+                tokens.append(token)
+
+
+# Get the value of a bare MEL word
+def _parseWord(inWord):
+    if inWord in ['yes', 'on', 'true']:
+        return True
+    if inWord in ['no', 'off', 'false']:
+        return False
+    try:
+        return int(inWord)
+    except ValueError:
+        pass
+    try:
+        return float(inWord)
+    except ValueError:
+        return inWord
+
+
+# Get whether a bare word is a flag rather than a (negative) number
+def _isFlag(inToken):
+    return not isinstance(inToken, MelString) and inToken.startswith('-') and not isinstance(_parseWord(inToken), (int, float))
+
+
+# Split a plug into (attribute names, [(start, end)] index ranges), eg. 'uvst[0].uvsp[0:3]' -> (['uvst', 'uvsp'], [(0, 0), (0, 3)])
+def _splitPlug(inPlug):
+    names = [ ]
+    ranges = [ ]
+    for part in inPlug.strip('.').split('.'):
+        match = re.match(r'^([^\[]+)(?:\[(\d+)(?::(\d+))?\])?$', part)
+        if match is None:
+            return ([ ], [ ])
+        names.append(match.group(1))
+        start = int(match.group(2)) if match.group(2) is not None else None
+        end = int(match.group(3)) if match.group(3) is not None else start
+        ranges.append((start, end))
+    return (names, ranges)
+
+
+#
+# Streaming reader for the pivot sets in a Maya ASCII scene
+#   Only what the build reads is kept: the DAG hierarchy with its transforms, the bounds and UV set
+#   sizes of meshes beneath PivotNodes, skin cluster influences and the pivot node settings and
+#   connections. Everything else in the file is skipped over.
+#
+class AsciiReader:
+
+    def __init__(self):
+        self.mNodes = [ ]
+        self.mNodesByName = { }
+        self.mCurrent = None
+        self.mConnections = [ ]
+        self.mGeometryEdges = { }
+        self.mWarnings = [ ]
+
+    # Find a node from a name or (partial) DAG path, None if nothing matches
+    def _find(self, inName):
+        nodes = self.mNodesByName.get(inName.split('|')[-1], [ ])
+        if '|' in inName:
+            path = inName if inName.startswith('|') else '|' + inName
+            nodes = [node for node in nodes if node.getFullPath() == path or node.getFullPath().endswith(path)]
+
+        if len(nodes) == 0:
+            return None
+        if len(nodes) > 1:
+            self.mWarnings.append("'%s' matches more than one node, using the first" % inName)
+        return nodes[0]
+
+    def _createNode(self, inArgs):
+        nodeType = inArgs[0]
+        name = None
+        parent = None
+
+        i = 1
+        while i < len(inArgs):
+            if inArgs[i] in ['-n', '-name'] and i + 1 < len(inArgs):
+                name = inArgs[i + 1]
+                i = i + 1
+            elif inArgs[i] in ['-p', '-parent'] and i + 1 < len(inArgs):
+                parent = self._find(inArgs[i + 1])
+                if parent is None:
+                    raise Exception("Parent '%s' of '%s' hasn't been created!" % (inArgs[i + 1], name))
+                i = i + 1
+            i = i + 1
+
+        node = AsciiNode(name if name is not None else '%s1' % nodeType, nodeType, parent)
+        if parent is not None:
+            parent.mChildren.append(node)
+
+        self.mNodes.append(node)
+        self.mNodesByName.setdefault(node.mName, [ ]).append(node)
+        self.mCurrent = node
+
+    def _select(self, inArgs):
+        names = [arg for arg in inArgs if not _isFlag(arg)]
+        self.mCurrent = self._find(names[0]) if len(names) > 0 and not names[0].startswith(':') else None
+
+    def _setAttr(self, inArgs):
+        node = self.mCurrent
+
+        # Skip the (often huge) values of nodes which don't end up in the scene
+        if node is None or not node.isDag() or (node.mType == 'mesh' and not node.mUnderPivot):
+            return
+
+        plug = None
+        values = [ ]
+        i = 0
+        while i < len(inArgs):
+            arg = inArgs[i]
+            if _isFlag(arg):
+                i = i + SetAttrFlags.get(arg, 0)
+            elif plug is None and isinstance(arg, MelString):
+                plug = arg
+            else:
+                values.append(arg if isinstance(arg, MelString) else _parseWord(arg))
+            i = i + 1
+
+        if plug is None:
+            return
+
+        names, ranges = _splitPlug(plug)
+        if len(names) == 0:
+            return
+
+        if names[0] in TransformAttributes and len(names) == 1:
+            field, component = TransformAttributes[names[0]]
+            value = node.mTransform.setdefault(field, [1.0, 1.0, 1.0] if field == 'scale' else [0.0, 0.0, 0.0])
+            if component is None and len(values) >= 3:
+                node.mTransform[field] = [float(v) for v in values[0:3]]
+            elif component is not None and len(values) >= 1:
+                value[component] = float(values[0])
+        elif names == ['ro'] and len(values) > 0:
+            node.mRotateOrder = int(values[0])
+        elif names == ['v'] and len(values) > 0:
+            node.mAttributes['visibility'] = bool(values[0])
+        elif names == ['nd'] and len(values) > 0:
+            node.mAttributes['nodeData'] = values[-1]
+        elif node.mType == 'mesh' and node.mUnderPivot:
+            self._setMeshAttr(node, names, ranges, values)
+
+    # Keep the vertices, tweaks and UV set sizes of a mesh
+    def _setMeshAttr(self, inNode, inNames, inRanges, inValues):
+        if inNames == ['io'] and len(inValues) > 0:
+            inNode.mIntermediate = bool(inValues[0])
+        elif inNames[0] in ['vt', 'pt'] and len(inNames) == 1 and inRanges[0][0] is not None:
+            points = inNode.mPoints if inNames[0] == 'vt' else inNode.mTweaks
+            numbers = [float(v) for v in inValues if isinstance(v, (int, float))]
+            start, end = inRanges[0]
+            for index in range(start, end + 1):
+                offset = (index - start) * 3
+                if offset + 3 <= len(numbers):
+                    points[index] = numbers[offset:offset + 3]
+        elif inNames[0] == 'uvst' and len(inNames) == 2 and inRanges[0][0] is not None:
+            uvSet = inNode.mUVSets.setdefault(inRanges[0][0], ['map1' if inRanges[0][0] == 0 else 'uvSet%i' % inRanges[0][0], 0])
+            if inNames[1] == 'uvsn' and len(inValues) > 0:
+                uvSet[0] = inValues[0]
+            elif inNames[1] == 'uvsp' and inRanges[1][1] is not None:
+                uvSet[1] = max(uvSet[1], inRanges[1][1] + 1)
+
+    def _connectAttr(self, inArgs):
+        plugs = [arg for arg in inArgs if isinstance(arg, MelString)]
+        if len(plugs) < 2 or '.' not in plugs[0] or '.' not in plugs[1]:
+            return
+
+        source, sourcePlug = plugs[0].split('.', 1)
+        destination, destinationPlug = plugs[1].split('.', 1)
+        sourceNames, sourceRanges = _splitPlug(sourcePlug)
+        destinationNames, destinationRanges = _splitPlug(destinationPlug)
+        if len(sourceNames) == 0 or len(destinationNames) == 0:
+            return
+
+        sourceAttr = ConnectionAttributes.get(sourceNames[0], sourceNames[0])
+        destinationAttr = ConnectionAttributes.get(destinationNames[0], destinationNames[0])
+
+        if sourceAttr in PivotAttributes or destinationAttr in PivotAttributes:
+            self.mConnections.append((source, sourceAttr, destination, destinationAttr))
+        elif sourceAttr == 'worldMatrix' and destinationAttr == 'matrix' and destinationRanges[0][0] is not None:
+            cluster = self._find(destination)
+            if cluster is not None and cluster.mType == 'skinCluster':
+                cluster.mInfluences[destinationRanges[0][0]] = source
+        elif sourceAttr == 'outputGeometry' and destinationAttr in ['inMesh', 'input']:
+            self.mGeometryEdges.setdefault(source, [ ]).append(destination)
+
+    # Read a scene file
+    def read(self, inPath):
+        handlers = {
+            'createNode': self._createNode,
+            'select': self._select,
+            'setAttr': self._setAttr,
+            'connectAttr': self._connectAttr
+        }
+
+        with open(inPath, 'r') as fp:
+            for statement in readStatements(fp):
+                if len(statement) > 0 and statement[0] in handlers:
+                    handlers[statement[0]](statement[1:])
+                elif len(statement) > 0 and statement[0] == 'parent':
+                    self.mWarnings.append('Instancing and reparenting statements are ignored')
+
+    # Follow deformer outputs down to the mesh a skin cluster drives
+    def _findSkinnedMesh(self, inCluster):
+        visited = set()
+        pending = [inCluster.mName]
+        while len(pending) > 0:
+            name = pending.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+
+            node = self._find(name)
+            if node is not None and node.mType == 'mesh':
+                return node
+            pending.extend(self.mGeometryEdges.get(name, [ ]))
+        return None
+
+    # Build an in-memory scene from everything read so far
+    def createScene(self):
+        scene = MemoryBackend()
+
+        for node in self.mNodes:
+            if not node.isDag():
+                continue
+            parent = node.mParent.mSceneName if node.mParent is not None else None
+
+            if node.mType == 'mesh':
+                if node.mUnderPivot and not node.mIntermediate:
+                    bounds = node.getBounds()
+
+                    # Deformed shapes are usually saved without vertices, their original shape has them
+                    originals = [sibling.getBounds() for sibling in node.mParent.mChildren if sibling.mType == 'mesh' and sibling.mIntermediate]
+                    if bounds is None and len(originals) > 0:
+                        bounds = originals[0]
+
+                    if bounds is None:
+                        self.mWarnings.append("'%s' has no vertices in the file (is it driven by construction history?), its bounds will be zero" % node.getFullPath())
+                else:
+                    bounds = None
+                uvSets = [(name, [(0.0, 0.0)] * count) for index, (name, count) in sorted(node.mUVSets.items())]
+                node.mSceneName = scene.createMeshShape(node.mName, parent, bounds if bounds is not None else [0.0] * 6, uvSets if len(uvSets) > 0 else [('map1', [ ])], node.mIntermediate)
+            elif node.mType == 'joint':
+                node.mSceneName = scene.createNode('joint', node.mName, parent, matrix=node.getJointMatrix(), rotatePivot=node.getVector('rotatePivot', [0.0, 0.0, 0.0]))
+            else:
+                transform = dict([(field, node.getVector(field, [0.0, 0.0, 0.0])) for field in ['translate', 'rotate', 'rotatePivot', 'scalePivot', 'rotatePivotTranslate', 'scalePivotTranslate'] if field in node.mTransform])
+                if 'scale' in node.mTransform:
+                    transform['scale'] = node.getVector('scale', [1.0, 1.0, 1.0])
+                node.mSceneName = scene.createNode(node.mType, node.mName, parent, rotateOrder=node.mRotateOrder, **transform)
+
+            for attr, value in node.mAttributes.iteritems():
+                scene.setAttr(node.mSceneName, attr, value)
+
+        for cluster in [node for node in self.mNodes if node.mType == 'skinCluster']:
+            mesh = self._findSkinnedMesh(cluster)
+            influences = [self._find(cluster.mInfluences[index]) for index in sorted(cluster.mInfluences.keys())]
+            if mesh is None or mesh.mParent is None or None in influences or len(influences) == 0:
+                self.mWarnings.append("Skin cluster '%s' isn't bound to a mesh and joints in the file, it's ignored" % cluster.mName)
+                continue
+
+            # Weights aren't read, UV layout isn't reproduced for skinned meshes (only textures are)
+            uvs = sorted(mesh.mUVSets.items())
+            primary = [0] * (uvs[0][1][1] if len(uvs) > 0 else 0)
+            scene.createSkinCluster(mesh.mParent.mSceneName, [node.mSceneName for node in influences], primary, cluster.mName)
+
+        for source, sourceAttr, destination, destinationAttr in self.mConnections:
+            sourceNode = self._find(source)
+            destinationNode = self._find(destination)
+            if sourceNode is None or destinationNode is None or sourceNode.mSceneName is None or destinationNode.mSceneName is None:
+                continue
+            scene.connectAttr('%s.%s' % (sourceNode.mSceneName, sourceAttr), '%s.%s' % (destinationNode.mSceneName, destinationAttr))
+
+        return scene
+
+
+# Read the pivot sets of a Maya ASCII scene into a MemoryBackend, returns (scene, warnings)
+def loadScene(inPath):
+    if not inPath.lower().endswith('.ma'):
+        raise Exception("'%s' isn't a Maya ASCII (.ma) scene!" % inPath)
+
+    reader = AsciiReader()
+    reader.read(inPath)
+    scene = reader.createScene()
+
+    return (scene, reader.mWarnings)
@@ -0,0 +1,633 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import re
+
+import Snapshot
+from Backend import SceneBackend
+from ..Nodes import NodeTypes
+from ..Util import Matrix
+
+
+#
+# Single node in an in-memory scene
+#   Transforms store Maya style TRS + pivot values (or a raw local matrix) and optional keys for
+#   them, mesh shapes store an object space bounding box and UV sets (as parallel u/v lists).
+#
+class MemoryNode:
+
+    def __init__(self, inName, inType):
+        self.mName = inName
+        self.mType = inType
+        self.mParent = None
+        self.mChildren = [ ]
+        self.mAttributes = { 'visibility': True }
+
+        # Transform
+        self.mTranslate = [0.0, 0.0, 0.0]
+        self.mRotate = [0.0, 0.0, 0.0]
+        self.mScale = [1.0, 1.0, 1.0]
+        self.mRotateOrder = 0
+        self.mRotatePivot = [0.0, 0.0, 0.0]
+        self.mScalePivot = [0.0, 0.0, 0.0]
+        self.mRotatePivotTranslate = [0.0, 0.0, 0.0]
+        self.mScalePivotTranslate = [0.0, 0.0, 0.0]
+        self.mMatrix = None
+
+        # Animation, lists of [frame, value] keys by attribute ('translate', 'rotate' or 'scale'). The
+        #   offset moves animated copies beneath their new parent, see MemoryBackend.duplicateChildren.
+        self.mKeys = { }
+        self.mParentOffset = None
+
+        # Mesh
+        self.mBounds = None
+        self.mUVSets = [ ]
+        self.mUVs = { }
+        self.mIntermediate = False
+
+        # Skinning (on mesh transforms)
+        self.mSkinCluster = None
+        self.mPrimaryInfluences = None
+
+    def isShape(self):
+        return self.mType == 'mesh'
+
+    def getFullPath(self):
+        path = [ ]
+        node = self
+        while node is not None:
+            path.append(node.mName)
+            node = node.mParent
+        return '|' + '|'.join(reversed(path))
+
+    # Get the local matrix, at inFrame if given (nodes without keys are the same at every frame)
+    def getLocalMatrix(self, inFrame=None):
+        if self.mMatrix is not None and (inFrame is None or len(self.mKeys) == 0):
+            return self.mMatrix
+
+        values = [self.getValueAt(attr, inFrame) for attr in ['translate', 'rotate', 'scale']]
+        matrix = Matrix.compose(values[0], values[1], values[2], self.mRotateOrder, self.mRotatePivot, self.mScalePivot, self.mRotatePivotTranslate, self.mScalePivotTranslate)
+        return Matrix.multiply(matrix, self.mParentOffset) if self.mParentOffset is not None else matrix
+
+    # Get the value of a transform attribute at inFrame, keys are interpolated linearly and held beyond
+    # the first and last. Without a frame (or keys) this is the attribute's current value.
+    def getValueAt(self, inAttr, inFrame):
+        keys = self.mKeys.get(inAttr, [ ])
+        if inFrame is None or len(keys) == 0:
+            return getattr(self, 'm%s%s' % (inAttr[0].upper(), inAttr[1:]))
+
+        if inFrame <= keys[0][0]:
+            return list(keys[0][1])
+        for (start, first), (end, second) in zip(keys[:-1], keys[1:]):
+            if inFrame <= end:
+                t = (inFrame - start) / float(end - start)
+                return [a + (b - a) * t for a, b in zip(first, second)]
+        return list(keys[-1][1])
+
+    def getUVCount(self, inUVSet=None):
+        if len(self.mUVSets) == 0:
+            return 0
+        return len(self.mUVs[inUVSet if inUVSet is not None else self.mUVSets[0]][0])
+
+
+#
+# Scene backend holding a pure Python scene graph
+#   Nothing here touches Maya, so the whole build pipeline can be run (and profiled) on any
+#   machine with Python 2.7. Scenes are built with the create* functions or loadScene().
+#
+class MemoryBackend(SceneBackend):
+
+    def __init__(self):
+        SceneBackend.__init__(self)
+
+        self.mRoots = [ ]
+        self.mNodesByName = { }
+        self.mNameIndices = { }
+        self.mConnections = [ ]
+        self.mSkinClusters = { }
+        self.mSelection = [ ]
+        self.mWorldMatrixCache = { }
+        self.mLocalBoundsCache = { }
+        self.mPlaybackRange = (1.0, 120.0)
+
+    #
+    # Scene construction
+    #
+
+    # Get a name which isn't used by any other node (Maya style, by bumping the trailing number)
+    def _uniqueName(self, inName):
+        if inName not in self.mNodesByName:
+            return inName
+
+        # Remember where the search got to for each base name, otherwise copying big hierarchies is quadratic
+        base = re.sub(r'\d+$', '', inName)
+        index = self.mNameIndices.get(base, 1)
+        while '%s%i' % (base, index) in self.mNodesByName:
+            index = index + 1
+        self.mNameIndices[base] = index + 1
+        return '%s%i' % (base, index)
+
+    def _addNode(self, inNode, inParent):
+        self.mNodesByName.setdefault(inNode.mName, [ ]).append(inNode)
+        self._reparent(inNode, inParent)
+
+    def _reparent(self, inNode, inParent):
+        if inNode.mParent is not None:
+            inNode.mParent.mChildren.remove(inNode)
+        elif inNode in self.mRoots:
+            self.mRoots.remove(inNode)
+
+        inNode.mParent = inParent
+        if inParent is not None:
+            inParent.mChildren.append(inNode)
+        else:
+            self.mRoots.append(inNode)
+        self._dirty()
+
+    def _rename(self, inNode, inName):
+        self.mNodesByName[inNode.mName].remove(inNode)
+        if len(self.mNodesByName[inNode.mName]) == 0:
+            del self.mNodesByName[inNode.mName]
+
+        inNode.mName = self._uniqueName(inName)
+        self.mNodesByName.setdefault(inNode.mName, [ ]).append(inNode)
+
+    def _dirty(self):
+        self.mWorldMatrixCache = { }
+        self.mLocalBoundsCache = { }
+
+    # Create a node, returns its name
+    def createNode(self, inType, inName=None, inParent=None, **inTransform):
+        node = MemoryNode(self._uniqueName(inName if inName is not None else '%s1' % inType), inType)
+
+        for key, value in inTransform.iteritems():
+            setattr(node, 'm%s%s' % (key[0].upper(), key[1:]), value)
+
+        self._addNode(node, self._find(inParent) if inParent is not None else None)
+        return node.mName
+
+    # Create a mesh transform with a single shape, returns the transform name
+    #   inUVs is a list of (u, v) pairs for map1, or a UV count to fill with zeros
+    def createMesh(self, inName, inParent, inBounds, inUVs, **inTransform):
+        name = self.createNode('transform', inName, inParent, **inTransform)
+
+        uvs = inUVs if not isinstance(inUVs, int) else [(0.0, 0.0)] * inUVs
+        self.createMeshShape('%sShape' % name, name, inBounds, [('map1', uvs)])
+
+        return name
+
+    # Create a mesh shape beneath a transform, returns the shape name
+    #   inUVSets is a list of (UV set name, list of (u, v) pairs), intermediate shapes are ignored
+    #   like Maya's construction history
+    def createMeshShape(self, inName, inParent, inBounds, inUVSets, inIntermediate=False):
+        shape = self._find(self.createNode('mesh', inName, inParent))
+        shape.mBounds = list(inBounds)
+        shape.mIntermediate = inIntermediate
+
+        for uvSet, uvs in inUVSets:
+            shape.mUVSets.append(uvSet)
+            shape.mUVs[uvSet] = ([uv[0] for uv in uvs], [uv[1] for uv in uvs])
+
+        return shape.mName
+
+    # Bind a mesh to a list of influences, inPrimaryInfluences is the strongest influence index of each UV
+    def createSkinCluster(self, inMesh, inInfluences, inPrimaryInfluences, inName=None):
+        name = self._uniqueName(inName if inName is not None else 'skinCluster1')
+        self.mSkinClusters[name] = [self._find(node) for node in inInfluences]
+        self.mNodesByName.setdefault(name, [ ])
+
+        mesh = self._find(inMesh)
+        mesh.mSkinCluster = name
+        mesh.mPrimaryInfluences = list(inPrimaryInfluences)
+        return name
+
+    # Connect two attributes
+    def connectAttr(self, inSource, inDestination):
+        source, sourceAttr = inSource.split('.', 1)
+        destination, destinationAttr = inDestination.split('.', 1)
+        self.mConnections.append([self._find(source), sourceAttr, self._find(destination), destinationAttr])
+
+    # Create a linked PivotNode/PivotOutputNode pair, like Create -> Create Pivot Set
+    def createPivotSet(self, inChildren=None, inNodeData=None):
+        inputNode = self.createNode(NodeTypes.PivotNode, 'PivotNode1')
+        outputNode = self.createNode(NodeTypes.PivotOutputNode, 'PivotOutputNode1')
+        self.connectAttr('%s.outputPivotNode' % inputNode, '%s.inputPivotNode' % outputNode)
+
+        self.setAttr(outputNode, 'visibility', False)
+        self.setAttr(inputNode, 'nodeData', inNodeData if inNodeData is not None else '{}')
+
+        for child in inChildren if inChildren is not None else [ ]:
+            self._reparent(self._find(child), self._find(inputNode))
+
+        return inputNode, outputNode
+
+    # Load a scene from a description, the format is plain data so it can come straight from JSON
+    #   {
+    #       'nodes': [ { 'name', 'type', 'parent', 'translate', 'rotate', 'scale', 'rotatePivot', 'matrix',
+    #                    'keys': { 'translate': [ [frame, value], ... ], ... },
+    #                    'attributes': { }, 'mesh': { 'bounds', 'uvs' } }, ... ],
+    #       'skinClusters': [ { 'name', 'mesh', 'influences', 'primaryInfluences' }, ... ],
+    #       'connections': [ [ 'node.attr', 'node.attr' ], ... ],
+    #       'playbackRange': [ start, end ]
+    #   }
+    #   Nodes must be listed after their parents, and keys in frame order.
+    def loadScene(self, inDescription):
+
+        transformKeys = ['translate', 'rotate', 'scale', 'rotateOrder', 'rotatePivot', 'scalePivot', 'matrix', 'keys']
+
+        for desc in inDescription.get('nodes', [ ]):
+            transform = dict([(key, desc[key]) for key in transformKeys if key in desc])
+
+            if 'mesh' in desc:
+                name = self.createMesh(desc['name'], desc.get('parent', None), desc['mesh']['bounds'], desc['mesh']['uvs'], **transform)
+            else:
+                name = self.createNode(desc.get('type', 'transform'), desc['name'], desc.get('parent', None), **transform)
+
+            for attr, value in desc.get('attributes', { }).iteritems():
+                self.setAttr(name, attr, value)
+
+        for desc in inDescription.get('skinClusters', [ ]):
+            self.createSkinCluster(desc['mesh'], desc['influences'], desc['primaryInfluences'], desc.get('name', None))
+
+        for source, destination in inDescription.get('connections', [ ]):
+            self.connectAttr(source, destination)
+
+        if 'playbackRange' in inDescription:
+            self.mPlaybackRange = tuple(inDescription['playbackRange'])
+
+    #
+    # Lookup
+    #
+
+    # Resolve a name (short name, partial or full path) to a node
+    def _find(self, inNode):
+        if isinstance(inNode, MemoryNode):
+            return inNode
+
+        shortName = inNode.split('|')[-1]
+        nodes = self.mNodesByName.get(shortName, [ ])
+        if '|' in inNode:
+            nodes = [node for node in nodes if node.getFullPath() == inNode or node.getFullPath().endswith('|' + inNode)]
+
+        if len(nodes) == 0:
+            raise Exception("No object matches name: %s" % inNode)
+        if len(nodes) > 1:
+            raise Exception("More than one object matches name: %s" % inNode)
+        return nodes[0]
+
+    def _allNodes(self):
+        nodes = [ ]
+        stack = list(reversed(self.mRoots))
+        while len(stack) > 0:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(node.mChildren))
+        return nodes
+
+    def _getWorldMatrix(self, inNode):
+        if inNode in self.mWorldMatrixCache:
+            return self.mWorldMatrixCache[inNode]
+
+        matrix = Matrix.identity() if inNode.isShape() else inNode.getLocalMatrix()
+        if inNode.mParent is not None:
+            matrix = Matrix.multiply(matrix, self._getWorldMatrix(inNode.mParent))
+
+        self.mWorldMatrixCache[inNode] = matrix
+        return matrix
+
+    # As _getWorldMatrix at inFrame, ioCache holds the matrices found for the frame so far
+    def _getWorldMatrixAt(self, inNode, inFrame, ioCache):
+        if inNode in ioCache:
+            return ioCache[inNode]
+
+        matrix = Matrix.identity() if inNode.isShape() else inNode.getLocalMatrix(inFrame)
+        if inNode.mParent is not None:
+            matrix = Matrix.multiply(matrix, self._getWorldMatrixAt(inNode.mParent, inFrame, ioCache))
+
+        ioCache[inNode] = matrix
+        return matrix
+
+    # Get the object space box around the geometry beneath a node
+    #   Like Maya, child boxes are transformed into the parent rather than the geometry itself
+    def _getLocalBounds(self, inNode):
+        if inNode in self.mLocalBoundsCache:
+            return self.mLocalBoundsCache[inNode]
+
+        bounds = [ ]
+        for child in inNode.mChildren:
+            if child.isShape():
+                if child.mBounds is not None and not child.mIntermediate:
+                    bounds.append(child.mBounds)
+            else:
+                childBounds = self._getLocalBounds(child)
+                if childBounds is not None:
+                    bounds.append(Matrix.transformBounds(childBounds, child.getLocalMatrix()))
+
+        bounds = Matrix.unionBounds(bounds)
+        self.mLocalBoundsCache[inNode] = bounds
+        return bounds
+
+    def _getMeshShapes(self, inNode):
+        return [child for child in inNode.mChildren if child.isShape() and not child.mIntermediate]
+
+    #
+    # Nodes and attributes
+    #
+
+    def getSelection(self):
+        return [node.mName for node in self.mSelection]
+
+    def setSelection(self, inNodes):
+        self.mSelection = [self._find(node) for node in inNodes]
+
+    def objectExists(self, inNode):
+        try:
+            self._find(inNode)
+        except:
+            return False
+        return True
+
+    def getNodeType(self, inNode):
+        return self._find(inNode).mType
+
+    def listNodes(self, inType):
+        return [node.mName for node in self._allNodes() if node.mType == inType]
+
+    def getAttr(self, inNode, inAttr):
+        node = self._find(inNode)
+        if inAttr not in node.mAttributes:
+            raise Exception("No attribute '%s' on '%s'" % (inAttr, inNode))
+        return node.mAttributes[inAttr]
+
+    def setAttr(self, inNode, inAttr, inValue):
+        self._find(inNode).mAttributes[inAttr] = inValue
+
+    def getConnections(self, inNode, inAttr):
+        node = self._find(inNode)
+
+        connected = [ ]
+        for source, sourceAttr, destination, destinationAttr in self.mConnections:
+            if source == node and sourceAttr == inAttr:
+                connected.append(destination.mName)
+            elif destination == node and destinationAttr == inAttr:
+                connected.append(source.mName)
+        return connected
+
+    #
+    # Hierarchy, transforms, bounds and skinning
+    #
+
+    # Reads go through a detached snapshot so the build can render from worker threads while the
+    # output is being edited
+    def extract(self, inRoots):
+        return Snapshot.capture(self, inRoots)
+
+    def getFullPath(self, inNode):
+        return self._find(inNode).getFullPath()
+
+    def getChildren(self, inNode):
+        return [child.getFullPath() for child in self._find(inNode).mChildren if not child.isShape()]
+
+    def getShapes(self, inNode):
+        return [child.getFullPath() for child in self._find(inNode).mChildren if child.isShape()]
+
+    def getWorldMatrix(self, inNode):
+        return list(self._getWorldMatrix(self._find(inNode)))
+
+    def getWorldPivot(self, inNode):
+        node = self._find(inNode)
+
+        # The rotate pivot lives after scale but before rotation, so only the parent and translation move it
+        if node.mMatrix is not None:
+            return Matrix.transformPoint(node.mRotatePivot, self._getWorldMatrix(node))
+
+        pivot = [node.mRotatePivot[i] + node.mRotatePivotTranslate[i] + node.mTranslate[i] for i in range(3)]
+        if node.mParentOffset is not None:
+            pivot = Matrix.transformPoint(pivot, node.mParentOffset)
+        if node.mParent is not None:
+            pivot = Matrix.transformPoint(pivot, self._getWorldMatrix(node.mParent))
+        return pivot
+
+    def getWorldBounds(self, inNode):
+        node = self._find(inNode)
+        bounds = self._getLocalBounds(node)
+        return Matrix.transformBounds(bounds, self._getWorldMatrix(node)) if bounds is not None else [0.0] * 6
+
+    def getLocalBounds(self, inNode):
+        bounds = self._getLocalBounds(self._find(inNode))
+        return bounds if bounds is not None else [0.0] * 6
+
+    def getSkinCluster(self, inNode):
+        return self._find(inNode).mSkinCluster
+
+    def getInfluences(self, inSkinCluster):
+        return [node.getFullPath() for node in self.mSkinClusters[inSkinCluster]]
+
+    def getPrimaryInfluences(self, inNode):
+        return self._find(inNode).mPrimaryInfluences
+
+    #
+    # Animation
+    #
+
+    def getPlaybackRange(self):
+        return self.mPlaybackRange
+
+    def getWorldMatricesAt(self, inNodes, inFrame, outMatrices):
+        cache = { }
+        for i, node in enumerate(inNodes):
+            matrix = self._getWorldMatrixAt(self._find(node), inFrame, cache)
+            for j in range(16):
+                outMatrices[i * 16 + j] = matrix[j]
+
+    #
+    # Edits
+    #
+
+    def _deleteNode(self, inNode, inDetach=True):
+        for child in inNode.mChildren:
+            self._deleteNode(child, False)
+        inNode.mChildren = [ ]
+
+        # Children of a deleted node go with it, so only the top node needs unlinking
+        if inDetach:
+            if inNode.mParent is not None:
+                inNode.mParent.mChildren.remove(inNode)
+            elif inNode in self.mRoots:
+                self.mRoots.remove(inNode)
+
+        self.mNodesByName[inNode.mName].remove(inNode)
+        if len(self.mNodesByName[inNode.mName]) == 0:
+            del self.mNodesByName[inNode.mName]
+
+        self.mConnections = [c for c in self.mConnections if c[0] != inNode and c[2] != inNode]
+        self.mSelection = [node for node in self.mSelection if node != inNode]
+        self._dirty()
+
+    def deleteChildren(self, inNode):
+        for child in list(self._find(inNode).mChildren):
+            self._deleteNode(child)
+
+    def stashChildren(self, inNode):
+        node = self._find(inNode)
+        if len(node.mChildren) == 0:
+            return None
+
+        # The stash sits where the node is, so the children keep their world transforms
+        stash = MemoryNode(self._uniqueName('pivotToolStash1'), 'transform')
+        stash.mMatrix = list(self._getWorldMatrix(node))
+        stash.mAttributes['visibility'] = False
+        self._addNode(stash, None)
+
+        names = [ ]
+        for child in list(node.mChildren):
+            names.append(child.mName)
+            self._reparent(child, stash)
+            self._rename(child, '%sStash' % child.mName)
+
+        return (stash.mName, names)
+
+    def restoreChildren(self, inNode, inToken):
+        self.deleteChildren(inNode)
+        if inToken is None:
+            return
+
+        node = self._find(inNode)
+        stash = self._find(inToken[0])
+        for child, name in zip(list(stash.mChildren), inToken[1]):
+            self._reparent(child, node)
+            self._rename(child, name)
+        self._deleteNode(stash)
+
+    def discardStash(self, inToken):
+        if inToken is not None and self.objectExists(inToken[0]):
+            self._deleteNode(self._find(inToken[0]))
+
+    def _duplicateNode(self, inNode, inParent, inCopies):
+        node = MemoryNode(self._uniqueName(inNode.mName), inNode.mType)
+
+        for key, value in inNode.__dict__.iteritems():
+            if key not in ['mName', 'mParent', 'mChildren']:
+                setattr(node, key, value.copy() if isinstance(value, dict) else (list(value) if isinstance(value, list) else value))
+        node.mUVs = dict([(uvSet, (list(uvs[0]), list(uvs[1]))) for uvSet, uvs in inNode.mUVs.iteritems()])
+
+        inCopies[inNode] = node
+        self._addNode(node, inParent)
+        for child in inNode.mChildren:
+            self._duplicateNode(child, node, inCopies)
+        return node
+
+    def duplicateChildren(self, inSource, inTarget):
+        source = self._find(inSource)
+        target = self._find(inTarget)
+
+        # Keep world transforms intact when moving under the target, like cmds.parent does
+        copies = { }
+        targetInverse = Matrix.inverse(self._getWorldMatrix(target))
+        for child in list(source.mChildren):
+            world = self._getWorldMatrix(child)
+            node = self._duplicateNode(child, target, copies)
+            if not node.isShape() and len(node.mKeys) > 0:
+                # Animated copies keep their channels, the move goes into an offset applied after them
+                parentWorld = Matrix.multiply(self._getWorldMatrix(source), targetInverse)
+                node.mParentOffset = Matrix.multiply(child.mParentOffset, parentWorld) if child.mParentOffset is not None else parentWorld
+            elif not node.isShape():
+                node.mMatrix = Matrix.multiply(world, targetInverse)
+                node.mRotatePivot = Matrix.transformPoint(self.getWorldPivot(child), Matrix.inverse(world))
+
+        # Skinned duplicates get their own cluster, bound to the duplicated joints where they were copied too
+        for node in copies.values():
+            if node.mSkinCluster is not None:
+                influences = [copies.get(influence, influence) for influence in self.mSkinClusters[node.mSkinCluster]]
+                node.mSkinCluster = self._uniqueName(node.mSkinCluster)
+                self.mSkinClusters[node.mSkinCluster] = influences
+                self.mNodesByName.setdefault(node.mSkinCluster, [ ])
+
+        self._dirty()
+
+    def ensureUVSet(self, inNode, inUVSet):
+        shapes = self._getMeshShapes(self._find(inNode))
+        if len(shapes) == 0 or len(shapes[0].mUVSets) == 0:
+            raise Exception('%s has no sets' % inNode)
+
+        shape = shapes[0]
+        if inUVSet not in shape.mUVSets:
+            shape.mUVSets.append(inUVSet)
+
+        source = shape.mUVs[shape.mUVSets[0]]
+        shape.mUVs[inUVSet] = (list(source[0]), list(source[1]))
+
+    def setUVs(self, inNode, inUVSet, inUVs, inU, inV):
+        shape = self._getMeshShapes(self._find(inNode))[0]
+        us, vs = shape.mUVs[inUVSet]
+
+        for uv in inUVs if inUVs is not None else range(len(us)):
+            us[uv] = inU
+            vs[uv] = inV
+
+    def combineChildren(self, inNode, inName):
+        node = self._find(inNode)
+
+        children = [child for child in node.mChildren if len(self._getMeshShapes(child)) > 0]
+        if len(children) == 0:
+            raise Exception("No meshes to combine beneath '%s'" % inNode)
+
+        # Like polyUnite, every mesh beneath the children is merged
+        meshes = [ ]
+        for child in children:
+            meshes.extend([(n, self._getWorldMatrix(n)) for n in [child] + self._allDescendants(child) if len(self._getMeshShapes(n)) > 0])
+
+        final = children[0]
+        if len(meshes) > 1:
+            # Merge in world space, UV sets are merged by name
+            bounds = Matrix.unionBounds([Matrix.transformBounds(self._getMeshShapes(n)[0].mBounds, m) for n, m in meshes])
+            uvSets = [ ]
+            for n, m in meshes:
+                uvSets.extend([uvSet for uvSet in self._getMeshShapes(n)[0].mUVSets if uvSet not in uvSets])
+
+            final = MemoryNode(self._uniqueName('polySurface1'), 'transform')
+            final.mMatrix = Matrix.inverse(self._getWorldMatrix(node))
+            self._addNode(final, node)
+            final.mRotatePivot = [(bounds[i] + bounds[i + 3]) * 0.5 for i in range(3)]
+            final.mRotatePivot = Matrix.transformPoint(final.mRotatePivot, final.mMatrix)
+
+            shape = MemoryNode(self._uniqueName('polySurfaceShape1'), 'mesh')
+            shape.mBounds = Matrix.transformBounds(bounds, final.mMatrix)
+            shape.mUVSets = uvSets
+            for uvSet in uvSets:
+                us = [ ]
+                vs = [ ]
+                for n, m in meshes:
+                    mesh = self._getMeshShapes(n)[0]
+                    source = mesh.mUVs[uvSet] if uvSet in mesh.mUVs else ([0.0] * mesh.getUVCount(), [0.0] * mesh.getUVCount())
+                    us.extend(source[0])
+                    vs.extend(source[1])
+                shape.mUVs[uvSet] = (us, vs)
+            self._addNode(shape, final)
+
+        # Add a link from the output node so we can track it in the future
+        final.mAttributes['pivotParent'] = None
+        self.connectAttr('%s.outputMesh' % node.getFullPath(), '%s.pivotParent' % final.getFullPath())
+
+        # If there is an output name then use it since polySurfaceN is boring!
+        if inName is not None:
+            self._rename(final, inName.split('|')[-1])
+
+        # Filter out any non-merged nodes
+        for child in list(node.mChildren):
+            if child != final:
+                self._deleteNode(child)
+
+        return final.mName
+
+    def _allDescendants(self, inNode):
+        nodes = [ ]
+        stack = list(reversed(inNode.mChildren))
+        while len(stack) > 0:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(node.mChildren))
+        return nodes
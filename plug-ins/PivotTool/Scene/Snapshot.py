@@ -0,0 +1,197 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+from Backend import SceneBackend
+from ..Gen import Skeleton
+
+
+#
+# Detached copy of the hierarchy queries of another backend
+#   capture() walks the hierarchies through the source backend's query functions and keeps the
+#   results in plain tables (keyed by full path, like ApiBackend), so later edits to the source
+#   can't change what the build reads and the queries can be answered from any thread. Session,
+#   attribute and edit calls are passed on to the source backend.
+#
+class SceneSnapshot(SceneBackend):
+
+    def __init__(self, inSource):
+        SceneBackend.__init__(self)
+
+        self.mSource = inSource
+        self.mFullPaths = { }
+        self.mTypes = { }
+        self.mChildren = { }
+        self.mShapes = { }
+        self.mWorldMatrices = { }
+        self.mWorldPivots = { }
+        self.mWorldBounds = { }
+        self.mLocalBounds = { }
+        self.mSkinClusters = { }
+        self.mInfluences = { }
+        self.mPrimaryInfluences = { }
+
+    # Depth first walk over a node, recording everything the build stages need
+    def _captureHierarchy(self, inNode):
+        source = self.mSource
+
+        stack = [inNode]
+        while len(stack) > 0:
+            name = stack.pop()
+            self.mTypes[name] = source.getNodeType(name)
+
+            shapes = source.getShapes(name)
+            children = source.getChildren(name)
+            self.mShapes[name] = shapes
+            self.mChildren[name] = children
+            for shape in shapes:
+                self.mTypes[shape] = source.getNodeType(shape)
+
+            self.mWorldMatrices[name] = list(source.getWorldMatrix(name))
+            self.mWorldPivots[name] = list(source.getWorldPivot(name))
+            self.mWorldBounds[name] = list(source.getWorldBounds(name))
+            self.mLocalBounds[name] = list(source.getLocalBounds(name))
+
+            cluster = source.getSkinCluster(name)
+            if cluster is not None:
+                self.mSkinClusters[name] = cluster
+                self.mPrimaryInfluences[name] = list(source.getPrimaryInfluences(name))
+                if cluster not in self.mInfluences:
+                    self.mInfluences[cluster] = list(source.getInfluences(cluster))
+
+            stack.extend(reversed(children))
+
+    def isDetached(self):
+        return True
+
+    def _get(self, inTable, inNode):
+        if inNode not in inTable:
+            raise Exception("'%s' wasn't captured by the scene snapshot!" % inNode)
+        return inTable[inNode]
+
+    #
+    # Session, nodes and attributes (passed on to the source)
+    #
+
+    def isInteractive(self):
+        return self.mSource.isInteractive()
+
+    def refresh(self):
+        self.mSource.refresh()
+
+    def suspend(self, inUndo):
+        return self.mSource.suspend(inUndo)
+
+    def resume(self, inToken):
+        self.mSource.resume(inToken)
+
+    def getSelection(self):
+        return self.mSource.getSelection()
+
+    def setSelection(self, inNodes):
+        self.mSource.setSelection(inNodes)
+
+    def objectExists(self, inNode):
+        return self.mSource.objectExists(inNode)
+
+    def getNodeType(self, inNode):
+        if inNode in self.mTypes:
+            return self.mTypes[inNode]
+        return self.mSource.getNodeType(inNode)
+
+    def listNodes(self, inType):
+        return self.mSource.listNodes(inType)
+
+    def getAttr(self, inNode, inAttr):
+        return self.mSource.getAttr(inNode, inAttr)
+
+    def setAttr(self, inNode, inAttr, inValue):
+        self.mSource.setAttr(inNode, inAttr, inValue)
+
+    def getConnections(self, inNode, inAttr):
+        return self.mSource.getConnections(inNode, inAttr)
+
+    #
+    # Hierarchy, transforms, bounds and skinning
+    #
+
+    def getFullPath(self, inNode):
+        return self._get(self.mFullPaths, inNode)
+
+    def getChildren(self, inNode):
+        return self._get(self.mChildren, inNode)
+
+    def getShapes(self, inNode):
+        return self._get(self.mShapes, inNode)
+
+    def getWorldMatrix(self, inNode):
+        return self._get(self.mWorldMatrices, inNode)
+
+    def getWorldPivot(self, inNode):
+        return self._get(self.mWorldPivots, inNode)
+
+    def getWorldBounds(self, inNode):
+        return self._get(self.mWorldBounds, inNode)
+
+    def getLocalBounds(self, inNode):
+        return self._get(self.mLocalBounds, inNode)
+
+    def getSkinCluster(self, inNode):
+        return self.mSkinClusters.get(inNode, None)
+
+    def getInfluences(self, inSkinCluster):
+        return self._get(self.mInfluences, inSkinCluster)
+
+    def getPrimaryInfluences(self, inNode):
+        return self._get(self.mPrimaryInfluences, inNode)
+
+    #
+    # Edits (passed on to the source)
+    #
+
+    def deleteChildren(self, inNode):
+        self.mSource.deleteChildren(inNode)
+
+    def stashChildren(self, inNode):
+        return self.mSource.stashChildren(inNode)
+
+    def restoreChildren(self, inNode, inToken):
+        self.mSource.restoreChildren(inNode, inToken)
+
+    def discardStash(self, inToken):
+        self.mSource.discardStash(inToken)
+
+    def duplicateChildren(self, inSource, inTarget):
+        self.mSource.duplicateChildren(inSource, inTarget)
+
+    def ensureUVSet(self, inNode, inUVSet):
+        self.mSource.ensureUVSet(inNode, inUVSet)
+
+    def setUVs(self, inNode, inUVSet, inUVs, inU, inV):
+        self.mSource.setUVs(inNode, inUVSet, inUVs, inU, inV)
+
+    def combineChildren(self, inNode, inName):
+        return self.mSource.combineChildren(inNode, inName)
+
+
+# Capture the hierarchies beneath inRoots (inclusive) along with any skeletons bound to them
+def capture(inSource, inRoots):
+    snapshot = SceneSnapshot(inSource)
+
+    for root in inRoots:
+        path = inSource.getFullPath(root)
+        snapshot.mFullPaths[root] = path
+        snapshot._captureHierarchy(path)
+
+    # Skeletons can live anywhere in the scene, pull in the hierarchy the influences share
+    for cluster, influences in snapshot.mInfluences.items():
+        base = Skeleton.findCommonBase(influences)
+        if base is None:
+            raise Exception("Influences of '%s' don't share a common root!" % cluster)
+
+        if base not in snapshot.mTypes:
+            snapshot._captureHierarchy(base)
+
+    return snapshot
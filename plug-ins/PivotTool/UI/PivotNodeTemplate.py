@@ -69,7 +69,7 @@ class PivotNodeTemplate(CustomEditorTemplate.QEditorTemplate):
 
     def regenerateButtonClicked(self):
         if self.mView is not None:
-            self.mView.regenerateOutput()
+            self.mView.regenerateOutputDeferred()
 
     def addTextureButtonClicked(self):
         if self.mView is None:
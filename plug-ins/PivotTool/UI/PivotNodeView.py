@@ -7,10 +7,13 @@
 import json
 import os
 import shutil
-import maya.cmds as cmds
 
-from ..Nodes.PivotNodes import PivotNode, PivotPreviewNode, PivotOutputNode
+from ..Nodes import NodeTypes
 from ..Gen import BuildOutput
+from ..Gen.Builder import ElementOrder
+from ..Gen.LOD import DefaultSuffix
+from ..Gen.Texture import Compression
+from ..Scene import Backend
 from ..Gen.RenderType import *
 
 
@@ -51,10 +54,19 @@ class OutputTextureView:
     def getA(self):
         return self.mData['A']
 
+    # Get the block compression this view is written with, one of Texture.Compression (older views won't have one)
+    def getCompression(self):
+        return self.mData.get('Compression', Compression.Uncompressed)
+
     # Get the path that this view was most recently written to
     def getOutputPath(self):
         return self.mData['OutputPath']
 
+    # Get the slice of the texture array at getOutputPath() holding this view, None unless it was
+    # written into a texture array
+    def getArraySlice(self):
+        return self.mData.get('ArraySlice', None)
+
     # Gets a display string for this view
     def getDisplayName(self):
         rgbType = RenderType.fromType(self.getRGB())
@@ -80,9 +92,21 @@ class OutputTextureView:
         self.mData['A'] = inA
         self.mParentModel.onChanged()
 
-    # Set the path to this view on disk
-    def setOutputPath(self, inPath):
+    # Set the block compression this view is written with, builds fail if it can't hold the view's
+    # render types (see Texture.canCompress)
+    def setCompression(self, inCompression):
+
+        if inCompression not in Compression.Items:
+            raise Exception("Unknown compression '%s'!" % inCompression)
+        self.mData['Compression'] = inCompression
+
+        self.mParentModel.onChanged()
+
+    # Set the path to this view on disk, and its slice when the path is a texture array
+    def setOutputPath(self, inPath, inSlice=None):
         self.mData['OutputPath'] = inPath
+        if inSlice is not None or 'ArraySlice' in self.mData:
+            self.mData['ArraySlice'] = inSlice
         self.mParentModel.onChanged()
 
     # Remove this view from its parent container
@@ -95,16 +119,34 @@ class OutputTextureView:
 #
 class AdvancedOptionsView:
 
+    # Values of any options which weren't saved with the node (older nodes won't have all of them)
+    Defaults = {
+        'UVSetName': 'Pivot',
+        'ExportPath': None,
+        'AllowNonPowerOfTwo': False,
+        'MaxTextureSize': 8192,
+        'CollapseGroups': False,
+        'ElementBudget': 0,
+        'ElementOrder': ElementOrder.DepthFirst,
+        'CompactFormats': False,
+        'PackChannels': False,
+        'TextureArrays': False,
+        'Atlas': None,
+        'AtlasSize': 128,
+        'LODSuffix': DefaultSuffix,
+        'BakeAnimation': False,
+        'BakeStartFrame': None,
+        'BakeEndFrame': None,
+        'BakeFrameStep': 1.0
+    }
+
     def __init__(self, inParentModel, inData):
 
         self.mParentModel = inParentModel
-        self.mData = inData
+        self.mData = dict(AdvancedOptionsView.Defaults)
 
-        if self.mData is None:
-            self.mData = {
-                'UVSetName': 'Pivot',
-                'ExportPath': None
-            }
+        if inData is not None:
+            self.mData.update(inData)
 
     # Get the name of the UV set for pivot data
     def getUVSetName(self):
@@ -114,6 +156,65 @@ class AdvancedOptionsView:
     def getExportPath(self):
         return self.mData['ExportPath']
 
+    # Get whether textures may have sides which aren't powers of two (default False)
+    def getAllowNonPowerOfTwo(self):
+        return self.mData['AllowNonPowerOfTwo']
+
+    # Get the largest texture side a build may use (default 8192)
+    def getMaxTextureSize(self):
+        return self.mData['MaxTextureSize']
+
+    # Get whether transforms without geometry are left out of the textures (default False)
+    def getCollapseGroups(self):
+        return self.mData['CollapseGroups']
+
+    # Get the most elements a build may use before small leaves are merged into their parents (default
+    # 0, no budget)
+    def getElementBudget(self):
+        return self.mData['ElementBudget']
+
+    # Get the order elements are numbered in, one of Builder.ElementOrder (default DepthFirst)
+    def getElementOrder(self):
+        return self.mData['ElementOrder']
+
+    # Get whether textures are written in the smallest format which holds their channels (default False)
+    def getCompactFormats(self):
+        return self.mData['CompactFormats']
+
+    # Get whether the outputs of every texture view are packed into as few textures as possible (default False)
+    def getPackChannels(self):
+        return self.mData['PackChannels']
+
+    # Get whether textures sharing a format are written as the slices of one texture array (default False)
+    def getTextureArrays(self):
+        return self.mData['TextureArrays']
+
+    # Get the name of the atlas the set shares its textures with, None for textures of its own (default None)
+    def getAtlas(self):
+        return self.mData['Atlas']
+
+    # Get the width and height of the set's atlas (default 128)
+    def getAtlasSize(self):
+        return self.mData['AtlasSize']
+
+    # Get the pattern stripped from element names before a LOD set's elements are matched with its
+    # primary set's (default '_?LOD[0-9]+$')
+    def getLODSuffix(self):
+        return self.mData['LODSuffix']
+
+    # Get whether builds bake the animation of the elements into textures (default False)
+    def getBakeAnimation(self):
+        return self.mData['BakeAnimation']
+
+    # Get the (start, end) frames animation is baked over, None for either end of the playback range
+    # (default (None, None))
+    def getBakeFrameRange(self):
+        return (self.mData['BakeStartFrame'], self.mData['BakeEndFrame'])
+
+    # Get the number of frames between baked frames (default 1)
+    def getBakeFrameStep(self):
+        return self.mData['BakeFrameStep']
+
     # Set the name of the UV set for pivot data
     def setUVSetName(self, inName):
 
@@ -128,6 +229,111 @@ class AdvancedOptionsView:
         self.mData['ExportPath'] = inPath
         self.mParentModel.onChanged()
 
+    # Set whether textures may have sides which aren't powers of two, only enable this when the
+    # target platform supports them
+    def setAllowNonPowerOfTwo(self, inAllow):
+        self.mData['AllowNonPowerOfTwo'] = bool(inAllow)
+        self.mParentModel.onChanged()
+
+    # Set the largest texture side a build may use
+    def setMaxTextureSize(self, inSize):
+
+        if inSize < 4 or inSize > 8192:
+            raise Exception("Texture sizes have to be between 4 and 8192, not %i!" % inSize)
+        self.mData['MaxTextureSize'] = int(inSize)
+
+        self.mParentModel.onChanged()
+
+    # Set whether transforms without geometry are left out of the textures, elements beneath them
+    # then point at the nearest ancestor with geometry
+    def setCollapseGroups(self, inCollapse):
+        self.mData['CollapseGroups'] = bool(inCollapse)
+        self.mParentModel.onChanged()
+
+    # Set the most elements a build may use, 0 for no budget
+    def setElementBudget(self, inBudget):
+
+        if inBudget < 0:
+            raise Exception("Element budgets can't be negative!")
+        self.mData['ElementBudget'] = int(inBudget)
+
+        self.mParentModel.onChanged()
+
+    # Set the order elements are numbered in, one of Builder.ElementOrder
+    def setElementOrder(self, inOrder):
+
+        if inOrder not in ElementOrder.Items:
+            raise Exception("Unknown element order '%s'!" % inOrder)
+        self.mData['ElementOrder'] = inOrder
+
+        self.mParentModel.onChanged()
+
+    # Set whether textures are written in the smallest format which holds their channels, alpha only
+    # textures then hold their alpha in R. Only enable this when the target engine reads DX10 DDS files.
+    def setCompactFormats(self, inCompact):
+        self.mData['CompactFormats'] = bool(inCompact)
+        self.mParentModel.onChanged()
+
+    # Set whether the outputs of every texture view are packed into as few textures as possible, builds
+    # then write a manifest listing the texture and channels of each output
+    def setPackChannels(self, inPack):
+        self.mData['PackChannels'] = bool(inPack)
+        self.mParentModel.onChanged()
+
+    # Set whether textures sharing a format are written as the slices of one Texture2DArray DDS, texture
+    # views then point at the array and their slice. Arrays always have a DX10 header.
+    def setTextureArrays(self, inArrays):
+        self.mData['TextureArrays'] = bool(inArrays)
+        self.mParentModel.onChanged()
+
+    # Set the name of the atlas the set shares its textures with, None (or empty) for textures of its own
+    #   Sets in the same atlas share one index space and one texture per output, named after the atlas.
+    #   Each set's UVs point into its own region of the atlas (see Gen.Atlas).
+    def setAtlas(self, inName):
+        self.mData['Atlas'] = inName.strip() if inName is not None and len(inName.strip()) > 0 else None
+        self.mParentModel.onChanged()
+
+    # Set the width and height of the set's atlas, every set in an atlas has to use the same size.
+    # Changing it moves every set's UVs, so rebuild all of them afterwards.
+    def setAtlasSize(self, inSize):
+
+        if inSize < 4 or inSize > 8192 or (inSize & (inSize - 1)) != 0:
+            raise Exception("Atlas sizes have to be powers of two between 4 and 8192, not %i!" % inSize)
+        self.mData['AtlasSize'] = int(inSize)
+
+        self.mParentModel.onChanged()
+
+    # Set the regular expression stripped from element names before a LOD set's elements are matched
+    # with its primary set's, None or empty to match names as they are
+    def setLODSuffix(self, inPattern):
+        self.mData['LODSuffix'] = inPattern if inPattern else None
+        self.mParentModel.onChanged()
+
+    # Set whether builds bake the animation of the elements into textures, a row per frame and a column
+    # per element (see Gen.Animation)
+    def setBakeAnimation(self, inBake):
+        self.mData['BakeAnimation'] = bool(inBake)
+        self.mParentModel.onChanged()
+
+    # Set the frames animation is baked over (inclusive), None for either end of the playback range
+    def setBakeFrameRange(self, inStart, inEnd):
+
+        if inStart is not None and inEnd is not None and inEnd < inStart:
+            raise Exception("Animation bakes can't end (%g) before they start (%g)!" % (inEnd, inStart))
+        self.mData['BakeStartFrame'] = float(inStart) if inStart is not None else None
+        self.mData['BakeEndFrame'] = float(inEnd) if inEnd is not None else None
+
+        self.mParentModel.onChanged()
+
+    # Set the number of frames between baked frames, fractions sample between frames
+    def setBakeFrameStep(self, inStep):
+
+        if inStep <= 0.0:
+            raise Exception("Animation bakes need a frame step above 0, not %g!" % inStep)
+        self.mData['BakeFrameStep'] = float(inStep)
+
+        self.mParentModel.onChanged()
+
 
 #
 # View which represents the pivot editor
@@ -149,7 +355,7 @@ class PivotNodeView:
 
     # Get whether a given node type exists
     def _isNodeValid(self, inNodeType):
-        if self.mNodes[inNodeType] is None or not cmds.objExists(self.mNodes[inNodeType]):
+        if self.mNodes[inNodeType] is None or not Backend.getBackend().objectExists(self.mNodes[inNodeType]):
             return False
         return True
 
@@ -174,7 +380,7 @@ class PivotNodeView:
         self._validateRootNode()
 
         # The data is serialized as JSON in an attribute
-        str = cmds.getAttr('%s.nodeData' % self.getRootNode())
+        str = Backend.getBackend().getAttr(self.getRootNode(), 'nodeData')
         str = str if str is not None else '{}'
         self.mData = json.loads(str)
 
@@ -206,7 +412,7 @@ class PivotNodeView:
         self.mData['Advanced'] = self.mAdvancedView.mData
 
         str = json.dumps(self.mData)
-        cmds.setAttr('%s.nodeData' % self.getRootNode(), str, type='string')
+        Backend.getBackend().setAttr(self.getRootNode(), 'nodeData', str)
 
     # Notification of a UI event which dirties the view
     def onChanged(self):
@@ -216,7 +422,7 @@ class PivotNodeView:
     def _getCurrentVisibleNode(self):
 
         for type in range(0, PivotNodeType.Count):
-            if self._isNodeValid(type) and cmds.getAttr('%s.visibility' % self.mNodes[type]):
+            if self._isNodeValid(type) and Backend.getBackend().getAttr(self.mNodes[type], 'visibility'):
                 return type
         return PivotNodeType.Input
 
@@ -236,7 +442,7 @@ class PivotNodeView:
     def setCurrentVisibleNode(self, inNode):
         for type in range(0, PivotNodeType.Count):
             if self._isNodeValid(type):
-                cmds.setAttr('%s.visibility' % self.mNodes[type], inNode == type)
+                Backend.getBackend().setAttr(self.mNodes[type], 'visibility', inNode == type)
 
     # Get the advanced options view
     def getAdvancedView(self):
@@ -246,9 +452,105 @@ class PivotNodeView:
     def getTextureViews(self):
         return self.mTextures
 
+    # Get the path of the manifest written by the last build with packed channels, None if it didn't pack them
+    def getManifestPath(self):
+        return self.mData.get('Manifest', None)
+
+    # Set the path of the manifest written by the last build
+    def setManifestPath(self, inPath):
+        if self.getManifestPath() != inPath:
+            self.mData['Manifest'] = inPath
+            self.onChanged()
+
+    # Get the paths of the animation textures baked by the last build, None if it didn't bake any
+    def getAnimationPaths(self):
+        return self.mData.get('Animation', None)
+
+    # Set the paths of the animation textures baked by the last build
+    def setAnimationPaths(self, inPaths):
+        if self.getAnimationPaths() != inPaths:
+            self.mData['Animation'] = inPaths
+            self.onChanged()
+
+    # Get the (offset, element count) of the region this set has in its atlas, None until it's been built into one
+    def getAtlasRegion(self):
+        region = self.mData.get('AtlasRegion', None)
+        return tuple(region) if region is not None else None
+
+    # Set the region this set has in its atlas, see Builder.placeInAtlas
+    def setAtlasRegion(self, inOffset, inCount):
+        if self.getAtlasRegion() != (inOffset, inCount):
+            self.mData['AtlasRegion'] = [inOffset, inCount]
+            self.onChanged()
+
+    # Get the views of the other pivot sets in this set's atlas
+    def getAtlasViews(self):
+        name = self.getAdvancedView().getAtlas()
+        if name is None:
+            return [ ]
+        return [view for view in allViews() if view.getRootNode() != self.getRootNode() and view.getAdvancedView().getAtlas() == name]
+
+    # Get the pivot node of the primary set this set is a LOD of, None unless it's a LOD (see addLOD)
+    def getLODPrimary(self):
+        return self.mData.get('LODPrimary', None)
+
+    # Get the pivot nodes of the sets registered as LODs of this one
+    def getLODs(self):
+        return list(self.mData.get('LODs', [ ]))
+
+    # Get the view of the primary set this set is a LOD of, None unless it's a LOD of a set which still exists
+    def getLODPrimaryView(self):
+        primary = self.getLODPrimary()
+        if primary is None or not Backend.getBackend().objectExists(primary):
+            return None
+        return fromNode(primary)
+
+    # Get the views of the LOD sets of this set which still exist
+    def getLODViews(self):
+        views = [fromNode(node) for node in self.getLODs() if Backend.getBackend().objectExists(node)]
+        return [view for view in views if view is not None and view.getLODPrimary() == self.getRootNode()]
+
+    # Register the set of inView as a LOD of this set
+    #   LOD sets render no textures. Their elements are matched with this set's by name (see
+    #   Gen.LOD.mapElements) and their UVs point at this set's texels, so every LOD shares this set's
+    #   textures. A set and its LODs are always built together.
+    def addLOD(self, inView):
+
+        if inView.getRootNode() == self.getRootNode():
+            raise Exception("'%s' can't be a LOD of itself!" % self.getRootNode())
+        if self.getLODPrimary() is not None:
+            raise Exception("'%s' is a LOD of '%s', so it can't have LODs of its own!" % (self.getRootNode(), self.getLODPrimary()))
+        if len(inView.getLODViews()) > 0:
+            raise Exception("'%s' has LODs of its own, so it can't be a LOD of '%s'!" % (inView.getRootNode(), self.getRootNode()))
+
+        previous = inView.getLODPrimaryView()
+        if previous is not None and previous.getRootNode() != self.getRootNode():
+            previous.removeLOD(inView)
+
+        inView.mData['LODPrimary'] = self.getRootNode()
+        inView.onChanged()
+
+        if inView.getRootNode() not in self.getLODs():
+            self.mData['LODs'] = self.getLODs() + [inView.getRootNode()]
+            self.onChanged()
+
+    # Unregister the set of inView as a LOD of this set, it renders its own textures again
+    def removeLOD(self, inView):
+
+        self.mData['LODs'] = [node for node in self.getLODs() if node != inView.getRootNode()]
+        self.onChanged()
+
+        if inView.getLODPrimary() == self.getRootNode():
+            inView.mData['LODPrimary'] = None
+            inView.onChanged()
+
     # Trigger regeneration of the output geometry
-    def regenerateOutput(self):
-        BuildOutput.runTasks(self)
+    def regenerateOutput(self, inShowProgress=True, onSuccess=None, onFail=None):
+        return BuildOutput.runTasks(self, inShowProgress, onSuccess, onFail)
+
+    # Trigger regeneration of the output geometry without blocking the UI (the build can be cancelled)
+    def regenerateOutputDeferred(self, inShowProgress=True, onSuccess=None, onFail=None):
+        BuildOutput.runTasksDeferred(self, inShowProgress, onSuccess, onFail)
 
     # Perform a default export of textures
     def exportTextures(self):
@@ -260,6 +562,8 @@ class PivotNodeView:
 
     # Perform an export of textures, but prompt for target directory first
     def exportTexturesAs(self):
+        import maya.cmds as cmds
+
         exportPath = self.getAdvancedView().getExportPath()
         exportPath = cmds.fileDialog2(fm=3, dir=exportPath if exportPath is not None and os.path.exists(exportPath) else None)
 
@@ -270,13 +574,19 @@ class PivotNodeView:
         self.getAdvancedView().setExportPath(exportPath)
         self._exportTextures()
 
-    def _exportTextures(self):
+    # Copy generated textures to the export path, returns lists of (success, fail) messages
+    #   This never prompts or shows dialogs, so it's safe to call from batch jobs
+    def copyTextures(self):
         exportPath = self.getAdvancedView().getExportPath()
+        if exportPath is None or not os.path.exists(exportPath):
+            return ([], ["Can't export %s, export path '%s' doesn't exist!" % (self.getRootNode(), exportPath)])
 
         # Things an easily go wrong here
         success = []
         fail = []
 
+        # Views share textures when their channels are packed, those are only copied once
+        exported = [ ]
         for texture in self.getTextureViews():
             destPath = ''
             try:
@@ -286,6 +596,9 @@ class PivotNodeView:
                     raise Exception("Can't export %s, you need to regenerate outputs first! [ExpNone]" % texture.getDisplayName())
                 if not os.path.exists(sourcePath):
                     raise Exception("Can't export %s, you need to regenerate outputs first! [ExpExist]" % texture.getDisplayName())
+                if sourcePath in exported:
+                    continue
+                exported.append(sourcePath)
 
                 # Copy the generated texture to the export directory
                 destPath = os.path.join(exportPath, os.path.split(sourcePath)[-1])
@@ -296,12 +609,42 @@ class PivotNodeView:
             else:
                 success.append('Exported texture: %s' % destPath)
 
-        resultMessage = '\n'.join(fail + success)
+        # The manifest of packed channels goes along with the textures
+        manifestPath = self.getManifestPath()
+        if manifestPath is not None:
+            try:
+                if not os.path.exists(manifestPath):
+                    raise Exception("Can't export the manifest of %s, you need to regenerate outputs first!" % self.getRootNode())
+                destPath = os.path.join(exportPath, os.path.split(manifestPath)[-1])
+                shutil.copyfile(manifestPath, destPath)
+            except Exception as ex:
+                fail.append(str(ex))
+            else:
+                success.append('Exported manifest: %s' % destPath)
+
+        # As are baked animation textures
+        for sourcePath in self.getAnimationPaths() or [ ]:
+            try:
+                if not os.path.exists(sourcePath):
+                    raise Exception("Can't export the animation of %s, you need to regenerate outputs first!" % self.getRootNode())
+                destPath = os.path.join(exportPath, os.path.split(sourcePath)[-1])
+                shutil.copyfile(sourcePath, destPath)
+            except Exception as ex:
+                fail.append(str(ex))
+            else:
+                success.append('Exported animation: %s' % destPath)
+
+        print '\n'.join(fail + success)
+
+        return (success, fail)
+
+    # Copy generated textures to the export path, showing an error dialog if things broke
+    def _exportTextures(self):
+        success, fail = self.copyTextures()
 
-        # Show an error dialog if things broke
         if len(fail) > 0:
-            cmds.confirmDialog(title='Export Errors', message=resultMessage, icon='critical')
-        print resultMessage
+            import maya.cmds as cmds
+            cmds.confirmDialog(title='Export Errors', message='\n'.join(fail + success), icon='critical')
 
     # Add an output texture to the UI
     def addTextureOutput(self):
@@ -321,17 +664,19 @@ class PivotNodeView:
 # Find the 'root' pivot node from a given selected node
 def _findRootNode(inNode):
 
-    type = cmds.nodeType(inNode)
-    if type == PivotNode.Name:
+    scene = Backend.getBackend()
+
+    type = scene.getNodeType(inNode)
+    if type == NodeTypes.PivotNode:
         return inNode
 
-    if type != PivotOutputNode.Name and type != PivotPreviewNode.Name:
+    if type != NodeTypes.PivotOutputNode and type != NodeTypes.PivotPreviewNode:
         return None
 
-    inputs = cmds.listConnections('%s.inputPivotNode' % inNode)
+    inputs = scene.getConnections(inNode, 'inputPivotNode')
     if inputs:
         input = inputs[0]
-        if cmds.nodeType(input) == PivotNode.Name:
+        if scene.getNodeType(input) == NodeTypes.PivotNode:
             return input
 
         raise Exception('Traversed inputPivotNode link and found \'%s\' which isn\'t correct?' % input)
@@ -346,10 +691,29 @@ def fromNode(inNode):
     if root is None:
         return None
 
-    outputs = cmds.listConnections('%s.outputPivotNode' % root)
-    previews = cmds.listConnections('%s.previewPivotNode' % root)
+    outputs = Backend.getBackend().getConnections(root, 'outputPivotNode')
+    previews = Backend.getBackend().getConnections(root, 'previewPivotNode')
 
-    output = outputs[0] if outputs is not None and len(outputs) > 0 else None
-    preview = previews[0] if previews is not None and len(previews) > 0 else None
+    output = outputs[0] if len(outputs) > 0 else None
+    preview = previews[0] if len(previews) > 0 else None
 
     return PivotNodeView(root, output, preview)
+
+
+# Get a PivotNodeView for every pivot set in the scene
+def allViews():
+    views = [fromNode(node) for node in Backend.getBackend().listNodes(NodeTypes.PivotNode)]
+    return [view for view in views if view is not None]
+
+
+# Regenerate every pivot set in the scene
+#   The scene is extracted once for all sets and undo is suspended for the duration of the build,
+#   returns the build state of each set (failed sets have an mError). inWorkers is the number of
+#   threads used for rendering and writing textures (None for the default)
+def regenerateAll(inShowProgress=True, inTimings=None, inWorkers=None, inSnapshotPath=None):
+    return BuildOutput.runTasksForViews(allViews(), inShowProgress, True, inTimings, inWorkers, inSnapshotPath)
+
+
+# Regenerate every pivot set in the scene without blocking the UI, onComplete(states) is called once it's done
+def regenerateAllDeferred(onComplete=None, inShowProgress=True):
+    BuildOutput.runTasksForViewsDeferred(allViews(), onComplete, inShowProgress, True)
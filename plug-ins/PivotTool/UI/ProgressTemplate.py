@@ -32,8 +32,40 @@ class ProgressTemplate(QtWidgets.QDialog):
         self.setProgress(0.0)
         self.setDisplayString('')
 
+        # Block the rest of Maya while a build runs, the scene mustn't change beneath it
+        self.setModal(True)
+
+        self.mCancelled = False
+        self.mCancelButton.clicked.connect(self.cancelButtonClicked)
+
     def setProgress(self, inPercent):
         self.mProgressBar.setValue(int(inPercent))
 
     def setDisplayString(self, inMessage):
         self.mLabel.setText(inMessage)
+
+    # Get whether the user has asked to cancel
+    def isCancelled(self):
+        return self.mCancelled
+
+    # Handle any pending UI events, so the dialog repaints and the cancel button works during long tasks
+    def processEvents(self):
+        QtWidgets.QApplication.processEvents()
+
+    def cancelButtonClicked(self):
+        self.mCancelled = True
+        self.mCancelButton.setEnabled(False)
+        self.setDisplayString('Cancelling...')
+
+    # Closing the window (or pressing escape) cancels rather than hiding the dialog
+    def closeEvent(self, inEvent):
+        self.cancelButtonClicked()
+        inEvent.ignore()
+
+    def reject(self):
+        self.cancelButtonClicked()
+
+    # Remove the dialog once the build is finished with it
+    def close(self):
+        self.hide()
+        self.deleteLater()
@@ -58,7 +58,7 @@ class FP16():
             else:
                 shift = 10 - int(math.log(self.mMantissa, 2))
                 op.mExponent = 127 - (15 - 1) - shift
-                op.mMantissa = self.mMantissa << (shift + 23 - 10)
+                op.mMantissa = (self.mMantissa << (shift + 23 - 10)) & 0x7fffff  # Drop the implicit leading bit
         elif self.mExponent == 31:
             op.mExponent = 142
             op.mMantissa = 8380416
@@ -195,7 +195,7 @@ class DXGIFormat():
         2, 2, 2, 2, 2, 2, 2,  # R16
         1, 1, 1, 1, 1, 1,  # R8
         0,  # R1?
-        0,  # SharedExp
+        4,  # SharedExp
         0, 0,  # R8G8, B8G8
         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,  # BCn
         2, 2,  # B5G6R5, BGR5A1
@@ -228,6 +228,24 @@ class DXGIFormat():
     def GetDataFormat(inFormat):
         return DXGIFormat.ConvertDataFormat[inFormat]
 
+    # Bytes per 4x4 block of the block compressed formats which can be written
+    BlockSizes = {
+        BC4_UNorm: 8,
+        BC5_UNorm: 16
+    }
+
+    # Get whether a format is block compressed
+    @staticmethod
+    def IsBlockCompressed(inFormat):
+        return inFormat in DXGIFormat.BlockSizes
+
+    # Get the number of bytes a single surface takes up, block compressed formats are stored as 4x4 blocks
+    @staticmethod
+    def GetSurfaceSize(inFormat, inWidth, inHeight):
+        if DXGIFormat.IsBlockCompressed(inFormat):
+            return ((inWidth + 3) / 4) * ((inHeight + 3) / 4) * DXGIFormat.BlockSizes[inFormat]
+        return inWidth * inHeight * DXGIFormat.GetBytesPerPixel(inFormat)
+
 
 #
 # DX10 Resource Dimension
@@ -361,11 +379,44 @@ class SequenceConverter:
     def F32ToF32_Float(inSource):
         return struct.pack('{}f'.format(len(inSource)), *inSource)
 
+    @staticmethod
+    def F32ToU32_UInt(inSource):
+        converted = [int(SequenceConverter.Clamp(round(c), 0, 0xFFFFFFFF)) for c in inSource]
+        return struct.pack('{}I'.format(len(converted)), *converted)
+
     @staticmethod
     def F32ToF16_Float(inSource):
         converted = [Half.GetHalf(c) for c in inSource]
         return struct.pack('{}H'.format(len(converted)), *converted)
 
+    # RGBA floats in 0-1 to 10 bits per colour and 2 bits of alpha
+    @staticmethod
+    def F32ToR10G10B10A2_UNorm(inSource):
+        converted = [ ]
+        for i in range(0, len(inSource) - 3, 4):
+            r, g, b = [int(SequenceConverter.Clamp(math.floor(c * 1023), 0, 1023)) for c in inSource[i:i + 3]]
+            a = int(SequenceConverter.Clamp(math.floor(inSource[i + 3] * 3), 0, 3))
+            converted.append(r | (g << 10) | (b << 20) | (a << 30))
+        return struct.pack('{}I'.format(len(converted)), *converted)
+
+    # RGB floats to three 9-bit mantissas sharing a 5-bit exponent, negative values are clamped to 0
+    #   See the D3D10 functional spec (and GL_EXT_texture_shared_exponent)
+    @staticmethod
+    def F32ToR9G9B9E5_SharedExp(inSource):
+        maxValue = (511.0 / 512.0) * (2 ** 16)
+        converted = [ ]
+        for i in range(0, len(inSource) - 2, 3):
+            rgb = [SequenceConverter.Clamp(c, 0.0, maxValue) for c in inSource[i:i + 3]]
+            largest = max(rgb)
+
+            exponent = max(-16, int(math.floor(math.log(largest, 2)))) + 16 if largest > 0 else 0
+            if int(math.floor(largest / 2.0 ** (exponent - 24) + 0.5)) == 512:
+                exponent = exponent + 1
+
+            r, g, b = [int(math.floor(c / 2.0 ** (exponent - 24) + 0.5)) for c in rgb]
+            converted.append(r | (g << 9) | (b << 18) | (exponent << 27))
+        return struct.pack('{}I'.format(len(converted)), *converted)
+
     @staticmethod
     def GetConverters():
         # Automatic conversion types resolved to functions
@@ -373,7 +424,8 @@ class SequenceConverter:
             DataFormat.Float32: {
                 DataFormat.UInt8_UNorm: SequenceConverter.F32ToI8_UNorm,
                 DataFormat.Float32: SequenceConverter.F32ToF32_Float,
-                DataFormat.Float16: SequenceConverter.F32ToF16_Float
+                DataFormat.Float16: SequenceConverter.F32ToF16_Float,
+                DataFormat.UInt32: SequenceConverter.F32ToU32_UInt
             },
             DataFormat.SInt32: {
                 DataFormat.UInt8_UNorm: SequenceConverter.I32ToI8_UNorm,
@@ -385,6 +437,14 @@ class SequenceConverter:
             }
         }
 
+    # Formats which pack several channels into one value, resolved to functions taking Float32 data
+    @staticmethod
+    def GetPackers():
+        return {
+            DXGIFormat.R10G10B10A2_UNorm: SequenceConverter.F32ToR10G10B10A2_UNorm,
+            DXGIFormat.R9G9B9E5_SharedExp: SequenceConverter.F32ToR9G9B9E5_SharedExp
+        }
+
     @staticmethod
     def GetBytes(inSource, inSourceFormat, inTargetFormat):
         converters = SequenceConverter.GetConverters()
@@ -397,41 +457,309 @@ class SequenceConverter:
         return source[inTargetFormat](inSource)
 
 
+# Levels of an 8 value BC4 palette, from the low endpoint (0) to the high one (7), resolved to the index
+# which picks them when the high endpoint is stored first
+BC4LevelIndices = [1, 7, 6, 5, 4, 3, 2, 0]
+
+
 #
-# Write a 2D texture to disk
+# BC4/BC5 block encoder
+#   Channels are quantized to 8 bits as F32ToI8_UNorm does, then each 4x4 block stores its largest and
+#   smallest value and a 3-bit index per texel, picking one of 8 evenly spaced levels between the two.
+#   Finding the nearest level is a table lookup per texel (see GetLevelTables), so a block only costs a
+#   few list operations. BC5 blocks are a BC4 block of red followed by one of green.
 #
-def WriteTexture2D(inPath, inWidth, inHeight, inFormat, inMipCount, inData, inSourceFormat):
+class BlockEncoder:
+
+    # Channels per texel of each block compressed format
+    ChannelCounts = {
+        DXGIFormat.BC4_UNorm: 1,
+        DXGIFormat.BC5_UNorm: 2
+    }
+
+    # Level tables, built on first use
+    LevelTables = None
+
+    # Get the number of channels per texel of a block compressed format
+    @staticmethod
+    def GetChannelCount(inFormat):
+        return BlockEncoder.ChannelCounts[inFormat]
+
+    # Get the tables mapping a value's offset from the low endpoint to the nearest level, by block range
+    @staticmethod
+    def GetLevelTables():
+        if BlockEncoder.LevelTables is None:
+            BlockEncoder.LevelTables = [[0]] + [[(offset * 14 + span) / (span * 2) for offset in range(0, span + 1)] for span in range(1, 256)]
+        return BlockEncoder.LevelTables
+
+    # Encode one channel of 8-bit values (inStride per texel, starting at inChannel) into BC4 blocks
+    #   Returns (blocks, decoded), the 8 byte blocks in row order and the 0-255 value each texel decodes
+    #   to. Blocks hanging over the edge repeat the last row and column.
+    @staticmethod
+    def EncodeBC4Channel(inValues, inWidth, inHeight, inStride=1, inChannel=0):
+        tables = BlockEncoder.GetLevelTables()
+        offsets = [y * inWidth + x for y in range(4) for x in range(4)]
+
+        blocks = [ ]
+        decoded = [0.0] * (inWidth * inHeight)
+        for by in range(0, inHeight, 4):
+            for bx in range(0, inWidth, 4):
+                if bx + 4 <= inWidth and by + 4 <= inHeight:
+                    texels = [by * inWidth + bx + offset for offset in offsets]
+                else:
+                    texels = [min(by + y, inHeight - 1) * inWidth + min(bx + x, inWidth - 1) for y in range(4) for x in range(4)]
+
+                values = [inValues[texel * inStride + inChannel] for texel in texels]
+                high = max(values)
+                low = min(values)
+
+                # Equal endpoints select the 6 value palette, where index 0 is the first endpoint
+                if high == low:
+                    blocks.append(struct.pack('<BBHI', high, low, 0, 0))
+                    for texel in texels:
+                        decoded[texel] = float(high)
+                    continue
+
+                table = tables[high - low]
+                levels = [table[value - low] for value in values]
+
+                bits = 0
+                for i, level in enumerate(levels):
+                    bits = bits | (BC4LevelIndices[level] << (i * 3))
+                blocks.append(struct.pack('<BBHI', high, low, bits & 0xffff, bits >> 16))
+
+                palette = [(level * high + (7 - level) * low) / 7.0 for level in range(8)]
+                for texel, level in zip(texels, levels):
+                    decoded[texel] = palette[level]
+
+        return (blocks, decoded)
+
+    # Encode Float32 data, laid out as BlockEncoder.GetChannelCount values per texel, into a block compressed format
+    #   Returns (data, decoded), the encoded bytes and the Float32 values the texels decode to, laid out as inSource
+    @staticmethod
+    def Encode(inFormat, inSource, inWidth, inHeight):
+        channels = BlockEncoder.GetChannelCount(inFormat)
+        if len(inSource) != inWidth * inHeight * channels:
+            raise Exception("Expected %i values to encode %ix%i texels as %s, got %i" % (inWidth * inHeight * channels, inWidth, inHeight, inFormat, len(inSource)))
+
+        values = [int(SequenceConverter.Clamp(math.floor(c * 255), 0, 255)) for c in inSource]
+        encoded = [BlockEncoder.EncodeBC4Channel(values, inWidth, inHeight, channels, channel) for channel in range(channels)]
+
+        data = ''.join([''.join(blocks) for blocks in zip(*[blocks for blocks, decoded in encoded])])
+        decoded = [value / 255.0 for texel in zip(*[decoded for blocks, decoded in encoded]) for value in texel]
+        return (data, decoded)
+
+
+# Legacy pixel formats (flags, FourCC, bit count, R/G/B/A masks) of the formats which have one
+LegacyPixelFormats = {
+    DXGIFormat.R16G16B16A16_Float: (DDPF.FourCC, 0x71, 0, 0, 0, 0, 0),  # D3DFMT_A16B16G16R16F
+    DXGIFormat.B8G8R8A8_UNorm: (DDPF.RGB | DDPF.AlphaPixels, 0, 32, 0x00ff0000, 0x0000ff00, 0x000000ff, 0xff000000),
+    DXGIFormat.R16G16_Float: (DDPF.FourCC, 0x70, 0, 0, 0, 0, 0),  # D3DFMT_G16R16F
+    DXGIFormat.R16_Float: (DDPF.FourCC, 0x6F, 0, 0, 0, 0, 0),  # D3DFMT_R16F
+    DXGIFormat.R8_UNorm: (DDPF.Luminance, 0, 8, 0xff, 0, 0, 0),  # D3DFMT_L8
+    DXGIFormat.BC4_UNorm: (DDPF.FourCC, 0x31495441, 0, 0, 0, 0, 0),  # 'ATI1'
+    DXGIFormat.BC5_UNorm: (DDPF.FourCC, 0x32495441, 0, 0, 0, 0, 0)  # 'ATI2'
+}
+
+# Formats without a legacy equivalent, these are written with a DX10 header
+DX10Formats = [DXGIFormat.R32_Float, DXGIFormat.R32_UInt, DXGIFormat.R8G8_UNorm, DXGIFormat.R10G10B10A2_UNorm, DXGIFormat.R9G9B9E5_SharedExp]
+
+
+#
+# Build the header of a 2D texture (or texture array)
+#   Arrays always get a DX10 header, legacy headers can't describe them
+#
+def CreateHeader(inWidth, inHeight, inFormat, inMipCount, inArraySize=1):
     dds = DDSFile()
 
     dds.mHeader = DDS_HEADER()
-    dds.mHeader.mFlags = DDSD.Caps | DDSD.Height | DDSD.Width | DDSD.PixelFormat
+    dds.mHeader.mFlags = DDSD.Caps | DDSD.Height | DDSD.Width | DDSD.PixelFormat | DDSD.MipMapCount | DDSD.Pitch
     dds.mHeader.mHeight = inHeight
     dds.mHeader.mWidth = inWidth
-    dds.mHeader.mPitchOrLinearSize = inWidth * DXGIFormat.GetBytesPerPixel(inFormat)  # NOTE: This won't work with compressed formats!
+    dds.mHeader.mPitchOrLinearSize = inWidth * DXGIFormat.GetBytesPerPixel(inFormat)
+    if DXGIFormat.IsBlockCompressed(inFormat):
+        dds.mHeader.mFlags = (dds.mHeader.mFlags & ~DDSD.Pitch) | DDSD.LinearSize
+        dds.mHeader.mPitchOrLinearSize = DXGIFormat.GetSurfaceSize(inFormat, inWidth, inHeight)
     dds.mHeader.mDepth = 1
     dds.mHeader.mMipMapCount = inMipCount
-    dds.mHeader.Caps = 0x1000  # DDSCAPS_TEXTURE
+    dds.mHeader.mCaps = 0x1000  # DDSCAPS_TEXTURE
+    if inMipCount > 1:
+        dds.mHeader.mCaps = dds.mHeader.mCaps | 0x400008  # DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
 
     # JB: Epic doesn't support modern DDS files, resort to legacy :/
-    # dds.mHeader.mPixelFormat.mFlags = DDPF.FourCC
-    # dds.mHeader.mPixelFormat.mFourCC = 0x30315844 # DX10
-
-    if inFormat == DXGIFormat.R16G16B16A16_Float:
-        dds.mHeader.mPixelFormat.mFlags = DDPF.FourCC
-        dds.mHeader.mPixelFormat.mFourCC = 0x71
-    elif inFormat == DXGIFormat.B8G8R8A8_UNorm:
-        dds.mHeader.mPixelFormat.mFlags = DDPF.RGB | DDPF.Alpha
-        dds.mHeader.mPixelFormat.mFourCC = 0
-        dds.mHeader.mPixelFormat.mRGBBitCount = 32
-        dds.mHeader.mPixelFormat.mRBitMask = 0x00ff0000
-        dds.mHeader.mPixelFormat.mGBitMask = 0x0000ff00
-        dds.mHeader.mPixelFormat.mBBitMask = 0x000000ff
-        dds.mHeader.mPixelFormat.mABitMask = 0xff000000
+    #     Only formats without a legacy equivalent (see DX10Formats) get a DX10 header
+    pf = dds.mHeader.mPixelFormat
+    if inFormat not in LegacyPixelFormats and inFormat not in DX10Formats:
+        raise Exception("Can't save to format: %s" % inFormat)
+    if inFormat in LegacyPixelFormats and inArraySize == 1:
+        pf.mFlags, pf.mFourCC, pf.mRGBBitCount, pf.mRBitMask, pf.mGBitMask, pf.mBBitMask, pf.mABitMask = LegacyPixelFormats[inFormat]
     else:
-        raise Exception("Can't save to legacy format: %s" % inFormat)
+        pf.mFlags = DDPF.FourCC
+        pf.mFourCC = 0x30315844  # DX10
     dds.mHeaderDX10.mDXGIFormat = inFormat
     dds.mHeaderDX10.mResourceDimension = ResourceDimension.Texture2D
+    dds.mHeaderDX10.mArraySize = inArraySize
+
+    return dds
+
+
+#
+# Convert Float32 (or integer) data into the bytes of a single surface
+#   Returns (data, decoded), decoded holds the values block compressed texels decode to (see
+#   BlockEncoder.Encode) and is None for other formats
+#
+def EncodeSurface(inWidth, inHeight, inFormat, inData, inSourceFormat):
+
+    # Packed and block compressed formats don't have a data format of their own
+    packers = SequenceConverter.GetPackers()
+    if DXGIFormat.IsBlockCompressed(inFormat):
+        if inSourceFormat != DataFormat.Float32:
+            raise Exception("Can't block compress format '%s' into %s" % (inSourceFormat, inFormat))
+        return BlockEncoder.Encode(inFormat, inData, inWidth, inHeight)
+    if inFormat in packers:
+        if inSourceFormat != DataFormat.Float32:
+            raise Exception("Can't pack format '%s' into %s" % (inSourceFormat, inFormat))
+        return (packers[inFormat](inData), None)
+    return (SequenceConverter.GetBytes(inData, inSourceFormat, DXGIFormat.GetDataFormat(inFormat)), None)
+
+
+#
+# Write a 2D texture to disk
+#   Block compressed formats take Float32 data with BlockEncoder.GetChannelCount values per texel. For
+#   those this returns the values the texels decode to (see BlockEncoder.Encode), otherwise None.
+#
+def WriteTexture2D(inPath, inWidth, inHeight, inFormat, inMipCount, inData, inSourceFormat):
+    dds = CreateHeader(inWidth, inHeight, inFormat, inMipCount)
+    data, decoded = EncodeSurface(inWidth, inHeight, inFormat, inData, inSourceFormat)
 
     with open(inPath, 'w+b') as fp:
         fp.write(dds.Serialize())
-        fp.write(SequenceConverter.GetBytes(inData, inSourceFormat, DXGIFormat.GetDataFormat(inFormat)))
+        fp.write(data)
+
+    return decoded
+
+
+# Legacy header layout (magic, DDS_HEADER and DDS_PIXELFORMAT) and the DX10 extension, for reading
+HeaderStruct = struct.Struct('<4s31I')
+HeaderDX10Struct = struct.Struct('<5I')
+
+
+#
+# Read the header of a DDS file written by WriteTexture2D (or TextureArrayWriter)
+#   Returns a dictionary of width, height, format, mipCount, arraySize and dataOffset (where the
+#   surfaces start)
+#
+def ReadHeader(inPath):
+    with open(inPath, 'rb') as fp:
+        data = fp.read(HeaderStruct.size + HeaderDX10Struct.size)
+    if len(data) < HeaderStruct.size or data[0:4] != 'DDS ':
+        raise Exception("'%s' isn't a DDS file!" % inPath)
+
+    values = HeaderStruct.unpack(data[0:HeaderStruct.size])
+    header = { 'width': values[4], 'height': values[3], 'mipCount': max(1, values[7]), 'arraySize': 1, 'dataOffset': HeaderStruct.size }
+
+    # Pixel format flags, FourCC, bit count and masks
+    pixelFormat = values[20:27]
+    if pixelFormat[0] & DDPF.FourCC and pixelFormat[1] == 0x30315844:
+        if len(data) < HeaderStruct.size + HeaderDX10Struct.size:
+            raise Exception("'%s' is missing its DX10 header!" % inPath)
+        dx10 = HeaderDX10Struct.unpack(data[HeaderStruct.size:])
+        header.update({ 'format': dx10[0], 'arraySize': dx10[3], 'dataOffset': HeaderStruct.size + HeaderDX10Struct.size })
+        return header
+
+    formats = [format for format, legacy in LegacyPixelFormats.items() if tuple(legacy) == tuple(pixelFormat)]
+    if len(formats) == 0:
+        raise Exception("'%s' has a pixel format LwDDS can't read!" % inPath)
+    header['format'] = formats[0]
+    return header
+
+
+#
+# Streams the slices of a 2D texture array to disk one at a time, so only one slice is held in memory
+#   Every slice has the array's size and format (and a single mip)
+#
+class TextureArrayWriter:
+
+    def __init__(self, inPath, inWidth, inHeight, inFormat, inArraySize):
+        self.mWidth = inWidth
+        self.mHeight = inHeight
+        self.mFormat = inFormat
+        self.mArraySize = inArraySize
+        self.mSliceCount = 0
+
+        self.mFile = open(inPath, 'w+b')
+        self.mFile.write(CreateHeader(inWidth, inHeight, inFormat, 1, inArraySize).Serialize())
+
+    # Write the next slice, see WriteTexture2D. Returns the values block compressed texels decode to.
+    def WriteSlice(self, inData, inSourceFormat):
+        self._CheckSliceCount()
+        data, decoded = EncodeSurface(self.mWidth, self.mHeight, self.mFormat, inData, inSourceFormat)
+        self.mFile.write(data)
+        return decoded
+
+    # Copy the next slice from a single texture DDS file of the same size and format, in chunks
+    def CopySlice(self, inPath):
+        self._CheckSliceCount()
+
+        header = ReadHeader(inPath)
+        if (header['width'], header['height'], header['format'], header['mipCount'], header['arraySize']) != (self.mWidth, self.mHeight, self.mFormat, 1, 1):
+            raise Exception("'%s' (%ix%i, format %i) can't be a slice of a %ix%i, format %i texture array!" % (inPath, header['width'], header['height'], header['format'], self.mWidth, self.mHeight, self.mFormat))
+
+        remaining = DXGIFormat.GetSurfaceSize(self.mFormat, self.mWidth, self.mHeight)
+        with open(inPath, 'rb') as fp:
+            fp.seek(header['dataOffset'])
+            while remaining > 0:
+                chunk = fp.read(min(remaining, 1 << 20))
+                if len(chunk) == 0:
+                    raise Exception("'%s' is truncated!" % inPath)
+                self.mFile.write(chunk)
+                remaining = remaining - len(chunk)
+
+    # Close the file, every slice has to have been written
+    def Close(self):
+        self.mFile.close()
+        if self.mSliceCount != self.mArraySize:
+            raise Exception("Texture array has %i of its %i slices!" % (self.mSliceCount, self.mArraySize))
+
+    def _CheckSliceCount(self):
+        if self.mSliceCount >= self.mArraySize:
+            raise Exception("Texture array only has %i slices!" % self.mArraySize)
+        self.mSliceCount = self.mSliceCount + 1
+
+
+#
+# Streams the rows of a 2D texture to disk as they're produced, so only one row is held in memory
+#   Block compressed formats encode 4 rows at a time, so they can't be written this way
+#
+class TextureRowWriter:
+
+    def __init__(self, inPath, inWidth, inHeight, inFormat):
+        if DXGIFormat.IsBlockCompressed(inFormat):
+            raise Exception("Block compressed textures can't be written a row at a time!")
+
+        self.mWidth = inWidth
+        self.mHeight = inHeight
+        self.mFormat = inFormat
+        self.mRowCount = 0
+
+        self.mFile = open(inPath, 'w+b')
+        self.mFile.write(CreateHeader(inWidth, inHeight, inFormat, 1).Serialize())
+
+    # Write the next row, inData holds a row of texels as WriteTexture2D takes them
+    def WriteRow(self, inData, inSourceFormat):
+        if self.mRowCount >= self.mHeight:
+            raise Exception("Texture only has %i rows!" % self.mHeight)
+        self.mRowCount = self.mRowCount + 1
+
+        data, decoded = EncodeSurface(self.mWidth, 1, self.mFormat, inData, inSourceFormat)
+        self.mFile.write(data)
+
+    # Close the file, every row has to have been written
+    def Close(self):
+        self.mFile.close()
+        if self.mRowCount != self.mHeight:
+            raise Exception("Texture has %i of its %i rows!" % (self.mRowCount, self.mHeight))
+
+    # Close the file of a texture which won't be finished, without checking its rows
+    def Abort(self):
+        self.mFile.close()
@@ -0,0 +1,123 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+"""
+
+import math
+
+#
+# 4x4 matrix ops, matrices are flat lists of 16 floats laid out like Maya's (row vectors,
+# translation in elements 12-14) so they match the output of xform -q -m
+#
+
+# Rotate orders, matching the rotateOrder enum on Maya transforms
+RotateOrders = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+
+# Get an identity matrix
+def identity():
+    return [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+
+# Get a translation matrix
+def translation(inVec):
+    m = identity()
+    m[12] = inVec[0]
+    m[13] = inVec[1]
+    m[14] = inVec[2]
+    return m
+
+
+# Get a scale matrix
+def scale(inVec):
+    m = identity()
+    m[0] = inVec[0]
+    m[5] = inVec[1]
+    m[10] = inVec[2]
+    return m
+
+
+# Get a rotation matrix around a single axis (0 = X, 1 = Y, 2 = Z), inAngle is in radians
+def rotation(inAxis, inAngle):
+    c = math.cos(inAngle)
+    s = math.sin(inAngle)
+    m = identity()
+
+    if inAxis == 0:
+        m[5], m[6], m[9], m[10] = c, s, -s, c
+    elif inAxis == 1:
+        m[0], m[2], m[8], m[10] = c, -s, s, c
+    else:
+        m[0], m[1], m[4], m[5] = c, s, -s, c
+    return m
+
+
+# Multiply inA by inB (inA is applied first)
+def multiply(inA, inB):
+    out = [0.0] * 16
+    for row in range(4):
+        a0, a1, a2, a3 = inA[row * 4:row * 4 + 4]
+        for col in range(4):
+            out[row * 4 + col] = a0 * inB[col] + a1 * inB[4 + col] + a2 * inB[8 + col] + a3 * inB[12 + col]
+    return out
+
+
+# Get the inverse of a matrix (Gauss-Jordan, raises on singular matrices)
+def inverse(inM):
+    m = [list(inM[row * 4:row * 4 + 4]) + [1.0 if i == row else 0.0 for i in range(4)] for row in range(4)]
+
+    for col in range(4):
+        pivot = max(range(col, 4), key=lambda row: abs(m[row][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise Exception("Can't invert a singular matrix!")
+        m[col], m[pivot] = m[pivot], m[col]
+
+        scaleBy = 1.0 / m[col][col]
+        m[col] = [v * scaleBy for v in m[col]]
+
+        for row in range(4):
+            if row != col and m[row][col] != 0.0:
+                factor = m[row][col]
+                m[row] = [v - factor * p for v, p in zip(m[row], m[col])]
+
+    return [v for row in m for v in row[4:8]]
+
+
+# Transform a point by a matrix
+def transformPoint(inPoint, inM):
+    x, y, z = inPoint[0], inPoint[1], inPoint[2]
+    return [
+        x * inM[0] + y * inM[4] + z * inM[8] + inM[12],
+        x * inM[1] + y * inM[5] + z * inM[9] + inM[13],
+        x * inM[2] + y * inM[6] + z * inM[10] + inM[14]
+    ]
+
+
+# Transform an axis aligned box (minX, minY, minZ, maxX, maxY, maxZ) and get the box around the result
+def transformBounds(inBounds, inM):
+    corners = [transformPoint([inBounds[i], inBounds[j], inBounds[k]], inM) for i in (0, 3) for j in (1, 4) for k in (2, 5)]
+    return [min([c[axis] for c in corners]) for axis in range(3)] + [max([c[axis] for c in corners]) for axis in range(3)]
+
+
+# Get the box around a list of boxes (None if the list is empty)
+def unionBounds(inBounds):
+    if len(inBounds) == 0:
+        return None
+    return [min([b[axis] for b in inBounds]) for axis in range(3)] + [max([b[axis + 3] for b in inBounds]) for axis in range(3)]
+
+
+# Build a local transform matrix the way a Maya transform does (shear and rotateAxis are ignored)
+#   inRotate is in degrees, inRotateOrder is an index into RotateOrders
+def compose(inTranslate, inRotate, inScale, inRotateOrder=0, inRotatePivot=(0.0, 0.0, 0.0), inScalePivot=(0.0, 0.0, 0.0), inRotatePivotTranslate=(0.0, 0.0, 0.0), inScalePivotTranslate=(0.0, 0.0, 0.0)):
+
+    m = translation([-c for c in inScalePivot])
+    m = multiply(m, scale(inScale))
+    m = multiply(m, translation([inScalePivot[i] + inScalePivotTranslate[i] - inRotatePivot[i] for i in range(3)]))
+
+    for axis in RotateOrders[inRotateOrder]:
+        index = 'xyz'.index(axis)
+        m = multiply(m, rotation(index, math.radians(inRotate[index])))
+
+    m = multiply(m, translation([inRotatePivot[i] + inRotatePivotTranslate[i] + inTranslate[i] for i in range(3)]))
+    return m
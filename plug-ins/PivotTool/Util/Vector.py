@@ -38,8 +38,8 @@ def dotAbs(inA, inB):
 
 # Get a normalized version of inVec
 def normalize(inVec):
-    mag = math.sqrt(abs(sum(inVec)))
-    return [c / mag for c in inVec]
+    mag = math.sqrt(dot(inVec, inVec))
+    return [c / mag for c in inVec] if mag > 0.0 else list(inVec)
 
 
 # Scale and bias the vector from [-1, 1] to [0, 1] space
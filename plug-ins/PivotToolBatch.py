@@ -0,0 +1,47 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+
+    Headless regeneration of every pivot set in a list of scenes, run with mayapy:
+
+        mayapy PivotToolBatch.py -j 8 --report report.json scenes/*.ma
+        mayapy PivotToolBatch.py @scene_list.txt
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Make the PivotTool module importable, the plugin loader usually does this for us
+toolPath = os.path.abspath(os.path.dirname(__file__))
+if toolPath not in sys.path:
+    sys.path.append(toolPath)
+
+import PivotTool.Batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate pivot outputs for a list of Maya scenes', fromfile_prefix_chars='@')
+    parser.add_argument('scenes', nargs='+', help='Scene files to regenerate (use @file to read a list of scenes)')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Number of mayapy worker processes (default: number of cores)')
+    parser.add_argument('--report', default=None, help='Write a JSON timing/failure report to this path')
+    parser.add_argument('--no-save', action='store_true', help="Don't save scenes after regenerating")
+    parser.add_argument('--no-export', action='store_true', help="Don't copy textures to each set's export path")
+    parser.add_argument('--snapshot-dir', default=None, help='Save a snapshot of each scene\'s pivot sets to this directory, for PivotToolRender.py')
+    parser.add_argument('--scenes-per-worker', type=int, default=0, help='Restart workers after this many scenes (default: never)')
+    args = parser.parse_args()
+
+    summary = PivotTool.Batch.runBatch(args.scenes, args.jobs, not args.no_save, not args.no_export, args.scenes_per_worker, args.snapshot_dir)
+
+    PivotTool.Batch.printSummary(summary)
+    if args.report is not None:
+        PivotTool.Batch.writeReport(args.report, summary)
+
+    return 1 if summary['failed'] > 0 else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+
+    Benchmarks the regeneration pipeline on synthetic pivot sets. The in-memory backend runs with
+    any Python 2.7 interpreter, the maya backend needs mayapy:
+
+        python PivotToolBench.py --suite quick --output results.json
+        python PivotToolBench.py --suite full --baseline baseline.json
+        mayapy PivotToolBench.py --backend maya --suite scaling --case scale_1k
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Make the PivotTool module importable, the plugin loader usually does this for us
+toolPath = os.path.abspath(os.path.dirname(__file__))
+if toolPath not in sys.path:
+    sys.path.append(toolPath)
+
+import PivotTool.Bench.Benchmark as Benchmark
+import PivotTool.Gen.Tasks as Tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pivot regeneration on synthetic scenes')
+    parser.add_argument('--backend', choices=Benchmark.Backends, default='memory', help='Scene backend to run against (default: memory)')
+    parser.add_argument('--suite', choices=sorted(Benchmark.Suites.keys()), default='quick', help='Suite of cases to run (default: quick)')
+    parser.add_argument('--case', action='append', default=None, help='Only run the named case (can be repeated)')
+    parser.add_argument('--repeat', type=int, default=1, help='Run each case N times and keep the fastest (default: 1)')
+    parser.add_argument('--workers', type=int, default=None, help='Threads used to render and write textures, 0 runs every stage in sequence (default: %i)' % Tasks.DefaultWorkers)
+    parser.add_argument('--no-render-process', action='store_true', help='Render and write textures in the build process rather than the render process')
+    parser.add_argument('--in-process', action='store_true', help="Run every case in this process (peak memory becomes a high water mark)")
+    parser.add_argument('--output', default=None, help='Write JSON results to this path')
+    parser.add_argument('--baseline', default=None, help='Compare against JSON results from a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown counted as a regression (default: 0.1)')
+    args = parser.parse_args()
+
+    cases = Benchmark.Suites[args.suite]
+    if args.case is not None:
+        cases = [case for case in cases if case['name'] in args.case]
+        if len(cases) == 0:
+            parser.error('No cases in suite %s match: %s' % (args.suite, ', '.join(args.case)))
+
+    results = Benchmark.runSuite(cases, args.backend, args.repeat, not args.in_process, args.workers, not args.no_render_process)
+
+    regressions = None
+    if args.baseline is not None:
+        regressions = Benchmark.compareResults(results, Benchmark.loadResults(args.baseline), args.threshold)
+
+    Benchmark.printResults(results, regressions)
+    if args.output is not None:
+        Benchmark.writeResults(args.output, results)
+
+    failed = len([True for case in results['cases'] if not case['success']])
+    return 1 if failed > 0 or (regressions is not None and len(regressions) > 0) else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+
+    Micro-benchmarks and exhaustive correctness checks for the half float and DDS codecs, no Maya
+    required:
+
+        python PivotToolCodecBench.py --output codecs.json
+        python PivotToolCodecBench.py --max-size 8192 --baseline codecs.json
+        python PivotToolCodecBench.py --checks-only --reference-dir texconv_output/
+"""
+
+import argparse
+import os
+import sys
+
+# Make the PivotTool module importable, the plugin loader usually does this for us
+toolPath = os.path.abspath(os.path.dirname(__file__))
+if toolPath not in sys.path:
+    sys.path.append(toolPath)
+
+import PivotTool.Bench.Codecs as Codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and verify the half float and DDS codecs')
+    parser.add_argument('--max-size', type=int, default=1024, choices=Codecs.Sizes, help='Largest texture size to benchmark (default: 1024, 8192 needs several GB of memory)')
+    parser.add_argument('--min-time', type=float, default=0.25, help='Repeat each measurement for at least this many seconds (default: 0.25)')
+    parser.add_argument('--checks-only', action='store_true', help='Only run the correctness checks')
+    parser.add_argument('--benchmark-only', action='store_true', help='Only run the throughput benchmark')
+    parser.add_argument('--reference-dir', default=None, help='Folder of known good .dds files to check headers against')
+    parser.add_argument('--output', default=None, help='Write JSON results to this path')
+    parser.add_argument('--baseline', default=None, help='Compare throughput against JSON results from a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative throughput drop counted as a regression (default: 0.1)')
+    args = parser.parse_args()
+
+    results = Codecs.runSuite(args.max_size, args.min_time, not args.checks_only, not args.benchmark_only, args.reference_dir)
+
+    regressions = None
+    if args.baseline is not None:
+        import PivotTool.Bench.Benchmark as Benchmark
+        regressions = Codecs.compareResults(results, Benchmark.loadResults(args.baseline), args.threshold)
+
+    Codecs.printResults(results, regressions)
+    if args.output is not None:
+        import PivotTool.Bench.Benchmark as Benchmark
+        Benchmark.writeResults(args.output, results)
+
+    failed = len([True for check in results['checks'].values() if not check['passed']])
+    return 1 if failed > 0 or (regressions is not None and len(regressions) > 0) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+    This module is part of the PivotToolPlugin.
+
+    For license details please check: PivotTool-License.txt
+
+    Renders the textures of pivot sets from a snapshot (see PivotToolBatch.py --snapshot-dir) or a
+    Maya ASCII scene, no Maya needed:
+
+        python PivotToolRender.py scene.pivotsnap --output-dir textures/
+        python PivotToolRender.py scene.ma --output-dir textures/ --texture PivotPosition:ParentIndexFloat
+        python PivotToolRender.py scene.ma --output-dir textures/ --texture NoRender:XExtent:BC4
+        python PivotToolRender.py scene.pivotsnap --output-dir textures/ --set-arrays
+        python PivotToolRender.py scene.ma --save-snapshot scene.pivotsnap
+        python PivotToolRender.py scene.pivotsnap --list
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Make the PivotTool module importable
+toolPath = os.path.abspath(os.path.dirname(__file__))
+if toolPath not in sys.path:
+    sys.path.append(toolPath)
+
+import PivotTool.Gen.SnapshotFile
+import PivotTool.Render
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render pivot textures from a snapshot or Maya ASCII scene without Maya')
+    parser.add_argument('snapshot', help='Snapshot file written by a build, or a .ma scene')
+    parser.add_argument('--output-dir', default='.', help='Directory the textures are written to (default: current directory)')
+    parser.add_argument('--texture', action='append', default=None, help='Render this RGB:Alpha pair (eg. PivotPosition:ParentIndexFloat) rather than the saved textures, can be repeated. Append :BC4 or :BC5 to block compress it')
+    parser.add_argument('--set', action='append', default=None, help='Only render the named pivot set (can be repeated)')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Number of worker processes (default: number of cores)')
+    parser.add_argument('--set-arrays', action='store_true', help='Combine the same texture across sets into a texture array, where their size and format match')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for random value textures (default: 0)')
+    parser.add_argument('--report', default=None, help='Write a JSON timing/failure report to this path')
+    parser.add_argument('--list', action='store_true', help='List the pivot sets and textures in the snapshot and exit')
+    parser.add_argument('--save-snapshot', default=None, help='Save the pivot sets to this snapshot file and exit, rather than rendering')
+    args = parser.parse_args()
+
+    if args.list or args.save_snapshot is not None:
+        jobs, problems = PivotTool.Render.loadJobs(args.snapshot)
+        for problem in problems:
+            print 'WARNING: %s' % problem
+
+        if args.save_snapshot is not None:
+            PivotTool.Gen.SnapshotFile.write(args.save_snapshot, jobs)
+        if args.list:
+            PivotTool.Render.printJobs(jobs)
+        return 0
+
+    textures = None
+    if args.texture is not None:
+        try:
+            textures = [PivotTool.Render.parseTexture(text) for text in args.texture]
+        except Exception as e:
+            parser.error(str(e))
+
+    summary = PivotTool.Render.renderSnapshot(args.snapshot, args.output_dir, textures, args.set, args.jobs, args.seed, args.set_arrays)
+
+    PivotTool.Render.printSummary(summary)
+    if args.report is not None:
+        PivotTool.Render.writeReport(args.report, summary)
+
+    return 1 if summary['failed'] > 0 else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())